@@ -1,424 +1,679 @@
 # app.py
 # -*- coding: utf-8 -*-
-import os, time, csv
+# 启动：python app.py  或  flask --app app run（自动发现 create_app）
+# 多核部署：python run_flask.py --prod（硬件守护进程 + gunicorn 多 worker）
+# 重模块（cv2 / reportlab / 传感器与 GPIO 驱动）全部延迟到后台线程或首次使用时导入，
+# 进程启动后立即可以响应 /ping 与 /api/v1/status
+import os, time, threading
 from io import BytesIO
 from datetime import datetime, date
 from pathlib import Path
-from flask import Flask, render_template, jsonify, request, redirect, url_for, send_file, Response
+from urllib.parse import urlsplit
+from flask import Flask, Blueprint, render_template, jsonify, request, redirect, url_for, send_file, Response, current_app
 from flask_cors import CORS
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 
 # ==== 我们的工具 ====
-from src.api.sensors import SensorSuite
-from src.utils.storage import load_yaml, save_yaml, append_csv, tail_csv_as_dicts
-from src.utils.scheduler import RepeatedTimer
+from src.utils.lazy import timed_import, uptime, IMPORT_TIMES
+from src.utils.storage import tail_csv_as_dicts
+from src.utils import history
 from src.utils.auth import init_db, get_user_by_name, create_user_if_not_exists, User
-from src.utils.report import generate_pdf_report
-from src.pi.hardware import PumpController, SimpleLightController, WS2812Controller
-
-pump = PumpController(pin=23, active_high=False)
-light = SimpleLightController(pin=24, pwm=False)
-ws = WS2812Controller(led_count=18, gpio_pin=18)
-
-# ==== 摄像头（OpenCV 简易封装）====
-import cv2
+from src.utils import metrics
+from src.api import devices
 
 APP_TITLE = "PlantAI 环境监控"
-CFG_PATH = "configs/plantai_config.yaml"
-
-# --- 加载配置 ---
-cfg = load_yaml(CFG_PATH, {
-    "theme": "auto",
-    "log_interval_min": 30,
-    "history_csv": "data/history.csv",
-    "camera": {"use_libcamera": True, "index": 0},
-    "auto_control": {
-        "enabled": True,
-        "quiet_hours": [23,7],
-        "soil_low_threshold": 35,
-        "pump_duration_s": 3,
-        "light_target_lux": 350,
-        "normal_light_brightness": 70,
-        "ws2812": {"enabled": False, "mode":"white", "brightness":128, "duration_s":10}
-    },
-    "users": {
-        "default_admin": {"username": "admin", "password": "admin123"}
-    }
-})
-
-Path(cfg["history_csv"]).parent.mkdir(parents=True, exist_ok=True)
-Path("data").mkdir(exist_ok=True)
-Path("configs").mkdir(exist_ok=True)
-
-# --- Flask App ---
-app = Flask(__name__, static_folder="static", template_folder="templates")
-app.secret_key = os.environ.get("PLANTAI_SECRET", "plantai-secret-key")  # 修改为更安全的key
-CORS(app)
-
-# --- 登录管理 ---
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = "login_page"
-
-@login_manager.user_loader
-def load_user(user_id: str):
-    return User.get(user_id)
-
-# --- 初始化DB与默认账号 ---
-init_db("data/app.db")
-create_user_if_not_exists("data/app.db",
-                          cfg["users"]["default_admin"]["username"],
-                          cfg["users"]["default_admin"]["password"])
-
-# --- 传感器 ---
-sensors = SensorSuite()
-
-# --- 摄像头简易提供者 ---
-class PiCameraProvider:
-    def __init__(self, index=0):
-        self.index = index
-        self.cap = None
-
-    def start(self):
-        if self.cap is None:
-            self.cap = cv2.VideoCapture(self.index)
-        if not self.cap or not self.cap.isOpened():
-            raise RuntimeError(f"无法打开摄像头（/dev/video{self.index}）")
-        return True
-
-    def read_jpeg(self):
-        if self.cap is None:
-            return None
-        ok, frame = self.cap.read()
-        if not ok:
-            return None
-        ret, buf = cv2.imencode(".jpg", frame)
-        return buf.tobytes() if ret else None
-
-    def stop(self):
-        if self.cap:
-            try: self.cap.release()
-            except: pass
-            self.cap = None
-
-camera = PiCameraProvider(index=int(cfg.get("camera",{}).get("index",0)))
-
-# --- 历史记录器 ---
-CSV_HEADER = ["时间", "温度°C", "湿度%", "光照lux", "CO₂ ppm", "TVOC ppb", "土壤湿度%"]
-
-def _record_once():
-    d = sensors.read_all()
-    append_csv(cfg["history_csv"], CSV_HEADER, [
-        time.strftime("%Y-%m-%d %H:%M:%S"),
-        d.get("temperature_c"),
-        d.get("humidity_pct"),
-        d.get("light_lux"),
-        d.get("eCO2_ppm"),
-        d.get("TVOC_ppb"),
-        d.get("soil_moisture_pct"),
-    ])
-    print("Recorded:", d)
-
-# --- 自动控制器 ---
-_last_actions = {"pump": 0, "light": 0, "ws": 0}  # 节流防呆
-def _within_quiet_hours(quiets):
-    """quiets: [start_hour, end_hour], e.g. [23,7]"""
-    try:
-        start, end = int(quiets[0]), int(quiets[1])
-    except:
-        return False
-    now_h = datetime.now().hour
-    if start < end:
-        return start <= now_h < end
+DB_PATH = "data/app.db"
+TRAIN_CFG = os.environ.get("PLANTAI_TRAIN_CFG", "configs/train_config.yaml")
+MODEL_ONNX = os.environ.get("PLANTAI_MODEL_ONNX", "checkpoints/onnx/best_model.onnx")
+MODEL_TFLITE = os.environ.get("PLANTAI_MODEL_TFLITE", "checkpoints/tflite/model.tflite")
+LABELS_TXT = os.environ.get("PLANTAI_LABELS_TXT", "deploy/label.txt")
+
+# --- 配置与子系统登记表（与 src.api.devices 共用；create_app 时加载 / 登记）---
+# 设置了 PLANTAI_HWD_SOCKET 时本进程是 Web worker：传感器、摄像头、控制在硬件守护进程中，经 RPC 代理访问
+cfg = devices.cfg
+services = devices.services
+hwd = None          # worker 模式下的 HwdClient
+
+bp = Blueprint("main", __name__)
+
+# ===================== 子系统工厂 =====================
+def _make_auth():
+    # 建库 + 默认账号（密码哈希较慢，放到后台）
+    init_db(DB_PATH)
+    create_user_if_not_exists(DB_PATH,
+                              cfg["users"]["default_admin"]["username"],
+                              cfg["users"]["default_admin"]["password"])
+    return True
+
+def _make_model():
+    AutoPlantModel = timed_import("src.api.model_runtime").AutoPlantModel
+    onnx_path = MODEL_ONNX
+    sim = devices.sim_cfg()
+    if sim and (not os.path.isfile(onnx_path) or os.path.getsize(onnx_path) == 0):
+        # 仿真模式下没有训练好的模型时，生成一个极小模型以便压测推理链路
+        n = len(Path(LABELS_TXT).read_text(encoding="utf-8").splitlines()) if os.path.exists(LABELS_TXT) else 4
+        onnx_path = timed_import("src.sim.model").make_tiny_onnx("data/sim/tiny_model.onnx", n_classes=n)
+    # 多 worker 时由 run_flask.py 按 核数/worker 数 设置，避免推理线程互相抢核
+    threads = int(os.environ.get("PLANTAI_ORT_THREADS", "0")) or None
+    # 模型管理器：监视 MODEL_ONNX，新检查点在后台加载 / 预热 / 冒烟测试后热切换（src/api/model_manager.py）
+    mc = cfg.get("model") or {}
+    return timed_import("src.api.model_manager").ModelManager(
+        lambda p: AutoPlantModel(TRAIN_CFG, p, MODEL_TFLITE, LABELS_TXT, threads=threads), onnx_path,
+        watch=MODEL_ONNX if mc.get("watch", True) else None, store=mc.get("store", "data/models"),
+        smoke_dir=mc.get("smoke_dir"), poll_s=mc.get("poll_s", 10), settle_s=mc.get("settle_s", 3),
+        warmup_runs=mc.get("warmup_runs", 3), max_latency_ratio=mc.get("max_latency_ratio", 3.0),
+        min_agreement=mc.get("min_agreement", 0.0), keep=mc.get("keep", 5))
+
+def _register_services():
+    global hwd
+    services.register("auth", _make_auth)
+    services.register("model", _make_model, stop=lambda m: m.close())
+    address = os.environ.get("PLANTAI_HWD_SOCKET")
+    if address:
+        client = timed_import("src.hwd.client")
+        hwd = client.HwdClient(address)
+        client.register_remote(services, hwd, devices.local_subsystems())
     else:
-        # 例如 23~7： 23,0,1,...6
-        return (now_h >= start) or (now_h < end)
-
-def _actuate_pump(duration_s: int):
-    # TODO 接入你的 PumpController，如：pump.on(); sleep; pump.off()
-    duration_s = max(1, min(30, int(duration_s)))
-    print(f"[自动控制] 启动水泵 {duration_s}s（模拟）")
-    # 写动作日志到 CSV（也可写DB）
-    append_csv("data/actions.csv", ["time","action","detail"], [
-        time.strftime("%Y-%m-%d %H:%M:%S"), "pump_on", f"{duration_s}s"
-    ])
-
-def _actuate_light(brightness: int):
-    # 普通补光
-    brightness = max(0, min(100, int(brightness)))
-    print(f"[自动控制] 打开普通补光，亮度 {brightness}%（模拟）")
-    append_csv("data/actions.csv", ["time","action","detail"], [
-        time.strftime("%Y-%m-%d %H:%M:%S"), "light_on", f"{brightness}%"
-    ])
-
-def _actuate_ws(mode: str, brightness: int, duration_s: int):
-    print(f"[自动控制] WS2812 {mode}, bri={brightness}, dur={duration_s}s（模拟）")
-    append_csv("data/actions.csv", ["time","action","detail"], [
-        time.strftime("%Y-%m-%d %H:%M:%S"), "ws_on", f"{mode},{brightness},{duration_s}s"
-    ])
-
-def _auto_control_tick():
-    ac = cfg.get("auto_control", {})
-    if not ac.get("enabled", False):
-        return
-    d = sensors.read_all()
-    now = time.time()
-    if _within_quiet_hours(ac.get("quiet_hours",[23,7])):
-        # 夜间静音，不浇水、不强制补光
-        return
-
-    # 土壤湿度低 -> 浇水
-    soil = d.get("soil_moisture_pct")
-    if soil is not None and soil < float(ac.get("soil_low_threshold", 35)):
-        if now - _last_actions["pump"] > 300:  # 距离上次浇水至少5分钟
-            _actuate_pump(ac.get("pump_duration_s", 3))
-            _last_actions["pump"] = now
-
-    # 光照不足 -> 补光（优先WS2812）
-    lux = d.get("light_lux")
-    target = float(ac.get("light_target_lux", 350))
-    if lux is not None and lux < target:
-        # 若需要补光
-        if ac.get("ws2812",{}).get("enabled", False):
-            if now - _last_actions["ws"] > 300:
-                ws = ac["ws2812"]
-                _actuate_ws(ws.get("mode","white"), int(ws.get("brightness",128)), int(ws.get("duration_s",10)))
-                _last_actions["ws"] = now
-        else:
-            if now - _last_actions["light"] > 300:
-                _actuate_light(int(ac.get("normal_light_brightness",70)))
-                _last_actions["light"] = now
+        devices.register_hardware()
 
-# 定时器：历史记录 + 自动控制（1分钟）
-rt_record = RepeatedTimer(max(5, int(cfg.get("log_interval_min",30))*60), _record_once)
-rt_auto   = RepeatedTimer(60, _auto_control_tick)
+def _read_sensors(timeout=None):
+    """采样器中的最新读数（计为界面读取，见 src/api/governor.py）；传感器尚未就绪时返回 None"""
+    sampler = services.get("sensors")
+    return sampler.read_all(timeout, demand=True) if sampler else None
+
+def _not_ready(name):
+    info = services.status().get(name, {})
+    return jsonify({"ok": False, "error": f"{name} 初始化中", "subsystem": info}), 503
 
 # ===================== 页面（需登录）=====================
-@app.route("/login", methods=["GET","POST"])
+@bp.route("/login", methods=["GET","POST"])
 def login_page():
     if request.method == "GET":
         return render_template("login.html", title="登录", theme=cfg.get("theme","auto"))
     # POST
+    if services.get("auth", timeout=10) is None:
+        return render_template("login.html", title="登录", theme=cfg.get("theme","auto"), error="系统启动中，请稍后重试")
     u = request.form.get("username","").strip()
     p = request.form.get("password","").strip()
-    user = get_user_by_name("data/app.db", u)
+    user = get_user_by_name(DB_PATH, u)
     if user and user.verify_password(p):
         login_user(user)
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
     return render_template("login.html", title="登录", theme=cfg.get("theme","auto"), error="用户名或密码错误")
 
-@app.route("/logout")
+@bp.route("/logout")
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for("login_page"))
+    return redirect(url_for("main.login_page"))
 
-@app.route("/")
+@bp.route("/")
 @login_required
 def dashboard():
     return render_template("dashboard.html", title=APP_TITLE, theme=cfg.get("theme","auto"))
 
-@app.route("/history")
+@bp.route("/history")
 @login_required
 def history_page():
     return render_template("history.html", title=APP_TITLE, theme=cfg.get("theme","auto"))
 
-@app.route("/control")
+@bp.route("/control")
 @login_required
 def control_page():
     return render_template("control.html", title=APP_TITLE, theme=cfg.get("theme","auto"))
 
-@app.route("/camera")
+@bp.route("/camera")
 @login_required
 def camera_page():
     return render_template("camera.html", title=APP_TITLE, theme=cfg.get("theme","auto"))
 
-@app.route("/settings")
+@bp.route("/settings")
 @login_required
 def settings_page():
     return render_template("settings.html", title=APP_TITLE, theme=cfg.get("theme","auto"))
 
-@app.route("/reports")
+@bp.route("/reports")
 @login_required
 def reports_page():
     return render_template("reports.html", title=APP_TITLE, theme=cfg.get("theme","auto"))
 
 # ===================== API（需登录）=====================
-@app.route("/api/sensors")
+@bp.route("/api/sensors")
 @login_required
 def api_sensors():
-    return jsonify(sensors.read_all())
+    d = _read_sensors(timeout=3)
+    if d is None:
+        return _not_ready("sensors")
+    return jsonify(d)
 
-@app.route("/api/history")
-@login_required
-def api_history():
-    n = request.args.get("n")
-    since = request.args.get("since")
-    until = request.args.get("until")
-    path = cfg["history_csv"]
+def _parse_date(s):
+    try:
+        return datetime.strptime(s, "%Y-%m-%d")
+    except:
+        return None
 
-    def parse_date(s):
-        try:
-            return datetime.strptime(s, "%Y-%m-%d")
-        except:
-            return None
+def _history_items(since=None, until=None, n=None):
+    """按日期范围（含首尾）或末尾 n 条读取历史记录（跨按天文件，只打开范围内的）"""
+    path = cfg["history_csv"]
+    if since or until:
+        return list(history.iter_rows(path, _parse_date(since) if since else None,
+                                      _parse_date(until) if until else None))
+    return tail_csv_as_dicts(path, n=int(n) if n else 200)
 
-    if (since or until) and os.path.exists(path):
-        rows = []
-        sdt = parse_date(since) if since else None
-        edt = parse_date(until) if until else None
-        with open(path, "r", encoding="utf-8", newline="") as f:
-            r = csv.DictReader(f)
-            for row in r:
-                t = row.get("时间")
-                try:
-                    dt = datetime.strptime(t, "%Y-%m-%d %H:%M:%S")
-                except:
-                    continue
-                if sdt and dt.date() < sdt.date():
-                    continue
-                if edt and dt.date() > edt.date():
-                    continue
-                rows.append(row)
-        return jsonify({"count": len(rows), "items": rows})
-    else:
-        n = int(n) if n else 200
-        items = tail_csv_as_dicts(path, n=n)
+@bp.route("/api/history")
+@login_required
+def api_history():
+    """可选 points=N：各通道 LTTB 降采样到不超过 N 行（保留峰谷），长范围时图表负载有上限"""
+    items = _history_items(request.args.get("since"), request.args.get("until"), request.args.get("n"))
+    points = request.args.get("points", type=int)
+    if not points or len(items) <= points:
         return jsonify({"count": len(items), "items": items})
+    points = max(16, min(points, 10000))
+    total = len(items)
+    downsample_rows = timed_import("src.utils.downsample").downsample_rows
+    items = downsample_rows(items, points, devices.CSV_HEADER[0], devices.CSV_HEADER[1:])
+    return jsonify({"count": len(items), "total": total, "points": points, "items": items})
 
-@app.route("/api/history/download")
+@bp.route("/api/stats/summary")
+@login_required
+def api_stats_summary():
+    """
+    各通道流式统计（内存中增量维护，与历史长度无关）：?channel=soil_moisture_pct 只取一个通道
+    last / ewma{fast,slow,trend} / today{n,mean,std,min,max} / windows{1h,24h,7d: n,mean,std,min,max,rate_per_h} / total
+    """
+    st = services.get("stats", timeout=5)
+    if st is None:
+        return _not_ready("stats")
+    return jsonify(dict(st.summary(request.args.get("channel")), ok=True))
+
+@bp.route("/api/stats/anomalies")
+@login_required
+def api_stats_anomalies():
+    """最近的异常（z 分数 / 骤降 / 骤升）：?limit=50&since=<unix 秒>"""
+    st = services.get("stats", timeout=5)
+    if st is None:
+        return _not_ready("stats")
+    since = request.args.get("since", type=float)
+    items = st.anomalies(limit=request.args.get("limit", 50, type=int), since=since)
+    return jsonify({"ok": True, "count": len(items), "items": items})
+
+@bp.route("/api/history/download")
 @login_required
 def api_history_download():
+    """全部历史拼成一个 CSV 流式下载；可选 since/until 日期范围"""
     path = cfg["history_csv"]
-    if not os.path.exists(path):
+    if not history.history_files(path):
         return jsonify({"ok": False, "error": "历史文件不存在"}), 404
-    return send_file(path, as_attachment=True, download_name="history.csv")
+    since, until = _parse_date(request.args.get("since")), _parse_date(request.args.get("until"))
+    return Response(history.iter_csv_bytes(path, since, until), mimetype="text/csv; charset=utf-8",
+                    headers={"Content-Disposition": "attachment; filename=history.csv"})
 
-@app.route("/api/reports/pdf")
+@bp.route("/api/export/<table>")
+@login_required
+def api_export(table):
+    """列式导出 table = history | plants | actions；format = arrow（IPC 流）| parquet | npz，可选 since/until；按批流式发送"""
+    columnar = timed_import("src.utils.columnar")
+    path = columnar.source_path(table, cfg)
+    if path is None:
+        return jsonify({"ok": False, "error": f"未知的表：{table}"}), 404
+    fmt = request.args.get("format") or columnar.default_format()
+    try:
+        columnar.check_format(fmt)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"ok": False, "error": str(e)}), 501
+    since, until = _parse_date(request.args.get("since")), _parse_date(request.args.get("until"))
+    ext = ".arrows" if fmt == "arrow" else columnar.FORMATS[fmt]
+    return Response(columnar.iter_export(table, path, fmt, since, until), mimetype=columnar.MIME[fmt],
+                    headers={"Content-Disposition": f"attachment; filename={table}{ext}"})
+
+@bp.route("/api/reports/pdf")
 @login_required
 def api_report_pdf():
     since = request.args.get("since")
     until = request.args.get("until")
     path = cfg["history_csv"]
-    outfile = f"data/report_{int(time.time())}.pdf"
-    if not os.path.exists(path):
+    outfile = os.path.abspath(f"data/report_{int(time.time())}.pdf")
+    if not history.history_files(path):
         return jsonify({"ok": False, "error": "无历史数据"}), 404
-    items = []
-    if since or until:
-        # 调用 /api/history 逻辑
-        res = app.test_client().get(f"/api/history?since={since or ''}&until={until or ''}")
-        data = res.get_json()
-        items = data.get("items", [])
-    else:
-        # 末尾200条
-        res = app.test_client().get("/api/history?n=200")
-        data = res.get_json()
-        items = data.get("items", [])
-    # 生成PDF
+    # 有日期范围按范围取，否则取末尾200条
+    items = _history_items(since, until, n=200)
+    # 生成PDF（reportlab 首次使用时才导入）
+    generate_pdf_report = timed_import("src.utils.report").generate_pdf_report
     generate_pdf_report(items, outfile, title="PlantAI 健康报告")
     return send_file(outfile, as_attachment=True, download_name=os.path.basename(outfile))
 
-@app.route("/api/settings", methods=["GET","POST"])
+@bp.route("/api/settings", methods=["GET","POST"])
 @login_required
 def api_settings():
     if request.method == "GET":
         return jsonify(cfg)
     data = request.get_json(force=True, silent=True) or {}
-    # 主题
-    if "theme" in data:
-        cfg["theme"] = data["theme"]
-    # 采集周期
-    if "log_interval_min" in data:
-        cfg["log_interval_min"] = max(1, int(data["log_interval_min"]))
-        try: rt_record.stop()
-        except: pass
-        globals()["rt_record"] = RepeatedTimer(cfg["log_interval_min"]*60, _record_once)
-    # 自动控制
-    if "auto_control" in data and isinstance(data["auto_control"], dict):
-        cfg["auto_control"].update(data["auto_control"])
-    save_yaml(CFG_PATH, cfg)
+    ctl = services.get("control", timeout=5)
+    if ctl is None:
+        return _not_ready("control")
+    # 在持有定时器的进程中应用并保存；worker 模式下返回守护进程中的新配置
+    saved = ctl.apply_settings(data)
+    if saved is not cfg:
+        cfg.clear(); cfg.update(saved)
     return jsonify({"ok": True, "saved": cfg})
 
-@app.route("/api/control", methods=["POST"])
+@bp.route("/api/control", methods=["POST"])
 @login_required
 def api_control():
     """前端发送控制请求 -> 控制硬件"""
     data = request.get_json(force=True, silent=True) or {}
-    result = {"pump": None, "light": None, "ws": None}
+    ctl = services.get("control", timeout=2)
+    if ctl is None:
+        return _not_ready("control")
 
     try:
-        # 水泵控制
-        if "pump" in data:
-            if data["pump"]:
-                dur = max(1, min(30, int(data.get("pump_duration", 3))))
-                _actuate_pump(dur)
-                result["pump"] = f"ON {dur}s"
-            else:
-                pump.off()
-  
-        # WS2812 控制
-        if "ws_enable" in data:
-            if data["ws_enable"]:
-                mode = data.get("ws_mode", "white")
-                bri = max(0, min(255, int(data.get("ws_brightness", 128))))
-                dur = max(1, min(60, int(data.get("ws_duration", 10))))
-                _actuate_ws(mode, bri, dur)
-                result["ws"] = f"ON {mode},{bri},{dur}s"
-            else:
-                ws.off()
-                result["ws"] = "OFF"
-
-        # 记录日志
-        append_csv("data/actions.csv", ["time", "action", "detail"], [
-            time.strftime("%Y-%m-%d %H:%M:%S"), "manual", str(result)
-        ])
-
+        # 整个请求的动作在持有硬件的进程内执行（worker 模式下一次 RPC）
+        result = ctl.control(data)
         return jsonify({"ok": True, "status": result})
 
     except Exception as e:
         print("[控制错误]", e)
         return jsonify({"ok": False, "error": str(e)})
 
+# 共享内存帧环读者（每线程一个；摄像头在守护进程或本进程中发布帧）
+_ring_local = threading.local()
+
+def _ring_reader():
+    name = devices.frame_ring_name()
+    if not name:
+        return None
+    r = getattr(_ring_local, "reader", None)
+    if r is None or r.name != name:
+        r = _ring_local.reader = timed_import("src.api.frame_ring").FrameRingReader(name)
+    return r
+
+def _camera_image():
+    """帧环中最新一帧 -> PIL RGB（BGR->RGB 转换即唯一一次拷贝）；无帧时 None"""
+    reader = _ring_reader()
+    Image = timed_import("PIL.Image")
+    for _ in range(3):
+        f = reader.read_fresh() if reader is not None else None     # 摄像头空闲暂停时等它恢复出帧
+        if f is None:
+            return None
+        h, w = f.image.shape[:2]
+        im = Image.frombuffer("RGB", (w, h), f.image, "raw", "BGR", 0, 1)
+        if reader.valid(f):       # 转换期间槽位未被覆盖
+            return im
+    return None
+
+# 推理
+@bp.route("/predict", methods=["POST"])
+@login_required
+def predict():
+    """上传图片推理；source=camera 时直接取摄像头最新帧（共享内存帧环）"""
+    from_camera = request.values.get("source") == "camera"
+    if not from_camera and "file" not in request.files:
+        return jsonify({"ok": False, "error": "no file"}), 400
+    models = services.get("model", timeout=10)
+    if models is None:
+        return _not_ready("model")
+    model = models.acquire()      # 热切换期间本请求固定用这个模型
+    if from_camera:
+        im = _camera_image()
+        if im is None:
+            return jsonify({"ok": False, "error": "摄像头无画面（未启动？）"}), 409
+    else:
+        Image = timed_import("PIL.Image")
+        im = Image.open(BytesIO(request.files["file"].read())).convert("RGB")
+    label, conf, probs = model.predict_pil(im)
+    devices.record_inference({"label": label, "confidence": round(float(conf), 4),
+                                  "backend": model.backend_name, "source": "camera" if from_camera else "upload"})
+    return jsonify({"ok": True, "label": label, "confidence": float(conf), "probs": probs,
+                    "backend": model.backend_name})
+
+# 多株分区识别（src/api/regions.py）：配置的区域 / 自动网格，一帧一次 batch 推理
+def _camera_regions(model, regions):
+    """帧环最新一帧 -> (宽, 高, 像素框, 批数组)；裁剪缩放直接读共享内存，之后确认槽位未被覆盖；无帧时 None"""
+    reader = _ring_reader()
+    pixel_boxes = timed_import("src.api.regions").pixel_boxes
+    for _ in range(3):
+        f = reader.read_fresh() if reader is not None else None
+        if f is None:
+            return None
+        h, w = f.image.shape[:2]
+        boxes = pixel_boxes(regions, w, h)
+        x = model.preprocess_regions(f.image, boxes, bgr=True)
+        if reader.valid(f):
+            return w, h, boxes, x
+    return None
+
+@bp.route("/api/plants/predict", methods=["POST"])
+@login_required
+def api_plants_predict():
+    """整盘分区识别：上传图片（file）或 source=camera；返回每个区域的 label / confidence 并写分区历史"""
+    from_camera = request.values.get("source") == "camera"
+    if not from_camera and "file" not in request.files:
+        return jsonify({"ok": False, "error": "no file"}), 400
+    rg = timed_import("src.api.regions")
+    try:
+        regions = rg.load_regions(cfg.get("regions"))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"ok": False, "error": f"regions 配置无效：{e}"}), 500
+    models = services.get("model", timeout=10)
+    if models is None:
+        return _not_ready("model")
+    model = models.acquire()
+    if model.backend_name == "unavailable":
+        return jsonify({"ok": False, "error": "模型不可用"}), 503
+    if from_camera:
+        got = _camera_regions(model, regions)
+        if got is None:
+            return jsonify({"ok": False, "error": "摄像头无画面（未启动？）"}), 409
+        w, h, boxes, x = got
+    else:
+        Image = timed_import("PIL.Image")
+        frame = timed_import("numpy").asarray(Image.open(BytesIO(request.files["file"].read())).convert("RGB"))
+        h, w = frame.shape[:2]
+        boxes = rg.pixel_boxes(regions, w, h)
+        x = model.preprocess_regions(frame, boxes)
+    results = [{"name": r["name"], "box": list(b), "label": label, "confidence": round(conf, 4), "probs": probs}
+               for r, b, (label, conf, probs) in zip(regions, boxes, model.predict_regions(x))]
+    devices.record_plants(results, model.backend_name, "camera" if from_camera else "upload")
+    return jsonify({"ok": True, "backend": model.backend_name, "width": w, "height": h, "regions": results})
+
+@bp.route("/api/plants/history")
+@login_required
+def api_plants_history():
+    """分区识别历史末尾 n 行；可选 region 只看某一株"""
+    path = (cfg.get("regions") or {}).get("history_csv", "data/plants.csv")
+    if not os.path.exists(path):
+        return jsonify({"ok": True, "count": 0, "items": []})
+    n = min(max(1, request.args.get("n", 200, type=int)), 10000)
+    region = request.args.get("region")
+    items = tail_csv_as_dicts(path, n=n * 8 if region else n)
+    if region:
+        items = [r for r in items if r.get("region") == region][-n:]
+    return jsonify({"ok": True, "count": len(items), "items": items})
+
+# 训练数据集采集（src/api/dataset.py；dataset.enabled 时可用）
+@bp.route("/api/dataset", methods=["GET", "POST"])
+@login_required
+def api_dataset():
+    """GET 状态；POST {"action": "start"|"stop"|"snap", "interval_s", "plant", "disease"}"""
+    if not (cfg.get("dataset") or {}).get("enabled"):
+        return jsonify({"ok": False, "error": "未开启 dataset.enabled"}), 404
+    ds = services.get("dataset", timeout=5)
+    if ds is None:
+        return _not_ready("dataset")
+    if request.method == "GET":
+        return jsonify(ds.status())
+    data = request.get_json(force=True, silent=True) or {}
+    action = data.get("action")
+    if action == "start":
+        return jsonify({"ok": True, "status": ds.start(data.get("interval_s"), data.get("plant"), data.get("disease"))})
+    if action == "stop":
+        return jsonify({"ok": True, "status": ds.stop()})
+    if action == "snap":
+        return jsonify({"ok": True, "result": ds.snap()})
+    return jsonify({"ok": False, "error": "action 应为 start / stop / snap"}), 400
+
 # 摄像头
-@app.route("/camera/start")
+@bp.route("/camera/start")
 @login_required
 def camera_start():
+    camera = services.get("camera", timeout=5)
+    if camera is None:
+        return _not_ready("camera")
     try:
         camera.start()
         return jsonify({"ok": True})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
-@app.route("/camera/stop")
+@bp.route("/camera/stop")
 @login_required
 def camera_stop():
-    camera.stop()
+    camera = services.get("camera")
+    if camera is not None:
+        camera.stop()
     return jsonify({"ok": True})
 
-def _gen_mjpeg():
-    while True:
-        buf = camera.read_jpeg()
-        if buf is None:
-            time.sleep(0.05)
-            continue
-        yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buf + b"\r\n")
-
-@app.route("/video_feed")
+def _gen_mjpeg(camera):
+    # 优先读帧环：每帧只在采集线程编码一次，worker 之间不经 RPC 传图；帧环不可用时退回 read_jpeg
+    reader = _ring_reader()
+    last = 0
+    with metrics.CAMERA_VIEWERS.track():
+        while True:
+            if reader is not None and reader.latest_id() > 0:
+                last, buf = reader.wait_jpeg(last, timeout=1.0)
+            else:
+                buf = camera.read_jpeg()
+            if buf is None:
+                time.sleep(0.05)
+                continue
+            yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buf + b"\r\n")
+
+def _stream_redirect(path):
+    """streaming 开启时跳转到推流服务（src/api/streaming.py，asyncio 单线程服务所有长连接）"""
+    sc = cfg.get("streaming") or {}
+    base = sc.get("public_url")
+    if not base:
+        host = urlsplit(request.host_url).hostname
+        host = f"[{host}]" if ":" in host else host
+        base = f"{request.scheme}://{host}:{int(sc.get('port', 5001))}"
+    qs = request.query_string.decode("latin-1")
+    return redirect(base.rstrip("/") + path + ("?" + qs if qs else ""), code=307)
+
+@bp.route("/video_feed")
 @login_required
 def video_feed():
-    return Response(_gen_mjpeg(), mimetype="multipart/x-mixed-replace; boundary=frame")
-
-@app.route("/ping")
+    if (cfg.get("streaming") or {}).get("enabled"):
+        if services.get("streams", timeout=5) is None:
+            return _not_ready("streams")
+        return _stream_redirect("/video_feed")
+    # 未开启推流服务：每个观看者占一个 Web 线程
+    camera = services.get("camera", timeout=5)
+    if camera is None:
+        return _not_ready("camera")
+    return Response(_gen_mjpeg(camera), mimetype="multipart/x-mixed-replace; boundary=frame")
+
+@bp.route("/events")
+@login_required
+def events():
+    """SSE：event 为 sensors（每次采样）/ action（执行器动作）/ inference（识别结果），data 为 JSON"""
+    if not (cfg.get("streaming") or {}).get("enabled"):
+        return jsonify({"ok": False, "error": "未开启 streaming"}), 404
+    if services.get("streams", timeout=5) is None:
+        return _not_ready("streams")
+    return _stream_redirect("/events")
+
+# ===================== 健康检查（免登录）=====================
+@bp.route("/ping")
 def ping():
     return jsonify({"ok": True, "time": time.time()})
 
+@bp.route("/api/v1/status")
+def api_status():
+    """watchdog 探活 + 各子系统就绪状态与导入耗时"""
+    return jsonify({
+        "ok": True,
+        "uptime_s": round(uptime(), 3),
+        "ready": all(s["state"] == "ready" for s in services.status().values()),
+        "subsystems": services.status(),
+        "imports_s": IMPORT_TIMES,
+    })
+
+@bp.route("/api/uplink")
+@login_required
+def api_uplink():
+    """上行队列状态：积压条数、已发 / 已确认序号、批大小、退避"""
+    up = services.get("uplink")
+    if up is None:
+        return jsonify({"ok": False, "enabled": bool((cfg.get("uplink") or {}).get("enabled"))})
+    return jsonify(dict(up.status(), ok=True))
+
+# ===================== 运维（仅管理员）=====================
+@bp.route("/api/admin/model", methods=["GET", "POST"])
+@login_required
+def api_admin_model():
+    """
+    GET 当前模型版本、历史与最近一次切换报告
+    POST {"action": "reload"}                  重新检查 MODEL_ONNX（或 {"path": ...}）并在后台验证、切换
+         {"action": "rollback"}                回到上一个版本
+         {"action": "activate", "version": ..} 切到已存储的某个版本
+    多 worker 部署时由收到请求的 worker 执行，其他 worker 跟随 data/models/active.json
+    """
+    if getattr(current_user, "role", None) != "admin":
+        return jsonify({"ok": False, "error": "需要管理员权限"}), 403
+    models = services.get("model", timeout=10)
+    if models is None:
+        return _not_ready("model")
+    if request.method == "GET":
+        return jsonify(models.status())
+    data = request.get_json(force=True, silent=True) or {}
+    action = data.get("action")
+    try:
+        if action == "reload":
+            path = data.get("path") or MODEL_ONNX
+            if not os.path.isfile(path):
+                return jsonify({"ok": False, "error": f"模型文件不存在: {path}"}), 400
+            models.start_async(models.promote, path)
+        elif action == "rollback":
+            models.start_async(models.rollback)
+        elif action == "activate" and data.get("version"):
+            models.start_async(models.activate, str(data["version"]), "activated")
+        else:
+            return jsonify({"ok": False, "error": "action 应为 reload / rollback / activate"}), 400
+    except RuntimeError as e:
+        return jsonify({"ok": False, "error": str(e)}), 409
+    return jsonify({"ok": True, "started": action, "status": models.status()}), 202
+
+@bp.route("/api/admin/profile")
+@login_required
+def api_admin_profile():
+    """
+    采样所有 Python 线程 seconds 秒：?seconds=10&hz=100&idle=0&format=json|collapsed
+    worker 模式下 target=hwd 改为剖析硬件守护进程（采样器、摄像头、定时器线程都在那里）
+    """
+    if getattr(current_user, "role", None) != "admin":
+        return jsonify({"ok": False, "error": "需要管理员权限"}), 403
+    profiler = timed_import("src.utils.profiler")
+    kw = dict(seconds=float(request.args.get("seconds", 10)), hz=int(request.args.get("hz", 100)),
+              idle=request.args.get("idle", "0") not in ("", "0", "false"))
+    try:
+        if request.args.get("target") == "hwd" and hwd is not None:
+            res = hwd.call("hwd", "profile", **kw)
+        else:
+            res = profiler.sample_stacks(**kw)
+    except profiler.ProfilerBusy as e:
+        return jsonify({"ok": False, "error": str(e)}), 409
+    except Exception as e:
+        if getattr(e, "type", None) == "ProfilerBusy":
+            return jsonify({"ok": False, "error": str(e)}), 409
+        raise
+    if request.args.get("format") == "collapsed":
+        return Response(res["collapsed"] + "\n", mimetype="text/plain; charset=utf-8")
+    return jsonify(dict(res, ok=True))
+
+@bp.route("/api/admin/admission")
+@login_required
+def api_admin_admission():
+    """各请求类的并发上限、在途 / 排队数、拒绝数（queue_full / timeout）与近期延迟分位数（毫秒，含排队）"""
+    if getattr(current_user, "role", None) != "admin":
+        return jsonify({"ok": False, "error": "需要管理员权限"}), 403
+    adm = current_app.extensions.get("plantai_admission")
+    if adm is None:
+        return jsonify({"ok": False, "enabled": False})
+    return jsonify({"ok": True, "enabled": True, "classes": adm.stats()})
+
+@bp.route("/api/admin/governor")
+@login_required
+def api_admin_governor():
+    """资源调度状态：摄像头 / 采样是否 active、持续时长、当前档位与订阅者数（src/api/governor.py）"""
+    if getattr(current_user, "role", None) != "admin":
+        return jsonify({"ok": False, "error": "需要管理员权限"}), 403
+    if not (cfg.get("governor") or {}).get("enabled"):
+        return jsonify({"ok": False, "enabled": False})
+    gov = services.get("governor", timeout=2)
+    if gov is None:
+        return _not_ready("governor")
+    return jsonify({"ok": True, "enabled": True, **gov.status()})
+
+@bp.route("/metrics")
+def metrics_page():
+    """Prometheus 抓取；设置 PLANTAI_METRICS_TOKEN 后需 Authorization: Bearer <token>"""
+    token = os.environ.get("PLANTAI_METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return Response("unauthorized\n", status=401, mimetype="text/plain")
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+@bp.route("/metrics/hwd")
+def metrics_hwd_page():
+    """worker 模式下硬件守护进程的指标（单独抓取，避免与 worker 的进程指标重名）"""
+    token = os.environ.get("PLANTAI_METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return Response("unauthorized\n", status=401, mimetype="text/plain")
+    if hwd is None:
+        return Response("not running in worker mode\n", status=404, mimetype="text/plain")
+    return Response(hwd.call("hwd", "metrics"), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+_subsystem_ready = metrics.gauge("plantai_subsystem_ready", "子系统是否就绪（1/0）", ("subsystem",))
+
+def _collect_subsystems():
+    for name, info in services.status().items():
+        _subsystem_ready.labels(name).set(1 if info["state"] == "ready" else 0)
+
+metrics.REGISTRY.add_collector(_collect_subsystems)
+
+# ===================== 应用工厂 =====================
+def create_app(cfg_path=None, start_services=True):
+    """
+    构造 Flask 应用；子系统（认证库、传感器、执行器、摄像头、模型、定时器）在后台线程中初始化
+    cfg_path 默认取环境变量 PLANTAI_CFG，再退回 configs/plantai_config.yaml
+    设置 PLANTAI_HWD_SOCKET 时为多 worker 部署中的一个 worker：不接触硬件，经 RPC 访问守护进程
+    gunicorn 入口：gunicorn 'app:create_app()'（见 run_flask.py --prod）
+    """
+    devices.load_config(cfg_path)
+    cfg_path = devices.config_path()
+
+    # --- Flask App ---
+    app = Flask(__name__, static_folder="static", template_folder="templates")
+    app.secret_key = os.environ.get("PLANTAI_SECRET", "plantai-secret-key")  # 修改为更安全的key
+    app.config["PLANTAI_CFG"] = cfg_path
+    CORS(app)
+
+    # --- 登录管理 ---
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.login_view = "main.login_page"
+
+    @login_manager.user_loader
+    def load_user(user_id: str):
+        if services.get("auth", timeout=10) is None:
+            return None
+        return User.get(user_id)
+
+    app.register_blueprint(bp)
+    if devices.hub_cfg():
+        # 汇聚站模式：接收各温室节点上报，提供跨节点查询（src/hub）
+        app.register_blueprint(timed_import("src.hub.routes").hub_bp)
+    metrics.install_flask_metrics(app)
+    # 请求分级：重接口（识别 / 报表 / 长历史）限并发，控制与传感器接口不被挤占
+    threads = int((devices.cfg.get("serving") or {}).get("threads", 0)) if os.environ.get("PLANTAI_HWD_SOCKET") else None
+    timed_import("src.utils.admission").install(app, devices.cfg.get("admission"), threads)
+
+    if os.environ.get("PLANTAI_HWD_SOCKET"):
+        # 设置由守护进程保存；其他 worker 在下个请求时按文件 mtime 重新读取
+        @app.before_request
+        def _refresh_cfg():
+            devices.reload_if_changed()
+
+    if start_services:
+        _register_services()
+        services.start()
+        print(f"🚀 应用已创建 ({uptime()*1000:.0f} ms)，子系统后台初始化中")
+    return app
+
 if __name__ == "__main__":
+    app = create_app()
     try:
-        app.run(host="0.0.0.0", port=5000, debug=False)
+        app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
     finally:
-        try: rt_record.stop()
-        except: pass
-        try: rt_auto.stop()
-        except: pass
-        try: camera.stop()
-        except: pass
+        services.stop_all()
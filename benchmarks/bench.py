@@ -0,0 +1,373 @@
+# benchmarks/bench.py
+# -*- coding: utf-8 -*-
+"""
+热点路径微基准
+
+  python benchmarks/bench.py run                      # 运行全部，打印结果
+  python benchmarks/bench.py run --save               # 另存为基线 benchmarks/baselines/<机器>.json
+  python benchmarks/bench.py run --only history       # 只跑名称包含 history 的用例
+  python benchmarks/bench.py compare                  # 与基线比较，超过阈值（默认 15%）记为回归，退出码 1
+
+缺少可选依赖（cv2 / onnx / onnxruntime / reportlab）的用例会被跳过
+"""
+import argparse, csv, gc, json, os, platform, random, statistics, sys, tempfile, time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+BASELINE_DIR = ROOT / "benchmarks" / "baselines"
+
+CSV_HEADER = ["时间", "温度°C", "湿度%", "光照lux", "CO₂ ppm", "TVOC ppb", "土壤湿度%"]
+
+BENCHES = []   # (name, setup) ；setup(ctx) -> (fn, ops_per_call)
+
+
+def bench(name):
+    def deco(setup):
+        BENCHES.append((name, setup))
+        return setup
+    return deco
+
+
+class Skip(Exception):
+    pass
+
+
+# ==============================
+# 测试数据
+# ==============================
+
+def synth_history(path, years=3, step_min=10, seed=0):
+    """生成多年历史 CSV（与 app.py 记录格式一致）"""
+    rng = random.Random(seed)
+    t = datetime(2023, 1, 1)
+    n = int(years * 365 * 24 * 60 / step_min)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(CSV_HEADER)
+        for _ in range(n):
+            w.writerow([t.strftime("%Y-%m-%d %H:%M:%S"), round(rng.uniform(15, 30), 2), round(rng.uniform(40, 90), 2),
+                        round(rng.uniform(0, 900), 2), rng.randint(400, 900), rng.randint(0, 80),
+                        round(rng.uniform(20, 80), 2)])
+            t += timedelta(minutes=step_min)
+    return n
+
+
+class Ctx:
+    """基准间共享的临时数据（惰性生成）"""
+    def __init__(self, tmp):
+        self.tmp = Path(tmp)
+        self._history = None
+        self._rotated = None
+        self._app = None
+
+    @property
+    def history(self):
+        if self._history is None:
+            p = self.tmp / "history.csv"
+            n = synth_history(p)
+            print(f"  (已生成 {n} 行合成历史 {p.stat().st_size/1e6:.1f} MB)")
+            self._history = p
+        return self._history
+
+    @property
+    def history_rotated(self):
+        """同一份合成历史迁移为按天文件（7 天前的已压缩）"""
+        if self._rotated is None:
+            import shutil
+            from src.utils.history import HistoryWriter
+            d = self.tmp / "rotated"
+            d.mkdir()
+            p = d / "history.csv"
+            shutil.copy(self.history, p)
+            HistoryWriter(p, CSV_HEADER, flush_interval_s=0).close()
+            self._rotated = p
+        return self._rotated
+
+    @property
+    def app(self):
+        if self._app is None:
+            import yaml
+            import app as plantai
+            from src.api.devices import DEFAULT_CFG
+            cfg_path = self.tmp / "plantai_config.yaml"
+            cfg = dict(DEFAULT_CFG, history_csv=str(self.history))
+            cfg_path.write_text(yaml.safe_dump(cfg, allow_unicode=True), encoding="utf-8")
+            a = plantai.create_app(str(cfg_path), start_services=False)
+            a.config["LOGIN_DISABLED"] = True
+            self._app = a
+        return self._app
+
+
+def _need(mod):
+    try:
+        return __import__(mod)
+    except ImportError:
+        raise Skip(f"缺少 {mod}")
+
+
+# ==============================
+# 用例
+# ==============================
+
+@bench("history.tail_csv_as_dicts.n200")
+def _(ctx):
+    from src.utils.storage import tail_csv_as_dicts
+    p = str(ctx.history)
+    return (lambda: tail_csv_as_dicts(p, n=200)), 1
+
+
+@bench("history.api_range_scan.30d")
+def _(ctx):
+    client = ctx.app.test_client()
+    url = "/api/history?since=2025-06-01&until=2025-06-30"
+    def fn():
+        r = client.get(url)
+        assert r.status_code == 200
+    return fn, 1
+
+
+@bench("history.api_range_scan.1y")
+def _(ctx):
+    client = ctx.app.test_client()
+    url = "/api/history?since=2024-01-01&until=2024-12-31"
+    def fn():
+        r = client.get(url)
+        assert r.status_code == 200
+    return fn, 1
+
+
+@bench("history.api_range_scan.1y.points1000")
+def _(ctx):
+    client = ctx.app.test_client()
+    url = "/api/history?since=2024-01-01&until=2024-12-31&points=1000"
+    def fn():
+        r = client.get(url)
+        assert r.status_code == 200 and r.get_json()["count"] <= 1000
+    return fn, 1
+
+
+@bench("history.lttb_rows.1y_to_1000")
+def _(ctx):
+    from src.utils.history import iter_rows
+    from src.utils.downsample import downsample_rows
+    rows = list(iter_rows(str(ctx.history), "2024-01-01", "2024-12-31"))
+    return (lambda: downsample_rows(rows, 1000, CSV_HEADER[0], CSV_HEADER[1:])), 1
+
+
+@bench("history.rotated.tail_n200")
+def _(ctx):
+    from src.utils.storage import tail_csv_as_dicts
+    p = str(ctx.history_rotated)
+    return (lambda: tail_csv_as_dicts(p, n=200)), 1
+
+
+@bench("history.rotated.range_scan.30d")
+def _(ctx):
+    from src.utils.history import iter_rows
+    p = str(ctx.history_rotated)
+    return (lambda: list(iter_rows(p, "2025-06-01", "2025-06-30"))), 1
+
+
+@bench("history.rotated.range_scan.1y")
+def _(ctx):
+    from src.utils.history import iter_rows
+    p = str(ctx.history_rotated)
+    return (lambda: list(iter_rows(p, "2024-01-01", "2024-12-31"))), 1
+
+
+def _tiny_model(ctx):
+    _need("onnx"); _need("onnxruntime")
+    from src.sim.model import make_tiny_onnx
+    from src.api.model_runtime import AutoPlantModel
+    onnx_path = make_tiny_onnx(ctx.tmp / "tiny.onnx", n_classes=4)
+    m = AutoPlantModel(str(ROOT / "configs" / "train_config.yaml"), onnx_path, None, str(ROOT / "deploy" / "label.txt"))
+    if m.backend_name != "onnxruntime":
+        raise Skip("ONNX 模型加载失败")
+    return m
+
+
+def _frame_pil(w=1280, h=720):
+    import numpy as np
+    from PIL import Image
+    arr = (np.random.default_rng(0).random((h, w, 3)) * 255).astype("uint8")
+    return Image.fromarray(arr)
+
+
+@bench("inference.preprocess.720p")
+def _(ctx):
+    m = _tiny_model(ctx)
+    im = _frame_pil()
+    return (lambda: m.preprocess(im)), 1
+
+
+@bench("inference.predict_pil.720p")
+def _(ctx):
+    m = _tiny_model(ctx)
+    im = _frame_pil()
+    return (lambda: m.predict_pil(im)), 1
+
+
+@bench("camera.imencode_fanout.720p_x8")
+def _(ctx):
+    cv2 = _need("cv2")
+    import numpy as np
+    frame = (np.random.default_rng(0).random((720, 1280, 3)) * 255).astype("uint8")
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), 80]
+    def fn():
+        # 每个观看者各自编码同一帧（当前 /video_feed 的行为）
+        for _ in range(8):
+            cv2.imencode(".jpg", frame, params)
+    return fn, 8
+
+
+@bench("report.generate_pdf.200")
+def _(ctx):
+    _need("reportlab")
+    from src.utils.storage import tail_csv_as_dicts
+    from src.utils.report import generate_pdf_report
+    items = tail_csv_as_dicts(str(ctx.history), n=200)
+    out = str(ctx.tmp / "report.pdf")
+    return (lambda: generate_pdf_report(items, out)), 1
+
+
+@bench("sensors.read_all.sim")
+def _(ctx):
+    from src.sim.sensors import SimSensorSuite
+    suite = SimSensorSuite(latency_ms=0, noise=0.02, seed=0)
+    return suite.read_all, 1
+
+
+@bench("control.backtest.1y_grid1000")
+def _(ctx):
+    import numpy as np
+    from src.utils import backtest
+    # 均匀随机的合成历史没有“干燥 - 浇水”过程，这里单独生成一年 30 分钟一条的干燥 / 日照曲线
+    rng = np.random.default_rng(0)
+    t = np.arange(365 * 48) * 1800.0 + 1704067200
+    h = t % 86400 / 3600
+    day = np.clip(np.sin((h - 6) / 12 * np.pi), 0, None)
+    lux = day * 900 * rng.uniform(0.3, 1.0, len(t))
+    dry = (0.15 + 0.35 * day) * rng.uniform(0.7, 1.3, len(t)) / 2
+    soil = 50 - np.cumsum(dry)
+    soil += np.floor(np.maximum(0, 35 - soil) / 10 + 1) * 10 * (soil < 35)     # 每次降到 35 以下浇水 +10%
+    rp = backtest.Replay(t, soil, lux)
+    combos = [(s, 3, c, x, 300, q0, q1) for s in range(25, 50) for c in (300, 900) for x in range(200, 700, 50)
+              for q0, q1 in ((23, 7), (24, 0))]
+    grid = backtest.Grid(*[np.array(col) for col in zip(*combos)])
+    return (lambda: rp.run(grid, gain=3.0)), len(combos)
+
+
+# ==============================
+# 运行 / 比较
+# ==============================
+
+def measure(fn, min_time=0.2, repeat=5):
+    """自动确定每轮调用次数使单轮 ≥ min_time，返回每次调用耗时（秒）的列表"""
+    fn()  # 预热
+    number = 1
+    while True:
+        t = time.perf_counter()
+        for _ in range(number): fn()
+        dt = time.perf_counter() - t
+        if dt >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if dt == 0 else max(2, min(10, int(min_time / dt) + 1))
+    out = []
+    gc_was = gc.isenabled(); gc.disable()
+    try:
+        for _ in range(repeat):
+            t = time.perf_counter()
+            for _ in range(number): fn()
+            out.append((time.perf_counter() - t) / number)
+    finally:
+        if gc_was: gc.enable()
+    return out, number
+
+
+def run(only=None, min_time=0.2, repeat=5):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="plantai-bench-") as tmp:
+        ctx = Ctx(tmp)
+        for name, setup in BENCHES:
+            if only and not any(o in name for o in only):
+                continue
+            try:
+                fn, ops = setup(ctx)
+            except Skip as e:
+                print(f"{name:<36} 跳过: {e}")
+                continue
+            times, number = measure(fn, min_time, repeat)
+            med = statistics.median(times)
+            results[name] = {"median_s": med, "min_s": min(times), "max_s": max(times),
+                             "per_op_s": med / ops, "loops": number, "repeat": repeat}
+            print(f"{name:<36} {med*1000:10.3f} ms  (min {min(times)*1000:.3f}, ×{number})")
+    return results
+
+
+def machine_id():
+    return f"{platform.machine()}-py{sys.version_info.major}{sys.version_info.minor}"
+
+
+def default_baseline():
+    return BASELINE_DIR / f"{machine_id()}.json"
+
+
+def compare(current, baseline, threshold):
+    regressions = []
+    print(f"\n{'用例':<36}{'基线ms':>11}{'当前ms':>11}{'变化':>9}")
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:<36}{'-':>11}{cur['median_s']*1000:>11.3f}{'new':>9}")
+            continue
+        ratio = cur["median_s"] / base["median_s"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  ⚠️ 回归"; regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  ✅ 提升"
+        print(f"{name:<36}{base['median_s']*1000:>11.3f}{cur['median_s']*1000:>11.3f}{(ratio-1)*100:>+8.1f}%{flag}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="PlantAI 微基准")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for cmd in ("run", "compare"):
+        p = sub.add_parser(cmd)
+        p.add_argument("--only", nargs="*", help="只运行名称包含这些子串的用例")
+        p.add_argument("--min-time", type=float, default=0.2, help="每轮最少耗时（秒）")
+        p.add_argument("--repeat", type=int, default=5)
+        p.add_argument("--baseline", help="基线文件，默认 benchmarks/baselines/<机器>.json")
+    sub.choices["run"].add_argument("--save", action="store_true", help="写入/更新基线文件")
+    sub.choices["compare"].add_argument("--threshold", type=float, default=0.15, help="回归阈值（比例）")
+    args = ap.parse_args()
+
+    os.chdir(ROOT)
+    path = Path(args.baseline) if args.baseline else default_baseline()
+    if args.cmd == "compare" and not path.exists():
+        raise SystemExit(f"基线不存在: {path}（先运行 run --save）")
+
+    results = run(args.only, args.min_time, args.repeat)
+
+    if args.cmd == "run" and args.save:
+        data = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+        data.update({"machine": machine_id(), "python": platform.python_version(),
+                     "saved_at": datetime.now().isoformat(timespec="seconds")})
+        data.setdefault("results", {}).update(results)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n基线已保存: {path}")
+    elif args.cmd == "compare":
+        baseline = json.loads(path.read_text(encoding="utf-8")).get("results", {})
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 项回归超过 {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n无回归")
+
+
+if __name__ == "__main__":
+    main()
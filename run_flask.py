@@ -1,6 +1,9 @@
 # run_flask.py
-import os, socket, subprocess, webbrowser, qrcode, io
-from PIL import Image
+# 开发：python run_flask.py                   单进程（werkzeug 多线程），显示二维码并打开浏览器
+# 生产：python run_flask.py --prod [--workers N]
+#       硬件守护进程（python -m src.hwd.server）独占传感器 / GPIO / 摄像头 / 定时器，
+#       gunicorn 启动 N 个无状态 worker（默认 = CPU 核数），经 Unix socket RPC 访问硬件
+import os, sys, time, socket, argparse, subprocess, webbrowser, io
 
 def find_free_port(start=5000, end=5100):
     for port in range(start, end):
@@ -39,6 +42,7 @@ def get_local_ip():
 
 def show_qr(url: str):
     """在终端显示二维码"""
+    import qrcode   # 仅开发模式需要
     qr = qrcode.QRCode(border=1)
     qr.add_data(url)
     qr.make(fit=True)
@@ -50,8 +54,67 @@ def show_qr(url: str):
     print("\n📱 使用手机扫描二维码访问：")
     img.show()
 
+def serve_production(port, workers=0, threads=0):
+    """硬件守护进程 + gunicorn（gthread）；任一方退出即整体退出，由 systemd 重启"""
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        raise SystemExit("❌ 生产模式需要 gunicorn：pip install gunicorn")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from src.api import devices
+    from src.hwd.client import socket_path
+    cfg = devices.load_config()
+    serving = cfg.get("serving") or {}
+    workers = workers or int(serving.get("workers") or 0) or os.cpu_count() or 1
+    threads = threads or int(serving.get("threads") or 8)
+    sock = os.path.abspath(socket_path(cfg))
+
+    env = dict(os.environ, PLANTAI_HWD_SOCKET=sock)
+    # 每个 worker 的 onnxruntime 线程数 = 核数 / worker 数，避免多进程推理互相抢核
+    env.setdefault("PLANTAI_ORT_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+    hwd = subprocess.Popen([sys.executable, "-m", "src.hwd.server", "--socket", sock], env=env)
+    # worker 中的代理会一直重连直到守护进程就绪，这里只需等 socket 出现，避免首批请求全部 503
+    deadline = time.time() + 30
+    while not os.path.exists(sock) and hwd.poll() is None and time.time() < deadline:
+        time.sleep(0.1)
+    if hwd.poll() is not None:
+        raise SystemExit(f"❌ 硬件守护进程启动失败（退出码 {hwd.returncode}）")
+
+    print(f"🚀 gunicorn {workers} worker × {threads} 线程，监听 0.0.0.0:{port}")
+    web = None
+    try:
+        # MJPEG 长连接各占一个线程，gthread 的 timeout 只针对 worker 心跳，不限制单个请求
+        web = subprocess.Popen([sys.executable, "-m", "gunicorn", "app:create_app()",
+                                "-b", f"0.0.0.0:{port}", "-w", str(workers), "-k", "gthread",
+                                "--threads", str(threads), "--timeout", "120", "--graceful-timeout", "10"],
+                               env=env)
+        while web.poll() is None and hwd.poll() is None:
+            time.sleep(1)
+        if hwd.poll() is not None:
+            print(f"❌ 硬件守护进程已退出（{hwd.returncode}），停止 Web 服务")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in (web, hwd):
+            if p is not None and p.poll() is None:
+                p.terminate()
+                try: p.wait(15)
+                except subprocess.TimeoutExpired: p.kill()
+    sys.exit((web.returncode if web else 0) or hwd.returncode or 0)
+
 def main():
-    base_port = 5000
+    ap = argparse.ArgumentParser(description="启动 PlantAI Web 服务")
+    ap.add_argument("--prod", action="store_true", help="生产模式：硬件守护进程 + gunicorn 多 worker")
+    ap.add_argument("--port", type=int, default=None, help="监听端口（默认 5000；开发模式被占用时顺延）")
+    ap.add_argument("--workers", type=int, default=0, help="worker 数，默认 serving.workers 或 CPU 核数")
+    ap.add_argument("--threads", type=int, default=0, help="每个 worker 的线程数，默认 serving.threads")
+    args = ap.parse_args()
+
+    if args.prod:
+        serve_production(args.port or 5000, args.workers, args.threads)
+        return
+
+    base_port = args.port or 5000
     port = find_free_port(base_port)
     if port != base_port:
         print(f"⚙️ 端口 {base_port} 被占用，改用 {port}")
@@ -71,9 +134,13 @@ def main():
     except Exception:
         print("⚠️ 无法自动打开浏览器")
 
-    os.environ["FLASK_APP"] = "app.py"
-    os.environ["FLASK_ENV"] = "production"
-    os.system(f"flask run --host=0.0.0.0 --port={port}")
+    # 在本进程中启动（不经 shell），Ctrl+C 时能正常停止子系统
+    import app as plantai
+    flask_app = plantai.create_app()
+    try:
+        flask_app.run(host="0.0.0.0", port=port, debug=False, threaded=True)
+    finally:
+        plantai.services.stop_all()
 
 if __name__ == "__main__":
     main()
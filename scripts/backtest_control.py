@@ -0,0 +1,174 @@
+# scripts/backtest_control.py
+# -*- coding: utf-8 -*-
+"""
+自动控制参数回测：用历史数据重放 auto_control 策略，一次扫描成千上万组
+土壤阈值 / 浇水秒数 / 浇水间隔 / 目标光照 / 补光间隔 / 静音时段，比较浇水次数、用水量、补光时长与缺水时间
+
+  # 当前配置 + 土壤阈值 25~45、静音时段三选一
+  python scripts/backtest_control.py --soil 25:45:2.5 --quiet 23-7,22-6,none
+
+  # 最近一年、多参数网格，按缺水小时数再按用水量排序，全部结果写 CSV
+  python scripts/backtest_control.py --since 2024-01-01 --soil 25:45:1 --pump-s 2,3,5 \\
+      --pump-cooldown 300,900,1800 --lux 200:500:50 --out data/backtest.csv
+
+  # 抽 20 组与逐拍参考实现比对
+  python scripts/backtest_control.py --soil 25:45:5 --check 20
+
+网格参数：a:b:step（含 b）或逗号列表；未给出的取配置文件 auto_control 中的当前值，
+当前配置总作为 baseline 一行输出
+"""
+import argparse, csv, itertools, json, os, random, sys, time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from src.utils import backtest   # noqa: E402
+
+COLUMNS = ["soil_low", "pump_s", "pump_cooldown_s", "lux_target", "light_cooldown_s", "quiet",
+           "pump_activations", "water_l", "light_activations", "light_on_min", "dry_h", "soil_min", "soil_mean"]
+
+
+def parse_values(spec):
+    """'25:45:2.5' -> [25, 27.5, ..., 45]；'2,3,5' -> [2, 3, 5]"""
+    if ":" in spec:
+        a, b, step = (float(x) for x in spec.split(":"))
+        return list(np.round(np.arange(a, b + step / 2, step), 6))
+    return [float(x) for x in spec.split(",") if x.strip()]
+
+
+def parse_quiet(spec):
+    """'23-7,22-6,none' -> [(23, 7), (22, 6), (24, 0)]；none 即从不静音"""
+    out = []
+    for x in spec.split(","):
+        x = x.strip().lower()
+        if x in ("none", "off", "-"):
+            out.append((24, 0))
+        elif x:
+            a, b = x.split("-")
+            out.append((int(a), int(b)))
+    return out
+
+
+def quiet_label(q0, q1):
+    return "none" if q0 >= 24 else f"{q0}-{q1}"
+
+
+def build_grid(args, ac):
+    qh = ac.get("quiet_hours") or [23, 7]
+    base = backtest.Grid(float(ac.get("soil_low_threshold", 35)), float(ac.get("pump_duration_s", 3)),
+                         float(ac.get("pump_cooldown_s", 300)), float(ac.get("light_target_lux", 350)),
+                         float(ac.get("light_cooldown_s", 300)), int(qh[0]), int(qh[1]))
+    axes = [parse_values(args.soil) if args.soil else [base.soil_low],
+            parse_values(args.pump_s) if args.pump_s else [base.pump_s],
+            parse_values(args.pump_cooldown) if args.pump_cooldown else [base.pump_cooldown_s],
+            parse_values(args.lux) if args.lux else [base.lux_target],
+            parse_values(args.light_cooldown) if args.light_cooldown else [base.light_cooldown_s],
+            parse_quiet(args.quiet) if args.quiet else [(base.quiet_start, base.quiet_end)]]
+    combos = [base] + [backtest.Grid(*c[:5], *c[5]) for c in itertools.product(*axes)]
+    return backtest.Grid(*[np.array(col) for col in zip(*combos)])
+
+
+def rows_of(res):
+    n = len(res["soil_low"])
+    for i in range(n):
+        r = {k: res[k][i].item() for k in res if k not in ("quiet_start", "quiet_end")}
+        r["quiet"] = quiet_label(int(res["quiet_start"][i]), int(res["quiet_end"][i]))
+        yield {k: round(r[k], 3) if isinstance(r[k], float) else r[k] for k in COLUMNS}
+
+
+def print_table(rows, title):
+    print(title)
+    print("  " + " ".join(f"{c:>12}" for c in COLUMNS))
+    for r in rows:
+        print("  " + " ".join(f"{r[c]:>12}" for c in COLUMNS))
+
+
+def check(rp, grid, res, gain, ws_on_s, n, seed=0):
+    """随机抽 n 组与逐拍参考实现比对，返回不一致的组数"""
+    idx = random.Random(seed).sample(range(len(grid.soil_low)), min(n, len(grid.soil_low)))
+    bad = 0
+    t0 = time.perf_counter()
+    for i in idx:
+        p = [x[i].item() for x in grid]
+        pumps, lights, lit = rp.simulate_loop(p, gain, ws_on_s)
+        got = (res["pump_activations"][i], res["light_activations"][i], res["light_on_min"][i] * 60 / rp.tick_s)
+        if (pumps, lights) != tuple(int(x) for x in got[:2]) or abs(lit - got[2]) > 1e-6:
+            bad += 1
+            print(f"  ❌ {p}: 参考 pump={pumps} light={lights} lit={lit} / 向量化 {got}")
+    dt = time.perf_counter() - t0
+    print(f"校验 {len(idx)} 组：{len(idx) - bad} 组一致（参考实现 {dt / max(1, len(idx)):.2f} s/组）")
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser(description="auto_control 参数回测")
+    ap.add_argument("--config", default=None, help="配置文件（默认 PLANTAI_CFG 或 configs/plantai_config.yaml）")
+    ap.add_argument("--history", default=None, help="历史 CSV 路径（默认取配置 history_csv）")
+    ap.add_argument("--since"); ap.add_argument("--until")
+    ap.add_argument("--soil", help="土壤阈值 %%")
+    ap.add_argument("--pump-s", help="每次浇水秒数")
+    ap.add_argument("--pump-cooldown", help="浇水间隔秒数")
+    ap.add_argument("--lux", help="目标光照 lux")
+    ap.add_argument("--light-cooldown", help="补光间隔秒数")
+    ap.add_argument("--quiet", help="静音时段，如 23-7,22-6,none")
+    ap.add_argument("--gain", type=float, default=None, help="每秒浇水使土壤湿度上升的百分点（默认由历史跳升估计）")
+    ap.add_argument("--flow-ml-s", type=float, default=30.0, help="水泵流量 ml/s（折算用水量）")
+    ap.add_argument("--dry-pct", type=float, default=None, help="缺水线 %%（默认每组自己的土壤阈值）")
+    ap.add_argument("--jump", type=float, default=3.0, help="单条记录上升超过此值视为一次浇水")
+    ap.add_argument("--sort", default="dry_h,water_l", help="排序列（逗号分隔，升序）")
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--out", help="全部结果写出（.csv / .json）")
+    ap.add_argument("--check", type=int, default=0, help="抽 N 组与逐拍参考实现比对")
+    args = ap.parse_args()
+
+    from src.api import devices
+    cfg = devices.load_config(args.config)
+    ac = cfg.get("auto_control") or {}
+    ws = ac.get("ws2812") or {}
+    ws_on_s = max(1, min(60, int(ws.get("duration_s", 10)))) if ws.get("enabled") else None
+
+    t0 = time.perf_counter()
+    t, soil, lux = backtest.load_history(args.history or cfg["history_csv"], args.since, args.until)
+    t1 = time.perf_counter()
+    rp = backtest.Replay(t, soil, lux, jump=args.jump)
+    t2 = time.perf_counter()
+    gain = args.gain
+    if gain is None:
+        gain = rp.estimate_gain(float(ac.get("pump_duration_s", 3)))
+        src = f"由 {len(rp.jumps)} 次历史浇水估计" if gain else "历史中无浇水跳升，取默认值"
+        gain = gain or 3.0
+    else:
+        src = "--gain"
+    grid = build_grid(args, ac)
+    res = rp.run(grid, gain, args.flow_ml_s, args.dry_pct, ws_on_s)
+    t3 = time.perf_counter()
+
+    days = rp.T * rp.tick_s / 86400
+    print(f"历史 {len(t)} 条，{days:.0f} 天（{rp.T} 拍 × {rp.tick_s:.0f}s）；gain={gain:.3f} %/s（{src}）；"
+          f"补光：{'WS2812 每次 %ds' % ws_on_s if ws_on_s else '普通补光'}")
+    print(f"耗时：读取 {t1 - t0:.2f}s，预处理 {t2 - t1:.2f}s，回测 {len(grid.soil_low)} 组 {t3 - t2:.2f}s")
+
+    rows = list(rows_of(res))
+    keys = [k.strip() for k in args.sort.split(",") if k.strip()]
+    ranked = sorted(rows[1:], key=lambda r: tuple(r[k] for k in keys))
+    print_table(rows[:1], "\n当前配置（baseline）：")
+    print_table(ranked[:args.top], f"\n前 {min(args.top, len(ranked))} 组（按 {args.sort}）：")
+
+    if args.out:
+        if args.out.endswith(".json"):
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump({"gain": gain, "days": days, "baseline": rows[0], "rows": rows[1:]}, f, ensure_ascii=False)
+        else:
+            with open(args.out, "w", newline="", encoding="utf-8") as f:
+                w = csv.DictWriter(f, COLUMNS)
+                w.writeheader()
+                w.writerows(rows)
+        print(f"\n已写出 {len(rows)} 行 -> {args.out}")
+
+    if args.check and check(rp, grid, res, gain, ws_on_s, args.check):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# scripts/export_columnar.py
+# -*- coding: utf-8 -*-
+"""
+历史 / 分区识别 / 动作记录导出为列式文件（Arrow IPC 文件、Parquet，没有 pyarrow 时 .npz）
+
+  python scripts/export_columnar.py history --out data/export/history.arrow
+  python scripts/export_columnar.py history --since 2024-01-01 --until 2024-12-31 --format parquet
+  python scripts/export_columnar.py plants actions --out-dir data/export
+
+读取（.arrow 内存映射，time 为 UTC 毫秒）：
+  from src.utils import columnar; cols = columnar.load("data/export/history.arrow")
+  import pyarrow as pa; t = pa.ipc.open_file(pa.memory_map("data/export/history.arrow")).read_all()
+"""
+import argparse, os, sys, time
+from pathlib import Path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from src.utils import columnar   # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description="列式导出")
+    ap.add_argument("tables", nargs="+", choices=sorted(columnar.TABLES))
+    ap.add_argument("--format", choices=sorted(columnar.FORMATS), default=None,
+                    help="默认 arrow（有 pyarrow 时）否则 npz")
+    ap.add_argument("--since"); ap.add_argument("--until")
+    ap.add_argument("--out", help="输出文件（只导出一张表时）")
+    ap.add_argument("--out-dir", default="data/export")
+    ap.add_argument("--batch-rows", type=int, default=65536)
+    ap.add_argument("--config", default=None)
+    args = ap.parse_args()
+    if args.out and len(args.tables) > 1:
+        ap.error("--out 只能用于单张表，多张表用 --out-dir")
+
+    from src.api import devices
+    cfg = devices.load_config(args.config)
+    fmt = args.format or columnar.default_format()
+    try:
+        columnar.check_format(fmt)
+    except (ValueError, RuntimeError) as e:
+        raise SystemExit(str(e))
+    for table in args.tables:
+        out = Path(args.out or Path(args.out_dir) / f"{table}{columnar.FORMATS[fmt]}")
+        out.parent.mkdir(parents=True, exist_ok=True)
+        t0 = time.perf_counter()
+        _, size = columnar.export_file(table, columnar.source_path(table, cfg), out, fmt,
+                                       args.since, args.until, args.batch_rows)
+        t1 = time.perf_counter()
+        cols = columnar.load(out)
+        t2 = time.perf_counter()
+        print(f"{table}: {len(cols['time'])} 行 -> {out}（{size / 1e6:.1f} MB，导出 {t1 - t0:.2f}s，"
+              f"读回 {(t2 - t1) * 1000:.1f} ms）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# scripts/hub_sim.py
+# -*- coding: utf-8 -*-
+"""
+汇聚站压测：N 个模拟温室节点并发向 /hub/api/ingest 推送 gzip 压缩的 NDJSON 批次，
+每个节点先回填 --days 天的历史（加速时间），再按实时节奏上报；结束后校验最新状态与跨节点对比查询
+
+  # 本进程内以仿真硬件 + 汇聚站模式启动应用并压测
+  python scripts/hub_sim.py --spawn --nodes 12 --days 3 --duration 20
+
+  # 压测已运行的汇聚站
+  python scripts/hub_sim.py --base-url http://hub.local:5000 --token <hub.token> --user admin --password ...
+"""
+import argparse, gzip, json, math, os, random, sys, tempfile, threading, time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from scripts.loadtest import Stats, login      # noqa: E402
+
+
+class SimNode:
+    """一个温室节点：昼夜曲线 + 各自偏移的读数，偶尔浇水事件与识别结果；seq 单调递增"""
+    def __init__(self, name, seed):
+        self.name = name
+        self.rng = random.Random(seed)
+        self.offset = self.rng.uniform(-3, 3)
+        self.soil = self.rng.uniform(40, 70)
+        self.seq = 0
+        self.sent_seq = 0
+
+    def records(self, ts):
+        sun = max(0.0, math.sin(2 * math.pi * ((ts % 86400) / 86400) - math.pi / 2))
+        self.soil = max(5.0, self.soil - 0.01)
+        self.seq += 1
+        out = [{"kind": "sensor", "seq": self.seq, "ts": ts,
+                "temperature_c": round(20 + self.offset + 6 * sun + self.rng.gauss(0, 0.3), 2),
+                "humidity_pct": round(70 - 20 * sun + self.rng.gauss(0, 1), 2),
+                "light_lux": round(max(0.0, 5 + 900 * sun + self.rng.gauss(0, 10)), 1),
+                "eCO2_ppm": int(450 + 150 * (1 - sun)), "TVOC_ppb": int(30 + self.rng.gauss(0, 3)),
+                "soil_moisture_pct": round(self.soil, 2)}]
+        if self.soil < 35:
+            self.seq += 1
+            self.soil += 12
+            out.append({"kind": "event", "seq": self.seq, "ts": ts, "action": "pump_on", "detail": "3s"})
+        if self.rng.random() < 0.01:
+            self.seq += 1
+            out.append({"kind": "inference", "seq": self.seq, "ts": ts, "label": self.rng.choice(["healthy", "leaf_spot"]),
+                        "confidence": round(self.rng.uniform(0.6, 0.99), 3)})
+        return out
+
+
+def run_node(node, base, token, stats, stop, args, totals):
+    s = requests.Session()
+    s.headers.update({"Authorization": f"Bearer {token}", "X-Node-Id": node.name,
+                      "Content-Encoding": "gzip", "Content-Type": "application/x-ndjson"})
+    now = time.time()
+    ts = now - args.days * 86400
+    pending = []
+    while not stop.is_set():
+        backfill = ts < time.time()
+        while len(pending) < args.batch and ts < time.time():
+            pending.extend(node.records(ts))
+            ts += args.interval
+        if not pending:
+            stop.wait(args.interval)
+            continue
+        body = gzip.compress(b"".join(json.dumps(r, separators=(",", ":")).encode() + b"\n" for r in pending), 6)
+        t = time.perf_counter()
+        try:
+            r = s.post(f"{base}/hub/api/ingest", data=body, timeout=30)
+            ok = r.status_code == 200
+            stats.add(time.perf_counter() - t, ok, len(body))
+            if ok:
+                with stats._lock:
+                    totals["records"] += len(pending)
+                node.sent_seq = pending[-1]["seq"]
+                pending = []
+        except requests.RequestException:
+            stats.add(time.perf_counter() - t, False)
+        if not backfill:
+            stop.wait(args.interval)
+
+
+def spawn_hub(port, token):
+    """本进程内以仿真硬件 + 汇聚站模式启动应用（临时配置：开启 hub，数据写到临时目录）"""
+    os.environ["PLANTAI_SIM"] = "1"
+    os.environ["PLANTAI_HUB_TOKEN"] = token
+    os.chdir(ROOT)
+    import logging
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    from werkzeug.serving import make_server
+    from src.utils.storage import load_yaml, save_yaml
+    from src.api.devices import CFG_PATH, DEFAULT_CFG
+    tmp = tempfile.mkdtemp(prefix="plantai_hub_")
+    c = load_yaml(os.environ.get("PLANTAI_CFG", CFG_PATH), DEFAULT_CFG)
+    c["hub"] = dict(c.get("hub") or DEFAULT_CFG["hub"], enabled=True, root=os.path.join(tmp, "hub"))
+    save_yaml(os.path.join(tmp, "config.yaml"), c)
+    import app as plantai
+    flask_app = plantai.create_app(os.path.join(tmp, "config.yaml"))
+    srv = make_server("127.0.0.1", port, flask_app, threaded=True)
+    threading.Thread(target=srv.serve_forever, name="hub-sim-server", daemon=True).start()
+    deadline = time.time() + 60
+    while time.time() < deadline and not plantai.services.all_done():
+        time.sleep(0.2)
+    return srv, plantai
+
+
+def main():
+    ap = argparse.ArgumentParser(description="PlantAI 汇聚站多节点并发上报压测")
+    ap.add_argument("--base-url", default="http://127.0.0.1:5000")
+    ap.add_argument("--token", default=os.environ.get("PLANTAI_HUB_TOKEN", "hub-sim-token"))
+    ap.add_argument("--user", default="admin")
+    ap.add_argument("--password", default="admin123")
+    ap.add_argument("--spawn", action="store_true", help="本进程内启动仿真汇聚站")
+    ap.add_argument("--port", type=int, default=5056)
+    ap.add_argument("--nodes", type=int, default=8, help="模拟节点数（每个一个线程）")
+    ap.add_argument("--days", type=float, default=1.0, help="每个节点先回填的天数")
+    ap.add_argument("--interval", type=float, default=60.0, help="读数间隔（秒，模拟时间）")
+    ap.add_argument("--batch", type=int, default=500, help="每批最多记录数")
+    ap.add_argument("--duration", type=float, default=20)
+    ap.add_argument("--json", help="结果另存为 JSON")
+    args = ap.parse_args()
+
+    base = args.base_url.rstrip("/")
+    srv = plantai = None
+    if args.spawn:
+        srv, plantai = spawn_hub(args.port, args.token)
+        base = f"http://127.0.0.1:{args.port}"
+        admin = plantai.cfg["users"]["default_admin"]
+        args.user, args.password = admin["username"], admin["password"]
+
+    stats, totals, stop = Stats("ingest"), {"records": 0}, threading.Event()
+    nodes = [SimNode(f"gh-{i:02d}", i) for i in range(args.nodes)]
+    threads = [threading.Thread(target=run_node, args=(n, base, args.token, stats, stop, args, totals), daemon=True)
+               for n in nodes]
+    print(f"{len(nodes)} 个节点 -> {base}，回填 {args.days} 天，持续 {args.duration:.0f}s ...")
+    t0, started = time.perf_counter(), time.time()
+    for t in threads: t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads: t.join(timeout=30)
+    wall = time.perf_counter() - t0
+
+    res = stats.summary(wall)
+    res["records"] = totals["records"]
+    res["records_per_s"] = round(totals["records"] / wall, 1)
+    print(f"批次 {res['ok']}（失败 {res['errors']}），记录 {res['records']}（{res['records_per_s']}/s），"
+          f"上行 {res['mb']} MB，p50 {res['p50_ms']} ms，p95 {res['p95_ms']} ms")
+
+    s = login(base, args.user, args.password)
+    t = time.perf_counter()
+    latest = s.get(f"{base}/hub/api/latest", timeout=30).json()
+    t_latest = time.perf_counter() - t
+    seen = {n["node"]: n for n in latest["nodes"]}
+    missing = [n.name for n in nodes if n.name not in seen]
+    behind = [n.name for n in nodes if n.name in seen and seen[n.name]["received_seq"] != n.sent_seq]
+    t = time.perf_counter()
+    cmp_ = s.get(f"{base}/hub/api/compare", params={"field": "temperature_c", "since": started - args.days * 86400,
+                                                    "until": time.time() + 1}, timeout=60).json()
+    t_cmp = time.perf_counter() - t
+    counted = sum(sum(v["count"]) for k, v in cmp_["nodes"].items() if k in {n.name for n in nodes})
+    sensors = sum(seen[n.name]["counts"]["sensor"] for n in nodes if n.name in seen)
+    print(f"latest: {len(latest['nodes'])} 个节点 {t_latest*1000:.1f} ms；缺失 {missing or '无'}，序号未追上 {behind or '无'}")
+    print(f"compare: {len(cmp_['nodes'])} 个节点 × {len(cmp_['t'])} 桶 {t_cmp*1000:.1f} ms；"
+          f"桶内计数 {counted} / 传感器记录 {sensors}")
+    res.update({"latest_ms": round(t_latest * 1000, 1), "compare_ms": round(t_cmp * 1000, 1),
+                "missing": missing, "behind": behind})
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(res, f, ensure_ascii=False, indent=2)
+    if srv is not None:
+        srv.shutdown()
+        plantai.services.stop_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+# scripts/loadtest.py
+# -*- coding: utf-8 -*-
+"""
+端到端压测：模拟仪表盘轮询、控制请求、历史查询、PDF 报表、/predict 上传与 N 个并发 /video_feed 观看者，
+输出各场景 p50/p95/p99 延迟与吞吐；准入控制拒绝的请求（503）单独计为 shed
+
+  # 在开发机上连同仿真硬件一起启动应用并压测
+  python scripts/loadtest.py --spawn-sim --duration 30 --dashboard 10 --history 2 --predict 2 --viewers 8
+
+  # 重分析 / 识别负载下控制接口延迟是否平稳（请求分级，见 admission 配置）
+  python scripts/loadtest.py --spawn-sim --control 2 --history 6 --history-n 100000 --reports 2 --predict 6 --viewers 0
+
+  # 压测已运行的实例（树莓派）
+  python scripts/loadtest.py --base-url http://192.168.1.20:5000 --user shuang --password raspberry
+"""
+import argparse, json, logging, os, sys, threading, time
+from io import BytesIO
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return None
+    k = (len(sorted_vals) - 1) * p / 100.0
+    lo = int(k); hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+class Stats:
+    def __init__(self, name):
+        self.name = name
+        self.lat = []          # 秒
+        self.errors = 0
+        self.shed = 0          # 503（准入控制拒绝）
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, dt, ok=True, nbytes=0, shed=False):
+        with self._lock:
+            if shed: self.shed += 1
+            elif ok: self.lat.append(dt)
+            else: self.errors += 1
+            self.bytes += nbytes
+
+    def summary(self, wall_s):
+        v = sorted(self.lat)
+        ms = lambda x: None if x is None else round(x * 1000, 1)
+        return {"scenario": self.name, "ok": len(v), "errors": self.errors, "shed": self.shed,
+                "rps": round(len(v) / wall_s, 2) if wall_s else None,
+                "p50_ms": ms(percentile(v, 50)), "p95_ms": ms(percentile(v, 95)),
+                "p99_ms": ms(percentile(v, 99)), "max_ms": ms(v[-1] if v else None),
+                "mb": round(self.bytes / 1e6, 2)}
+
+
+def login(base, user, password):
+    s = requests.Session()
+    r = s.post(f"{base}/login", data={"username": user, "password": password}, allow_redirects=False, timeout=15)
+    if r.status_code not in (302, 303):
+        raise SystemExit(f"登录失败: HTTP {r.status_code}")
+    return s
+
+
+def _jpeg_bytes(path=None):
+    if path:
+        return open(path, "rb").read()
+    from PIL import Image
+    import numpy as np
+    arr = (np.random.default_rng(0).random((480, 640, 3)) * 255).astype("uint8")
+    out = BytesIO(); Image.fromarray(arr).save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+def run_requests(stop, session_factory, stats, fn, interval=0.0):
+    s = session_factory()
+    while not stop.is_set():
+        t = time.perf_counter()
+        try:
+            r = fn(s)
+            stats.add(time.perf_counter() - t, r.status_code < 400, len(r.content), shed=r.status_code == 503)
+        except requests.RequestException:
+            stats.add(time.perf_counter() - t, False)
+        if interval:
+            stop.wait(interval)
+
+
+def run_viewer(stop, session_factory, base, frames_stats, viewer_fps):
+    """读取 MJPEG 流，按 boundary 计帧；记录首帧时间与帧间隔"""
+    s = session_factory()
+    t0 = time.perf_counter()
+    n = 0; last = None
+    try:
+        with s.get(f"{base}/video_feed", stream=True, timeout=(5, 10)) as r:
+            if r.status_code >= 400:
+                frames_stats.add(0, False); return
+            for chunk in r.iter_content(chunk_size=64 * 1024):
+                if stop.is_set():
+                    break
+                k = chunk.count(b"--frame")
+                if k:
+                    now = time.perf_counter()
+                    frames_stats.add(now - (last or t0), True, len(chunk))
+                    last = now; n += k
+                else:
+                    frames_stats.bytes += len(chunk)
+    except requests.RequestException:
+        frames_stats.add(time.perf_counter() - t0, False)
+    wall = time.perf_counter() - t0
+    viewer_fps.append(n / wall if wall else 0.0)
+
+
+def spawn_sim_app(port):
+    """在本进程中以仿真硬件启动应用（werkzeug 多线程服务器）"""
+    os.environ["PLANTAI_SIM"] = "1"
+    os.chdir(ROOT)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    from werkzeug.serving import make_server
+    import app as plantai
+    flask_app = plantai.create_app()
+    srv = make_server("127.0.0.1", port, flask_app, threaded=True)
+    threading.Thread(target=srv.serve_forever, name="loadtest-server", daemon=True).start()
+    deadline = time.time() + 60
+    while time.time() < deadline and not plantai.services.all_done():
+        time.sleep(0.2)
+    cam = plantai.services.get("camera")
+    if cam is not None:
+        cam.start()
+    return srv, plantai.cfg["users"]["default_admin"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="PlantAI 端到端压测")
+    ap.add_argument("--base-url", default="http://127.0.0.1:5000")
+    ap.add_argument("--user", default="admin")
+    ap.add_argument("--password", default="admin123")
+    ap.add_argument("--spawn-sim", action="store_true", help="本进程内以仿真硬件启动应用")
+    ap.add_argument("--port", type=int, default=5055, help="--spawn-sim 时的监听端口")
+    ap.add_argument("--duration", type=float, default=30)
+    ap.add_argument("--dashboard", type=int, default=5, help="仪表盘轮询客户端数")
+    ap.add_argument("--poll-interval", type=float, default=0.0, help="轮询间隔（秒，0=不间断）")
+    ap.add_argument("--control", type=int, default=0, help="控制请求客户端数（POST /api/control 关水泵，每 0.5s 一次）")
+    ap.add_argument("--history", type=int, default=1, help="历史查询客户端数")
+    ap.add_argument("--history-n", type=int, default=500)
+    ap.add_argument("--reports", type=int, default=0, help="PDF 报表客户端数")
+    ap.add_argument("--predict", type=int, default=1, help="/predict 上传客户端数")
+    ap.add_argument("--image", help="上传用图片，默认生成 640x480 随机 JPEG")
+    ap.add_argument("--viewers", type=int, default=2, help="并发 /video_feed 观看者数")
+    ap.add_argument("--json", help="结果另存为 JSON")
+    args = ap.parse_args()
+
+    base = args.base_url.rstrip("/")
+    srv = None
+    if args.spawn_sim:
+        srv, admin = spawn_sim_app(args.port)
+        base = f"http://127.0.0.1:{args.port}"
+        args.user, args.password = admin["username"], admin["password"]
+
+    cookies = login(base, args.user, args.password).cookies
+    def session_factory():
+        s = requests.Session(); s.cookies.update(cookies); return s
+
+    img = _jpeg_bytes(args.image)
+    stop = threading.Event()
+    stats = {k: Stats(k) for k in ("dashboard", "control", "history", "reports", "predict", "video_frames")}
+    viewer_fps = []
+    threads = []
+    spec = [
+        (args.dashboard, lambda: run_requests(stop, session_factory, stats["dashboard"],
+                                              lambda s: s.get(f"{base}/api/sensors", timeout=30), args.poll_interval)),
+        (args.control, lambda: run_requests(stop, session_factory, stats["control"],
+                                            lambda s: s.post(f"{base}/api/control", json={"pump": False}, timeout=30), 0.5)),
+        (args.history, lambda: run_requests(stop, session_factory, stats["history"],
+                                            lambda s: s.get(f"{base}/api/history", params={"n": args.history_n}, timeout=60))),
+        (args.reports, lambda: run_requests(stop, session_factory, stats["reports"],
+                                            lambda s: s.get(f"{base}/api/reports/pdf", timeout=120))),
+        (args.predict, lambda: run_requests(stop, session_factory, stats["predict"],
+                                            lambda s: s.post(f"{base}/predict", files={"file": ("x.jpg", img, "image/jpeg")}, timeout=60))),
+        (args.viewers, lambda: run_viewer(stop, session_factory, base, stats["video_frames"], viewer_fps)),
+    ]
+    for n, target in spec:
+        for _ in range(n):
+            threads.append(threading.Thread(target=target, daemon=True))
+
+    print(f"压测 {base}，{args.duration:.0f}s，线程 {len(threads)} 个 ...")
+    t0 = time.perf_counter()
+    for t in threads: t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads: t.join(timeout=15)
+    wall = time.perf_counter() - t0
+
+    rows = [st.summary(wall) for st in stats.values() if st.lat or st.errors or st.shed]
+    print(f"\n{'场景':<14}{'成功':>8}{'失败':>6}{'503':>6}{'rps':>9}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'MB':>8}")
+    for r in rows:
+        print(f"{r['scenario']:<14}{r['ok']:>8}{r['errors']:>6}{r['shed']:>6}{r['rps'] or 0:>9}{r['p50_ms'] or 0:>9}"
+              f"{r['p95_ms'] or 0:>9}{r['p99_ms'] or 0:>9}{r['mb']:>8}")
+    if viewer_fps:
+        print(f"\n观看者 {len(viewer_fps)} 个，fps 平均 {sum(viewer_fps)/len(viewer_fps):.1f}，最低 {min(viewer_fps):.1f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"base_url": base, "duration_s": round(wall, 2), "args": vars(args), "scenarios": rows,
+                       "viewer_fps": [round(x, 2) for x in viewer_fps]}, f, ensure_ascii=False, indent=2)
+    if srv is not None:
+        srv.shutdown()
+        import app as plantai
+        plantai.services.stop_all()     # 释放摄像头帧环等共享内存
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,13 @@
 set -e
 REPO_DIR=/home/pi/PLANTAI-WEB
 cd $REPO_DIR
+BEFORE=$(git rev-parse HEAD)
 git pull --rebase
-sudo systemctl restart plantai.service || true
+# 只更新了模型检查点时不重启：服务会在后台加载、预热并热切换（configs/plantai_config.yaml 的 model:）
+CHANGED=$(git diff --name-only "$BEFORE" HEAD | grep -v '^checkpoints/' || true)
+if [ -n "$CHANGED" ]; then
+  sudo systemctl restart plantai.service || true
+else
+  echo "[OTA] only checkpoints changed, model will be hot-swapped"
+fi
 echo "[OTA] done at $(date)"
@@ -0,0 +1,140 @@
+# scripts/uplink_sim.py
+# -*- coding: utf-8 -*-
+"""
+上行队列端到端测试：本进程内起一个本地汇聚站替身（HubStore + 故障注入），
+节点日志先积压 --backlog-days 天的数据（模拟断网），汇聚站 --outage-s 秒后才上线，
+期间持续产生新记录；统计补传耗时、压缩比、发送线程 CPU 占比，并核对汇聚站收到的记录不多不少
+
+  python scripts/uplink_sim.py --backlog-days 3 --outage-s 5 --fail-rate 0.1 --max-kbps 0
+  python scripts/uplink_sim.py --backlog-days 7 --max-kbps 2000 --max-cpu 0.1
+"""
+import argparse, json, logging, os, random, sys, tempfile, threading, time
+from pathlib import Path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from scripts.hub_sim import SimNode                    # noqa: E402
+from src.hub import uplink as up                       # noqa: E402
+from src.hub.store import HubStore                     # noqa: E402
+from src.hub.routes import _decode, _BadBody           # noqa: E402
+
+
+def make_standin(store, fail_rate, latency_ms):
+    """汇聚站替身：只有 /hub/api/ingest；按 fail_rate 随机返回 503 / 处理后丢弃响应（连接中断）"""
+    from flask import Flask, request, jsonify, abort
+    app = Flask("hub-standin")
+    rng = random.Random(1)
+
+    @app.post("/hub/api/ingest")
+    def ingest():
+        if latency_ms:
+            time.sleep(latency_ms / 1000.0)
+        roll = rng.random()
+        if roll < fail_rate / 2:
+            return jsonify({"ok": False, "error": "injected"}), 503, {"Retry-After": "1"}
+        try:
+            data = _decode(request.get_data(), request.headers.get("Content-Encoding"), 64 << 20)
+        except _BadBody as e:
+            return jsonify({"ok": False, "error": str(e)}), e.status
+        after = request.headers.get("X-After-Seq", "")
+        res = store.ingest(request.headers["X-Node-Id"], data, int(after) if after.isdigit() else None)
+        if res.get("gap"):
+            return jsonify(dict(res, ok=False)), 409
+        if roll < fail_rate:
+            abort(500)          # 已入库但响应丢失：节点会重发，靠 seq 去重
+        return jsonify(dict(res, ok=True))
+    return app
+
+
+def thread_cpu(native_id):
+    """Linux：线程累计 CPU 秒数"""
+    try:
+        f = Path(f"/proc/self/task/{native_id}/stat").read_text().rsplit(")", 1)[1].split()
+        return (int(f[11]) + int(f[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="PlantAI 上行队列端到端测试")
+    ap.add_argument("--backlog-days", type=float, default=3.0, help="断网期间积压的天数（每分钟一条读数）")
+    ap.add_argument("--outage-s", type=float, default=5.0, help="汇聚站多少秒后上线")
+    ap.add_argument("--fail-rate", type=float, default=0.05, help="上线后请求失败概率（半数为 503，半数为响应丢失）")
+    ap.add_argument("--latency-ms", type=float, default=20)
+    ap.add_argument("--live-rps", type=float, default=5, help="补传期间每秒新产生的记录数")
+    ap.add_argument("--max-kbps", type=float, default=0)
+    ap.add_argument("--max-cpu", type=float, default=0.25)
+    ap.add_argument("--batch-max", type=int, default=5000)
+    ap.add_argument("--compression", default="gzip")
+    ap.add_argument("--port", type=int, default=5057)
+    ap.add_argument("--timeout", type=float, default=300)
+    args = ap.parse_args()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    tmp = Path(tempfile.mkdtemp(prefix="plantai_uplink_"))
+    journal = up.Journal(tmp / "journal", segment_kb=512)
+    node = SimNode("gh-sim", 7)
+    first = journal.next_seq
+    ts = time.time() - args.backlog_days * 86400
+    t = time.perf_counter()
+    while ts < time.time():
+        for r in node.records(ts):
+            journal.append(r.pop("kind"), {k: v for k, v in r.items() if k != "seq"})
+        ts += 60
+    print(f"积压 {journal.pending()} 条（{time.perf_counter() - t:.2f}s 写入），"
+          f"日志 {sum(f.stat().st_size for f in (tmp / 'journal').glob('*.ndjson')) / 1e6:.1f} MB")
+
+    store = HubStore(tmp / "hub", flush_interval_s=1)
+    sender = up.Uplink(journal, f"http://127.0.0.1:{args.port}", "gh-sim", compression=args.compression,
+                       batch_max=args.batch_max, max_kbps=args.max_kbps, max_cpu=args.max_cpu,
+                       backoff_max_s=10, ack_poll_s=1)
+    stop = threading.Event()
+    live = [0]
+    def produce():
+        while not stop.wait(1.0 / args.live_rps):
+            journal.append("sensor", {"temperature_c": 21.0, "soil_moisture_pct": 50.0})
+            live[0] += 1
+    threading.Thread(target=produce, daemon=True).start()
+
+    t0 = time.perf_counter()
+    cpu0 = thread_cpu(sender._thr.native_id)
+    time.sleep(args.outage_s)
+    print(f"断网 {args.outage_s:.0f}s：失败 {sender.failures} 次，状态 {sender.state}，下次重试 {sender.status()['retry_in_s']}s")
+    from werkzeug.serving import make_server
+    srv = make_server("127.0.0.1", args.port, make_standin(store, args.fail_rate, args.latency_ms), threaded=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    t_up = time.perf_counter()
+    caught_up = None
+
+    # 追上实时产生的记录后停止产生，再等最后一批落盘确认
+    while time.perf_counter() - t0 < args.timeout:
+        st = sender.status()
+        if not stop.is_set() and st["last_seq"] - st["sent"] <= args.live_rps * 2:
+            caught_up = time.perf_counter() - t_up
+            stop.set()
+        if stop.is_set() and st["pending"] == 0 and st["sent"] == st["last_seq"]:
+            break
+        time.sleep(0.2)
+    stop.set()
+    drain = time.perf_counter() - t_up
+    cpu = thread_cpu(sender._thr.native_id)
+    sender.close()
+    srv.shutdown()
+    store.close()
+
+    st, m = sender.status(), up.UPLINK_BYTES
+    raw, comp = m.labels("raw").value, m.labels("compressed").value
+    seqs = []
+    for f in (tmp / "hub" / "nodes" / "gh-sim").glob("*/*.ndjson"):
+        seqs.extend(json.loads(l)["seq"] for l in f.read_text().splitlines())
+    print(f"上线后 {caught_up or drain:.1f}s 追上实时，{drain:.1f}s 全部落盘确认（含期间新增 {live[0]} 条）；积压剩余 {st['pending']}，最终批大小 {st['batch']}")
+    print(f"上行 {raw / 1e6:.1f} MB -> {comp / 1e6:.2f} MB（压缩比 {raw / max(comp, 1):.1f}x），"
+          f"{comp * 8 / 1000 / max(drain, 1e-6):.0f} kbit/s；发送线程 CPU "
+          f"{'%.0f%%' % (100 * (cpu - cpu0) / (time.perf_counter() - t0)) if cpu is not None else '未知'}")
+    uniq = len(set(seqs))
+    print(f"节点写入 {st['last_seq'] - first + 1} 条；汇聚站落盘 {len(seqs)} 条，去重后 {uniq} 条，重复 {len(seqs) - uniq}；"
+          f"received_seq == 本地最后 seq: {store.latest()['nodes'][0]['received_seq'] == st['last_seq']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,31 @@
+# 采集线程把每帧发布到共享内存帧环（src/api/frame_ring.py），其他进程的观看者 / 推理直接映射读取
+# 没人要画面时由资源调度器（src/api/governor.py）经 gate 暂停或降频
 import os, time, subprocess
 import cv2
-from threading import Thread
+from threading import Thread, Condition
 from flask import Blueprint, Response, jsonify
+from src.utils.metrics import CAMERA_FRAMES, CAMERA_ENCODE, CAMERA_VIEWERS
+from src.api.frame_ring import FrameRing
+from src.api.governor import CaptureGate
+
+_CAPTURED, _ENCODED = CAMERA_FRAMES.labels("capture"), CAMERA_FRAMES.labels("encode")
 
 bp = Blueprint("camera_bp", __name__)
 
 class Camera:
-    def __init__(self, index=0, use_libcamera=True):
+    def __init__(self, index=0, use_libcamera=True, ring=None, ring_slots=4, jpeg_quality=80):
         self.index = index
         self.use_libcamera = use_libcamera
+        self.jpeg_quality = int(jpeg_quality)
         self.cap = None
         self.frame = None
+        self.frame_id = 0
         self.running = False
         self.thread = None
+        self.ring = FrameRing(ring, ring_slots) if ring else None
+        self._jpeg = None          # (frame_id, bytes)：帧环里已编码的最新 JPEG
+        self._cond = Condition()
+        self.gate = CaptureGate()
 
     def _has_libcamera(self):
         try:
@@ -30,29 +43,80 @@ class Camera:
             self.cap = cv2.VideoCapture(self.index)
         if not self.cap or not self.cap.isOpened():
             raise RuntimeError("无法打开摄像头")
+        try:
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)    # 暂停 / 降频后恢复时少丢几帧旧画面
+        except Exception:
+            pass
         self.running = True
-        self.thread = Thread(target=self._loop, daemon=True)
+        self.thread = Thread(target=self._loop, name="camera", daemon=True)
         self.thread.start()
 
+    def _encode(self, frame):
+        with CAMERA_ENCODE.time():
+            ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        if not ok: return None
+        _ENCODED.inc()
+        return buf.tobytes()
+
     def _loop(self):
         while self.running and self.cap.isOpened():
             ok, frame = self.cap.read()
             if ok:
-                self.frame = frame
+                _CAPTURED.inc()
+                jpeg = None
+                if self.ring is not None:
+                    _, jpeg = self.ring.publish(frame, self._encode)
+                with self._cond:
+                    self.frame = frame
+                    self.frame_id += 1
+                    self._jpeg = (self.frame_id, jpeg) if jpeg is not None else None
+                    self._cond.notify_all()
             else:
                 time.sleep(0.05)
+            if self.gate.pace(lambda: self.running) and self.running:
+                self.cap.grab()       # 丢掉暂停 / 降频期间驱动缓冲里的旧帧
+        if self.ring is not None:
+            self.ring.close()
 
     def get_jpeg(self):
+        self.gate.touch()
         if self.frame is None: return None
-        ok, buf = cv2.imencode(".jpg", self.frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-        return buf.tobytes() if ok else None
+        cached = self._jpeg
+        if cached is not None and cached[0] == self.frame_id:
+            return cached[1]
+        return self._encode(self.frame)
+
+    def wait_frame(self, last_id=-1, timeout=1.0):
+        """阻塞到有比 last_id 新的帧，返回 (frame_id, frame)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.frame_id > last_id or not self.running, timeout)
+            return self.frame_id, self.frame
+
+    def read_jpeg(self):
+        """等待下一帧并返回 JPEG（app 单进程模式 / RPC 回退路径；有帧环时观看者直接读帧环）"""
+        if not self.running:
+            return None
+        self.gate.touch()
+        fid, _ = self.wait_frame(self.frame_id, timeout=1.0)
+        return self.get_jpeg() if fid else None
 
     def release(self):
         self.running = False
+        self.gate.wake()
+        with self._cond:
+            self._cond.notify_all()
         time.sleep(0.05)
         if self.cap:
             self.cap.release()
 
+    # 与 app 中其他摄像头提供者一致的接口
+    def start(self):
+        if not self.running:
+            self.open()
+        return True
+
+    stop = release
+
 camera = Camera()
 
 @bp.route("/api/camera/start", methods=["POST"])
@@ -72,10 +136,11 @@ def stop_camera():
 @bp.route("/video_feed")
 def video_feed():
     def gen():
-        while True:
-            frame = camera.get_jpeg()
-            if frame is None:
-                time.sleep(0.05)
-                continue
-            yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame + b"\r\n")
+        with CAMERA_VIEWERS.track():
+            while True:
+                frame = camera.get_jpeg()
+                if frame is None:
+                    time.sleep(0.05)
+                    continue
+                yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame + b"\r\n")
     return Response(gen(), mimetype="multipart/x-mixed-replace; boundary=frame")
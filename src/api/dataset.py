@@ -0,0 +1,269 @@
+# src/api/dataset.py
+# -*- coding: utf-8 -*-
+"""
+训练数据集采集：从摄像头共享内存帧环取帧 -> 感知哈希去近重复 -> 低优先级线程池编码 ->
+按内容寻址分片存储（原图 + 缩略图）-> metadata.csv 追加一行（最近一次传感器读数 + 当前识别结果）
+
+目录布局（dataset.dir = data/dataset 时）：
+  data/dataset/images/ab/cd/<sha256>.jpg     原图（JPEG，文件名为内容 sha256，同图只存一份）
+  data/dataset/thumbs/ab/cd/<sha256>.jpg     缩略图（长边 thumb_px）
+  data/logs/metadata.csv                     每张图一行，configs/train_config.yaml 的 data.metadata_csv
+
+不与实时视频抢资源：
+- 帧直接从帧环拷出，不触发 JPEG 编码，不经过 RPC；只在持有硬件的进程中运行一份
+- 编码线程调低 nice（Linux 按线程生效），队列有上限，满了丢帧而不是积压
+- 写盘按 max_write_kb_s 限速，不 fsync，降低 SD 卡争用
+"""
+import csv, hashlib, os, threading, time
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from src.api.frame_ring import FrameRingReader
+from src.utils.metrics import counter, gauge, histogram
+from src.utils.scheduler import RepeatedTimer, lower_thread_priority
+
+DATASET_FRAMES = counter("plantai_dataset_frames", "数据集采集帧数", ("result",))
+DATASET_ENCODE = histogram("plantai_dataset_encode_seconds", "数据集一帧编码 + 写盘耗时")
+DATASET_QUEUE = gauge("plantai_dataset_queue", "等待编码的帧数")
+DATASET_BYTES = counter("plantai_dataset_bytes", "数据集写盘字节数")
+
+SENSOR_FIELDS = ["temperature_c", "humidity_pct", "light_lux", "eCO2_ppm", "TVOC_ppb", "soil_moisture_pct"]
+META_FIELDS = ["time", "path", "thumb", "sha256", "phash", "width", "height", "plant", "disease",
+               "pred_label", "pred_conf", "pred_age_s"] + SENSOR_FIELDS + ["sensor_age_s", "frame_id"]
+
+# 32x32 DCT-II 基（phash 用；矩阵乘法即二维 DCT）
+_N = 32
+_DCT = np.cos(np.pi * (2 * np.arange(_N)[None, :] + 1) * np.arange(_N)[:, None] / (2 * _N))
+
+
+def _resize(img, w, h):
+    try:
+        import cv2
+        return cv2.resize(img, (w, h), interpolation=cv2.INTER_AREA)
+    except ImportError:
+        from PIL import Image
+        return np.asarray(Image.fromarray(img).resize((w, h), Image.BILINEAR))
+
+
+def _encode_jpeg(img, quality):
+    """BGR -> JPEG bytes（cv2，没有时 PIL）"""
+    try:
+        import cv2
+        ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+        return buf.tobytes() if ok else None
+    except ImportError:
+        from io import BytesIO
+        from PIL import Image
+        b = BytesIO()
+        Image.fromarray(np.ascontiguousarray(img[:, :, ::-1])).save(b, format="JPEG", quality=int(quality))
+        return b.getvalue()
+
+
+def phash(img):
+    """64 位感知哈希：灰度缩到 32x32，二维 DCT 取左上 8x8 低频，与中位数比较"""
+    small = _resize(img, _N, _N).astype(np.float64)
+    gray = small @ np.array([0.114, 0.587, 0.299]) if small.ndim == 3 else small      # BGR
+    low = (_DCT @ gray @ _DCT.T)[:8, :8]
+    return int.from_bytes(np.packbits(low > np.median(low)).tobytes(), "big")
+
+
+def _popcount(a):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(a)
+    return np.unpackbits(a.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class DatasetCapture:
+    def __init__(self, ring, root="data/dataset", metadata_csv="data/logs/metadata.csv", interval_s=30,
+                 phash_distance=6, workers=1, nice=10, queue=8, jpeg_quality=92, thumb_px=160,
+                 max_write_kb_s=2048, pred_max_age_s=120, plant="", disease=""):
+        self.reader = FrameRingReader(ring) if ring else None
+        self.root = Path(root)
+        self.metadata_csv = Path(metadata_csv)
+        self.interval_s = max(1.0, float(interval_s))
+        self.phash_distance = int(phash_distance)
+        self.queue = max(1, int(queue))
+        self.jpeg_quality, self.thumb_px = int(jpeg_quality), int(thumb_px)
+        self.max_write = float(max_write_kb_s) * 1024
+        self.pred_max_age_s = float(pred_max_age_s)
+        self.plant, self.disease = plant, disease
+        self._pool = ThreadPoolExecutor(max(1, int(workers)), thread_name_prefix="dataset-enc",
+                                        initializer=lower_thread_priority, initargs=(nice,))
+        self._lock = threading.Lock()          # 哈希表 / 计数 / 队列
+        self._meta_lock = threading.Lock()     # metadata.csv 与写盘限速
+        self._next_write = 0.0
+        self._inflight = 0
+        self._last_id = 0
+        self._readings = deque(maxlen=64)      # (ts, 读数)，按时间升序
+        self._pred = None                      # (ts, label, conf)
+        self._timer = None
+        self.counts = {"saved": 0, "near_dup": 0, "dup": 0, "dropped": 0, "error": 0}
+        self.last = None
+        self._hashes, self.total = self._load_index()
+        self._meta = None
+
+    # --- 已有数据集：载入 phash 以便跨重启去重 ---
+    def _load_index(self):
+        hashes = []
+        if self.metadata_csv.is_file():
+            with open(self.metadata_csv, newline="", encoding="utf-8") as f:
+                for r in csv.DictReader(f):
+                    try: hashes.append(int(r["phash"], 16))
+                    except (KeyError, TypeError, ValueError): pass
+        return np.array(hashes, dtype=np.uint64), len(hashes)
+
+    # --- 上下文：传感器读数（采样线程回调）与识别结果 ---
+    def on_sample(self, d):
+        self._readings.append((d.get("timestamp", time.time()), d))
+
+    def note_prediction(self, label, confidence, ts=None):
+        self._pred = (ts or time.time(), label, float(confidence))
+
+    def _nearest_reading(self, ts):
+        readings = list(self._readings)
+        if not readings:
+            return None, None
+        i = bisect_left([r[0] for r in readings], ts)
+        best = min(readings[max(0, i - 1):i + 1], key=lambda r: abs(r[0] - ts))
+        return best[1], abs(best[0] - ts)
+
+    # --- 采集 ---
+    def start(self, interval_s=None, plant=None, disease=None):
+        """开始定时采集；可同时修改间隔与当前标注（plant / disease）"""
+        if interval_s:
+            self.interval_s = max(1.0, float(interval_s))
+        if plant is not None:
+            self.plant = plant
+        if disease is not None:
+            self.disease = disease
+        if self._timer is not None:
+            self._timer.stop()
+        self._timer = RepeatedTimer(self.interval_s, self.capture_once, name="dataset")
+        return self.status()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        return self.status()
+
+    def snap(self):
+        """立即采一帧，返回结果（saved / near_dup / dropped / no_frame）"""
+        return self.capture_once()
+
+    def capture_once(self):
+        # 摄像头可能被资源调度暂停：取帧即告知写者，等恢复出新帧
+        f = self.reader.read_fresh(self._last_id, copy=True) if self.reader is not None else None
+        if f is None:
+            return "no_frame"        # 摄像头未启动或没有新帧
+        self._last_id = f.frame_id
+        h = phash(f.image)
+        with self._lock:
+            if len(self._hashes):
+                d = int(_popcount(self._hashes ^ np.uint64(h)).min())
+                if d <= self.phash_distance:
+                    return self._count("near_dup")
+            if self._inflight >= self.queue:
+                return self._count("dropped")
+            self._hashes = np.append(self._hashes, np.uint64(h))
+            self._inflight += 1
+            DATASET_QUEUE.set(self._inflight)
+        reading, sensor_age = self._nearest_reading(f.timestamp)
+        pred = self._pred
+        if pred is not None and abs(f.timestamp - pred[0]) > self.pred_max_age_s:
+            pred = None
+        row = {"time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(f.timestamp)),
+               "phash": f"{h:016x}", "width": f.image.shape[1], "height": f.image.shape[0],
+               "plant": self.plant, "disease": self.disease, "frame_id": f.frame_id,
+               "pred_label": pred[1] if pred else "", "pred_conf": round(pred[2], 4) if pred else "",
+               "pred_age_s": round(f.timestamp - pred[0], 1) if pred else "",
+               "sensor_age_s": round(sensor_age, 1) if reading else ""}
+        for k in SENSOR_FIELDS:
+            row[k] = reading.get(k, "") if reading else ""
+        self._pool.submit(self._store, f.image, row)
+        return "queued"
+
+    def _count(self, result):
+        self.counts[result] += 1
+        DATASET_FRAMES.labels(result).inc()
+        return result
+
+    # --- 编码线程 ---
+    def _store(self, img, row):
+        try:
+            with DATASET_ENCODE.time():
+                jpeg = _encode_jpeg(img, self.jpeg_quality)
+                sha = hashlib.sha256(jpeg).hexdigest()
+                shard = Path(sha[:2]) / sha[2:4] / f"{sha}.jpg"
+                path, thumb = self.root / "images" / shard, self.root / "thumbs" / shard
+                if path.exists():
+                    with self._lock:
+                        self._count("dup")
+                    return
+                h, w = img.shape[:2]
+                s = self.thumb_px / max(h, w)
+                small = _encode_jpeg(_resize(img, max(1, round(w * s)), max(1, round(h * s))), 70)
+                self._write(thumb, small)
+                self._write(path, jpeg)
+            row.update(path=str(path), thumb=str(thumb), sha256=sha)
+            self._append_meta(row)
+            with self._lock:
+                self._count("saved")
+                self.total += 1
+                self.last = {k: row[k] for k in ("time", "path", "phash", "pred_label")}
+        except Exception as e:
+            with self._lock:
+                self._count("error")
+            print("数据集写入失败:", e)
+        finally:
+            with self._lock:
+                self._inflight -= 1
+                DATASET_QUEUE.set(self._inflight)
+
+    def _write(self, path, data):
+        """原子写入（临时文件 + rename）；按 max_write_kb_s 限速"""
+        if self.max_write > 0:
+            with self._meta_lock:
+                now = time.monotonic()
+                start = max(now, self._next_write)
+                self._next_write = start + len(data) / self.max_write
+            if start > now:
+                time.sleep(start - now)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        DATASET_BYTES.inc(len(data))
+
+    def _append_meta(self, row):
+        with self._meta_lock:
+            if self._meta is None:
+                self.metadata_csv.parent.mkdir(parents=True, exist_ok=True)
+                new = not self.metadata_csv.exists() or self.metadata_csv.stat().st_size == 0
+                self._meta = open(self.metadata_csv, "a", newline="", encoding="utf-8")
+                self._writer = csv.DictWriter(self._meta, META_FIELDS)
+                if new:
+                    self._writer.writeheader()
+            self._writer.writerow(row)
+            self._meta.flush()
+
+    def status(self):
+        with self._lock:
+            return {"running": self._timer is not None, "interval_s": self.interval_s, "total": self.total,
+                    "queue": self._inflight, "plant": self.plant, "disease": self.disease,
+                    "metadata_csv": str(self.metadata_csv), "counts": dict(self.counts), "last": self.last}
+
+    def close(self):
+        self.stop()
+        self._pool.shutdown(wait=True)
+        with self._meta_lock:
+            if self._meta is not None:
+                self._meta.close()
+                self._meta = None
+        if self.reader is not None:
+            self.reader.close()
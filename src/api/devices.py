@@ -0,0 +1,521 @@
+# src/api/devices.py
+# -*- coding: utf-8 -*-
+"""
+硬件子系统：配置、传感器采样器、执行器、摄像头、历史记录器与自动控制定时器
+- 单进程运行（python app.py）时由 Web 进程直接持有
+- 多 worker 部署时只由硬件守护进程（src/hwd/server.py）持有，Web worker 通过 RPC 代理访问
+"""
+import os, socket, time
+from datetime import datetime
+from pathlib import Path
+
+from src.utils.lazy import SubsystemRegistry, timed_import
+from src.utils.storage import load_yaml, save_yaml, append_csv
+from src.utils.scheduler import RepeatedTimer
+
+CFG_PATH = "configs/plantai_config.yaml"
+
+DEFAULT_CFG = {
+    "theme": "auto",
+    "log_interval_min": 30,
+    "sample_interval_s": 5,
+    "history_csv": "data/history.csv",
+    "history": {"flush_rows": 32, "flush_interval_s": 60, "fsync": "flush",
+                "compress_after_days": 7, "compression": "gzip"},
+    "camera": {"use_libcamera": True, "index": 0, "ring": "plantai_cam0", "ring_slots": 4, "jpeg_quality": 80},
+    "auto_control": {
+        "enabled": True,
+        "quiet_hours": [23,7],
+        "soil_low_threshold": 35,
+        "pump_duration_s": 3,
+        "pump_cooldown_s": 300,
+        "light_target_lux": 350,
+        "light_cooldown_s": 300,
+        "normal_light_brightness": 70,
+        "ws2812": {"enabled": False, "mode":"white", "brightness":128, "duration_s":10}
+    },
+    "users": {
+        "default_admin": {"username": "admin", "password": "admin123"}
+    },
+    "simulate": {"enabled": False},
+    "serving": {"workers": 0, "threads": 8, "socket": "data/hwd.sock"},
+    "uplink": {"enabled": False, "url": "", "node_id": "", "token": "", "dir": "data/uplink",
+               "sensor_interval_s": 60, "max_kbps": 0, "max_cpu": 0.25},
+    "hub": {"enabled": False, "hardware": True, "root": "data/hub", "token": "", "bucket_s": 300,
+            "flush_interval_s": 5, "fsync": "flush", "compress_after_days": 7, "compression": "gzip"},
+    "model": {"watch": True, "store": "data/models", "poll_s": 10, "settle_s": 3, "warmup_runs": 3,
+              "max_latency_ratio": 3.0, "min_agreement": 0.0, "keep": 5},
+    "dataset": {"enabled": False, "autostart": False, "dir": "data/dataset", "metadata_csv": "data/logs/metadata.csv",
+                "interval_s": 30, "phash_distance": 6, "workers": 1, "nice": 10, "max_write_kb_s": 2048,
+                "plant": "", "disease": ""},
+    "admission": {"enabled": True},
+    "stats": {"enabled": True, "windows": {"1h": 3600, "24h": 86400, "7d": 604800}, "buckets": 240,
+              "fast_s": 300, "slow_s": 3600, "z": 5.0, "warmup": 30, "cooldown_s": 600},
+    "governor": {"enabled": True, "linger_s": 15, "camera_idle_fps": 0, "idle_sample_s": 60, "poll_s": 0.03},
+    "regions": {"grid": {"rows": 2, "cols": 3, "margin": 0.0}, "plants": [], "history_csv": "data/plants.csv"},
+    "streaming": {"enabled": True, "host": "0.0.0.0", "port": 5001, "public_url": "", "require_login": True,
+                  "heartbeat_s": 15, "send_timeout_s": 10, "event_queue": 256, "max_clients": 500},
+}
+
+# --- 配置（load_config 时加载；app.cfg 与此为同一对象）---
+cfg = {}
+_cfg_state = {"path": CFG_PATH, "mtime": None}
+
+# --- 子系统登记表（app.services 与此为同一对象）---
+services = SubsystemRegistry()
+
+
+def load_config(path=None):
+    """读取配置到 cfg（原地更新），path 默认取环境变量 PLANTAI_CFG"""
+    path = path or os.environ.get("PLANTAI_CFG", CFG_PATH)
+    cfg.clear()
+    cfg.update(load_yaml(path, DEFAULT_CFG))
+    _cfg_state["path"] = path
+    try: _cfg_state["mtime"] = os.stat(path).st_mtime
+    except OSError: _cfg_state["mtime"] = None
+    Path(cfg["history_csv"]).parent.mkdir(parents=True, exist_ok=True)
+    Path("data").mkdir(exist_ok=True)
+    Path("configs").mkdir(exist_ok=True)
+    return cfg
+
+def config_path():
+    return _cfg_state["path"]
+
+def reload_if_changed():
+    """配置文件被其他进程改写（设置页经守护进程保存）后重新读取；只做一次 stat"""
+    try:
+        mtime = os.stat(_cfg_state["path"]).st_mtime
+    except OSError:
+        return False
+    if mtime == _cfg_state["mtime"]:
+        return False
+    load_config(_cfg_state["path"])
+    return True
+
+def sim_cfg():
+    """仿真硬件配置：simulate.enabled 为 true 或环境变量 PLANTAI_SIM=1 时返回，否则 None"""
+    sim = dict(cfg.get("simulate") or {})
+    if os.environ.get("PLANTAI_SIM", "0") not in ("", "0"):
+        sim["enabled"] = True
+    return sim if sim.get("enabled") else None
+
+# ===================== 子系统工厂 =====================
+def _make_sensors():
+    SensorSampler = timed_import("src.api.sampler").SensorSampler
+    sim = sim_cfg()
+    if sim:
+        suite = timed_import("src.sim.sensors").SimSensorSuite(
+            latency_ms=sim.get("latency_ms", 20), noise=sim.get("noise", 0.02),
+            fail_rate=sim.get("fail_rate", 0.0), day_s=sim.get("day_s", 86400))
+    else:
+        suite = timed_import("src.api.sensors").SensorSuite()
+    return SensorSampler(suite, interval_s=int(cfg.get("sample_interval_s", 5)))
+
+def _make_actuators():
+    hcfg = cfg.get("hardware", {})
+    wcfg = hcfg.get("ws2812", {})
+    sim = sim_cfg()
+    if sim:
+        hw = timed_import("src.sim.hardware")
+        sampler = services.get("sensors", timeout=5)
+        kw = {"latency_ms": sim.get("gpio_latency_ms", 0), "fail_rate": sim.get("fail_rate", 0.0)}
+        return {
+            "pump": hw.SimPumpController(pin=int(hcfg.get("pump_pin", 23)),
+                                         suite=sampler.suite if sampler else None, **kw),
+            "light": hw.SimLightController(pin=int(hcfg.get("light_pin", 24)), **kw),
+            "ws": hw.SimWS2812Controller(led_count=int(wcfg.get("led_count", 18))),
+        }
+    hw = timed_import("src.api.hardware")
+    return {
+        "pump": hw.PumpController(pin=int(hcfg.get("pump_pin", 23)), active_high=False),
+        "light": hw.SimpleLightController(pin=int(hcfg.get("light_pin", 24)), pwm=False),
+        "ws": hw.WS2812Controller(led_count=int(wcfg.get("led_count", 18)),
+                                  gpio_pin=int(wcfg.get("gpio_pin", 18))),
+    }
+
+def frame_ring_name():
+    """摄像头共享内存帧环名（camera.ring，空则不启用）"""
+    return (cfg.get("camera") or {}).get("ring", "plantai_cam0") or None
+
+def _make_camera():
+    ccfg = cfg.get("camera", {})
+    index = int(ccfg.get("index",0))
+    ring = {"ring": frame_ring_name(), "ring_slots": int(ccfg.get("ring_slots", 4))}
+    sim = sim_cfg()
+    if sim:
+        c = sim.get("camera", {})
+        return timed_import("src.sim.camera").SimCamera(
+            index=index, width=c.get("width", 640), height=c.get("height", 480), fps=c.get("fps", 15),
+            latency_ms=c.get("latency_ms", 0), fail_rate=sim.get("fail_rate", 0.0), **ring)
+    return timed_import("src.api.camera").Camera(index=index, use_libcamera=bool(ccfg.get("use_libcamera", True)),
+                                                 jpeg_quality=int(ccfg.get("jpeg_quality", 80)), **ring)
+
+def _make_history():
+    hc = cfg.get("history") or {}
+    HistoryWriter = timed_import("src.utils.history").HistoryWriter
+    return HistoryWriter(cfg["history_csv"], CSV_HEADER,
+                         flush_rows=hc.get("flush_rows", 32), flush_interval_s=hc.get("flush_interval_s", 60),
+                         fsync=hc.get("fsync", "flush"), compress_after_days=hc.get("compress_after_days", 7),
+                         compression=hc.get("compression", "gzip"))
+
+def hub_cfg():
+    """汇聚站配置：hub.enabled 为 true 时返回，否则 None"""
+    hc = cfg.get("hub") or {}
+    return hc if hc.get("enabled") else None
+
+def _make_hub():
+    hc = hub_cfg()
+    HubStore = timed_import("src.hub.store").HubStore
+    return HubStore(hc.get("root", "data/hub"), bucket_s=hc.get("bucket_s", 300),
+                    flush_interval_s=hc.get("flush_interval_s", 5), fsync=hc.get("fsync", "flush"),
+                    compress_after_days=hc.get("compress_after_days", 7), compression=hc.get("compression", "gzip"),
+                    offline_after_s=hc.get("offline_after_s", 900))
+
+def _make_timers():
+    # 定时器：历史记录 + 自动控制（1分钟）
+    return {
+        "record": RepeatedTimer(max(5, int(cfg.get("log_interval_min",30))*60), record_once, name="recorder"),
+        "auto": RepeatedTimer(60, auto_control_tick, name="auto-control"),
+    }
+
+def _stop_timers(timers):
+    for t in timers.values():
+        t.stop()
+
+def _stop_actuators(acts):
+    try: acts["ws"].close()
+    except Exception: pass
+
+def _make_uplink():
+    uc = cfg.get("uplink") or {}
+    up = timed_import("src.hub.uplink")
+    j = up.Journal(uc.get("dir", "data/uplink"), segment_kb=uc.get("segment_kb", 1024),
+                   fsync_interval_s=uc.get("fsync_interval_s", 5), max_mb=uc.get("max_journal_mb", 512))
+    sender = up.Uplink(j, uc["url"], uc.get("node_id") or socket.gethostname(),
+                       token=os.environ.get("PLANTAI_UPLINK_TOKEN") or uc.get("token", ""),
+                       compression=uc.get("compression", "gzip"), level=uc.get("level", 6),
+                       batch_min=uc.get("batch_min", 50), batch_max=uc.get("batch_max", 5000),
+                       max_batch_kb=uc.get("max_batch_kb", 1024), max_kbps=uc.get("max_kbps", 0),
+                       max_cpu=uc.get("max_cpu", 0.25), backoff_max_s=uc.get("backoff_max_s", 300))
+    # 读数按 sensor_interval_s 抽样进日志（采样线程中调用，只做一次追加写）
+    every = float(uc.get("sensor_interval_s", 60))
+    last = [0.0]
+    def on_sample(d):
+        if d.get("timestamp", 0) - last[0] >= every:
+            last[0] = d.get("timestamp", time.time())
+            rec = {k: v for k, v in d.items() if k != "timestamp"}
+            rec["ts"] = last[0]
+            sender.append("sensor", rec)
+    services.get("sensors").add_listener(on_sample)
+    return sender
+
+def _make_dataset():
+    dc = cfg.get("dataset") or {}
+    DatasetCapture = timed_import("src.api.dataset").DatasetCapture
+    ds = DatasetCapture(frame_ring_name(), root=dc.get("dir", "data/dataset"),
+                        metadata_csv=dc.get("metadata_csv", "data/logs/metadata.csv"),
+                        interval_s=dc.get("interval_s", 30), phash_distance=dc.get("phash_distance", 6),
+                        workers=dc.get("workers", 1), nice=dc.get("nice", 10), queue=dc.get("queue", 8),
+                        jpeg_quality=dc.get("jpeg_quality", 92), thumb_px=dc.get("thumb_px", 160),
+                        max_write_kb_s=dc.get("max_write_kb_s", 2048), pred_max_age_s=dc.get("pred_max_age_s", 120),
+                        plant=dc.get("plant", ""), disease=dc.get("disease", ""))
+    sampler = services.get("sensors")
+    sampler.add_listener(ds.on_sample)
+    first = sampler.read_all(0)
+    if first:
+        ds.on_sample(first)
+    if dc.get("autostart"):
+        ds.start()
+    return ds
+
+def _make_streams():
+    sc = cfg.get("streaming") or {}
+    StreamServer = timed_import("src.api.streaming").StreamServer
+    srv = StreamServer(sc.get("host", "0.0.0.0"), sc.get("port", 5001), ring=frame_ring_name(),
+                       camera=services.get("camera"),
+                       secret=os.environ.get("PLANTAI_SECRET", "plantai-secret-key"),   # 与 app.secret_key 一致
+                       require_login=sc.get("require_login", True), fps=(cfg.get("camera") or {}).get("fps", 15),
+                       heartbeat_s=sc.get("heartbeat_s", 15), send_timeout_s=sc.get("send_timeout_s", 10),
+                       event_queue=sc.get("event_queue", 256), max_clients=sc.get("max_clients", 500))
+    sampler = services.get("sensors")
+    sampler.add_listener(lambda d: srv.publish("sensors", d))
+    first = sampler.read_all(0)
+    if first:
+        srv.publish("sensors", first)
+    return srv
+
+def _make_stats():
+    sc = cfg.get("stats") or {}
+    StreamStats = timed_import("src.utils.streamstats").StreamStats
+    def on_anomaly(a):
+        print(f"[异常] {a['channel']} {a['kind']} = {a['value']}（基线 {a.get('baseline')}）")
+        journal("event", {"action": "anomaly", "detail": f"{a['channel']} {a['kind']} {a['value']}"})
+        publish_event("anomaly", a)
+    st = StreamStats(windows=sc.get("windows"), buckets=sc.get("buckets", 240), fast_s=sc.get("fast_s", 300),
+                     slow_s=sc.get("slow_s", 3600), z=sc.get("z", 5.0), warmup=sc.get("warmup", 30),
+                     min_std=sc.get("min_std"), rules=sc.get("rules"), cooldown_s=sc.get("cooldown_s", 600),
+                     on_anomaly=on_anomaly)
+    sampler = services.get("sensors")
+    sampler.add_listener(st.add)
+    first = sampler.read_all(0)
+    if first:
+        st.add(first)
+    return st
+
+def _make_governor():
+    gc = cfg.get("governor") or {}
+    active = int(cfg.get("sample_interval_s", 5))
+    # 降频下限：不慢于历史记录、自动控制（60 秒）与上行采样所需
+    floor = [float(gc.get("idle_sample_s", 60)), max(5, int(cfg.get("log_interval_min", 30))) * 60, 60]
+    uc = cfg.get("uplink") or {}
+    if uc.get("enabled"):
+        floor.append(float(uc.get("sensor_interval_s", 60)))
+    Governor = timed_import("src.api.governor").Governor
+    return Governor(camera=services.get("camera"), sampler=services.get("sensors"),
+                    streams=lambda: services.get("streams"), active_sample_s=active,
+                    idle_sample_s=max(active, min(floor)), camera_idle_fps=gc.get("camera_idle_fps", 0),
+                    linger_s=gc.get("linger_s", 15), poll_s=gc.get("poll_s", 0.03))
+
+def local_subsystems():
+    """持有硬件的进程中登记的、worker 需经 RPC 访问的子系统名"""
+    hc = hub_cfg()
+    names = [] if hc and not hc.get("hardware", True) else ["sensors", "camera", "control"]
+    if (cfg.get("uplink") or {}).get("enabled") and names:
+        names.append("uplink")
+    if (cfg.get("dataset") or {}).get("enabled") and names:
+        names.append("dataset")
+    if (cfg.get("stats") or {}).get("enabled") and names:
+        names.append("stats")
+    if (cfg.get("streaming") or {}).get("enabled") and names:
+        names.append("streams")
+    if (cfg.get("governor") or {}).get("enabled") and names:
+        names.append("governor")
+    return names + (["hub"] if hc else [])
+
+def register_hardware():
+    """登记硬件子系统（由持有硬件的进程调用，且只能有一个这样的进程）；hub 存储也只能有一个写者，一并登记"""
+    hc = hub_cfg()
+    if hc:
+        services.register("hub", _make_hub, stop=lambda h: h.close())
+        if not hc.get("hardware", True):
+            return      # 纯汇聚站：不接传感器与执行器
+    services.register("sensors", _make_sensors, stop=lambda s: s.stop())
+    services.register("actuators", _make_actuators, stop=_stop_actuators)
+    services.register("camera", _make_camera, stop=lambda c: c.stop())
+    services.register("control", Controller, requires=("actuators",))
+    services.register("history", _make_history, stop=lambda w: w.close())
+    services.register("timers", _make_timers, requires=("sensors", "history"), stop=_stop_timers)
+    if (cfg.get("uplink") or {}).get("enabled"):
+        services.register("uplink", _make_uplink, requires=("sensors",), stop=lambda u: u.close())
+    if (cfg.get("dataset") or {}).get("enabled"):
+        services.register("dataset", _make_dataset, requires=("sensors",), stop=lambda d: d.close())
+    if (cfg.get("stats") or {}).get("enabled"):
+        services.register("stats", _make_stats, requires=("sensors",))
+    if (cfg.get("streaming") or {}).get("enabled"):
+        services.register("streams", _make_streams, requires=("sensors", "camera"), stop=lambda s: s.close())
+    if (cfg.get("governor") or {}).get("enabled"):
+        services.register("governor", _make_governor, requires=("sensors", "camera"), stop=lambda g: g.close())
+
+def read_sensors(timeout=None):
+    """采样器中的最新读数；传感器尚未就绪时返回 None"""
+    sampler = services.get("sensors")
+    return sampler.read_all(timeout) if sampler else None
+
+# --- 历史记录器 ---
+CSV_HEADER = ["时间", "温度°C", "湿度%", "光照lux", "CO₂ ppm", "TVOC ppb", "土壤湿度%"]
+
+def record_once():
+    d = read_sensors(timeout=30)
+    writer = services.get("history")
+    if d is None or writer is None:
+        return
+    writer.append([
+        time.strftime("%Y-%m-%d %H:%M:%S"),
+        d.get("temperature_c"),
+        d.get("humidity_pct"),
+        d.get("light_lux"),
+        d.get("eCO2_ppm"),
+        d.get("TVOC_ppb"),
+        d.get("soil_moisture_pct"),
+    ])
+    print("Recorded:", d)
+
+# --- 上行队列（节点 -> 汇聚站）---
+def journal(kind, rec):
+    """写入上行日志（uplink 未开启或未就绪时忽略）；kind: sensor | event | inference"""
+    up = services.get("uplink")
+    if up is not None:
+        try:
+            up.append(kind, rec)
+        except Exception as e:
+            print("上行日志写入失败:", e)
+
+def publish_event(event, data):
+    """推给 SSE 订阅者（streaming 未开启或未就绪时忽略）"""
+    streams = services.get("streams")
+    if streams is not None:
+        try:
+            streams.publish(event, data)
+        except Exception as e:
+            print("事件推送失败:", e)
+
+def record_inference(rec):
+    """识别结果：进上行日志、推给 SSE 订阅者，并作为数据集采集的“当前识别结果”"""
+    journal("inference", rec)
+    publish_event("inference", dict(rec, time=time.time()))
+    ds = services.get("dataset")
+    if ds is not None:
+        try:
+            ds.note_prediction(rec["label"], rec["confidence"])
+        except Exception as e:
+            print("数据集记录识别结果失败:", e)
+
+def record_plants(results, backend, source):
+    """分区识别结果：每个区域一行写 regions.history_csv，整帧一条进上行日志并推给 SSE 订阅者"""
+    now = time.time()
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+    regions = timed_import("src.api.regions")
+    regions.append_results((cfg.get("regions") or {}).get("history_csv", "data/plants.csv"),
+                           [[stamp, r["name"], r["label"], r["confidence"], backend] for r in results])
+    rec = {"backend": backend, "source": source,
+           "regions": [{k: r[k] for k in ("name", "label", "confidence")} for r in results]}
+    journal("inference", rec)
+    publish_event("plants", dict(rec, time=now))
+
+def log_action(action, detail):
+    """动作写 actions.csv，并进上行日志"""
+    append_csv("data/actions.csv", ["time","action","detail"], [
+        time.strftime("%Y-%m-%d %H:%M:%S"), action, detail
+    ])
+    journal("event", {"action": action, "detail": detail})
+    publish_event("action", {"action": action, "detail": detail, "time": time.time()})
+
+# --- 自动控制器 ---
+_last_actions = {"pump": 0, "light": 0, "ws": 0}  # 节流防呆
+def _within_quiet_hours(quiets):
+    """quiets: [start_hour, end_hour], e.g. [23,7]"""
+    try:
+        start, end = int(quiets[0]), int(quiets[1])
+    except:
+        return False
+    now_h = datetime.now().hour
+    if start < end:
+        return start <= now_h < end
+    else:
+        # 例如 23~7： 23,0,1,...6
+        return (now_h >= start) or (now_h < end)
+
+def actuate_pump(duration_s: int):
+    # TODO 接入你的 PumpController，如：pump.on(); sleep; pump.off()
+    duration_s = max(1, min(30, int(duration_s)))
+    print(f"[自动控制] 启动水泵 {duration_s}s（模拟）")
+    # 写动作日志到 CSV（也可写DB）
+    log_action("pump_on", f"{duration_s}s")
+
+def actuate_light(brightness: int):
+    # 普通补光
+    brightness = max(0, min(100, int(brightness)))
+    print(f"[自动控制] 打开普通补光，亮度 {brightness}%（模拟）")
+    log_action("light_on", f"{brightness}%")
+
+def actuate_ws(mode: str, brightness: int, duration_s: int):
+    # 灯效在后台渲染线程中播放，到时自动熄灭，这里立即返回
+    print(f"[自动控制] WS2812 {mode}, bri={brightness}, dur={duration_s}s")
+    acts = services.get("actuators")
+    if acts is None:
+        raise RuntimeError("执行器初始化中")
+    acts["ws"].set_mode(mode, brightness, duration_s)
+    log_action("ws_on", f"{mode},{brightness},{duration_s}s")
+
+def auto_control_tick():
+    ac = cfg.get("auto_control", {})
+    if not ac.get("enabled", False):
+        return
+    d = read_sensors(timeout=30)
+    if d is None:
+        return
+    now = time.time()
+    if _within_quiet_hours(ac.get("quiet_hours",[23,7])):
+        # 夜间静音，不浇水、不强制补光
+        return
+
+    # 土壤湿度低 -> 浇水
+    soil = d.get("soil_moisture_pct")
+    if soil is not None and soil < float(ac.get("soil_low_threshold", 35)):
+        if now - _last_actions["pump"] > float(ac.get("pump_cooldown_s", 300)):  # 默认距离上次浇水至少5分钟
+            actuate_pump(ac.get("pump_duration_s", 3))
+            _last_actions["pump"] = now
+
+    # 光照不足 -> 补光（优先WS2812）
+    lux = d.get("light_lux")
+    target = float(ac.get("light_target_lux", 350))
+    light_cd = float(ac.get("light_cooldown_s", 300))
+    if lux is not None and lux < target:
+        # 若需要补光
+        if ac.get("ws2812",{}).get("enabled", False):
+            if now - _last_actions["ws"] > light_cd:
+                ws = ac["ws2812"]
+                actuate_ws(ws.get("mode","white"), int(ws.get("brightness",128)), int(ws.get("duration_s",10)))
+                _last_actions["ws"] = now
+        else:
+            if now - _last_actions["light"] > light_cd:
+                actuate_light(int(ac.get("normal_light_brightness",70)))
+                _last_actions["light"] = now
+
+# --- 控制入口（手动控制 + 设置变更）---
+class Controller:
+    """
+    /api/control 与 /api/settings 的实际执行者：一次请求的全部动作在持有硬件的进程内完成，
+    多 worker 部署时 worker 只发一次 RPC
+    """
+    def control(self, data):
+        """手动控制：返回 {"pump":..., "light":..., "ws":...}"""
+        result = {"pump": None, "light": None, "ws": None}
+        acts = services.get("actuators")
+        # 水泵控制
+        if "pump" in data:
+            if data["pump"]:
+                dur = max(1, min(30, int(data.get("pump_duration", 3))))
+                actuate_pump(dur)
+                result["pump"] = f"ON {dur}s"
+            else:
+                acts["pump"].off()
+
+        # WS2812 控制
+        if "ws_enable" in data:
+            if data["ws_enable"]:
+                mode = data.get("ws_mode", "white")
+                bri = max(0, min(255, int(data.get("ws_brightness", 128))))
+                dur = max(1, min(60, int(data.get("ws_duration", 10))))
+                actuate_ws(mode, bri, dur)
+                result["ws"] = f"ON {mode},{bri},{dur}s"
+            else:
+                acts["ws"].off()
+                result["ws"] = "OFF"
+
+        # 记录日志
+        log_action("manual", str(result))
+        return result
+
+    def apply_settings(self, data):
+        """更新主题 / 采集周期 / 自动控制参数并保存，返回新配置"""
+        # 主题
+        if "theme" in data:
+            cfg["theme"] = data["theme"]
+        # 采集周期
+        if "log_interval_min" in data:
+            cfg["log_interval_min"] = max(1, int(data["log_interval_min"]))
+            timers = services.get("timers")
+            if timers is not None:
+                timers["record"].stop()
+                timers["record"] = RepeatedTimer(cfg["log_interval_min"]*60, record_once, name="recorder")
+        # 自动控制
+        if "auto_control" in data and isinstance(data["auto_control"], dict):
+            cfg["auto_control"].update(data["auto_control"])
+        save_yaml(config_path(), cfg)
+        try: _cfg_state["mtime"] = os.stat(config_path()).st_mtime
+        except OSError: pass
+        return cfg
+
+    def config(self):
+        return cfg
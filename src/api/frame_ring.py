@@ -0,0 +1,269 @@
+# src/api/frame_ring.py
+# -*- coding: utf-8 -*-
+"""
+摄像头帧共享内存环（multiprocessing.shared_memory）：一个写者（采集线程），任意多个读者进程
+- 每个槽位同时存原始 BGR 帧与（按需编码的）JPEG；同一帧只编码一次，所有观看者共享
+- 槽位头为 seqlock：写入期间 seq 为奇数，完成后加 2；读者读前后比较 seq，不加锁、不阻塞写者
+- 读者拿到的是共享内存上的 numpy 视图（零拷贝）；处理完用 valid(frame) 确认期间未被覆盖，
+  被覆盖（落后 n_slots 帧以上）则丢弃结果重读
+- 只有读者在近 JPEG_IDLE_S 秒内要过 JPEG 时写者才编码，没人看视频时不花编码 CPU
+- 读者取帧 / 取 JPEG 时在全局头记下时间，写者一侧据此判断是否有人要帧（demand_ts，资源调度用）
+
+布局：[全局头 64B][槽位头 32B × n][原始帧 × n][JPEG × n]
+"""
+import struct, time
+from collections import namedtuple
+from multiprocessing import shared_memory
+import numpy as np
+
+from src.utils.metrics import counter
+
+MAGIC = b"PFR1"
+JPEG_IDLE_S = 2.0
+_HDR = struct.Struct("<4sIIIIIIIdq")    # magic, n_slots, height, width, channels, jpeg_cap, closed, 保留, jpeg_req_ts, latest_id
+_HDR_SIZE = 64
+_SEQ = struct.Struct("<Q")
+_META = struct.Struct("<qdI")           # frame_id, timestamp, jpeg_len（紧跟 seq 之后）
+_SLOT_SIZE = 32
+_OFF_CLOSED, _OFF_REQ, _OFF_LATEST = 24, 32, 40
+_OFF_WANT = 48                          # 原始帧读者最近一次取帧时间（double），在 _HDR 之后
+
+TORN_READS = counter("plantai_frame_ring_retries", "读取时槽位正被写入/已被覆盖而重读的次数")
+
+Frame = namedtuple("Frame", "frame_id timestamp image slot seq")
+_OWNED = set()     # 本进程作为写者创建的段名
+
+
+def _align(n, a=64):
+    return (n + a - 1) // a * a
+
+
+class _Layout:
+    def __init__(self, n_slots, height, width, channels, jpeg_cap):
+        self.n, self.h, self.w, self.c, self.jpeg_cap = n_slots, height, width, channels, jpeg_cap
+        self.frame_bytes = height * width * channels
+        self.raw_off = _align(_HDR_SIZE + _SLOT_SIZE * n_slots)
+        self.jpeg_off = _align(self.raw_off + self.frame_bytes * n_slots)
+        self.size = self.jpeg_off + jpeg_cap * n_slots
+
+    def views(self, buf):
+        raw = np.ndarray((self.n, self.h, self.w, self.c), np.uint8, buf, self.raw_off)
+        jpeg = np.ndarray((self.n, self.jpeg_cap), np.uint8, buf, self.jpeg_off)
+        return raw, jpeg
+
+    @staticmethod
+    def slot_off(i):
+        return _HDR_SIZE + _SLOT_SIZE * i
+
+
+class FrameRing:
+    """写者：由采集线程持有；帧尺寸变化时自动重建（旧段标记 closed，读者会重新挂载）"""
+    def __init__(self, name, n_slots=4, jpeg_cap=None):
+        self.name = name
+        self.n_slots = max(2, int(n_slots))
+        self.jpeg_cap = jpeg_cap
+        self._shm = None
+        self._layout = None
+        self._next = 1
+
+    def _create(self, shape):
+        h, w = shape[:2]
+        c = shape[2] if len(shape) > 2 else 1
+        self.close()
+        try:   # 上次异常退出遗留的同名段
+            old = shared_memory.SharedMemory(self.name)
+            old.close(); old.unlink()
+        except FileNotFoundError:
+            pass
+        lay = _Layout(self.n_slots, h, w, c, self.jpeg_cap or max(64 * 1024, _align(h * w * c // 4)))
+        self._shm = shared_memory.SharedMemory(self.name, create=True, size=lay.size)
+        _OWNED.add(self.name)
+        self._layout = lay
+        buf = self._shm.buf
+        _HDR.pack_into(buf, 0, MAGIC, lay.n, h, w, c, lay.jpeg_cap, 0, 0, 0.0, 0)
+        for i in range(lay.n):
+            _SEQ.pack_into(buf, lay.slot_off(i), 0)
+            _META.pack_into(buf, lay.slot_off(i) + 8, -1, 0.0, 0)
+        self._raw, self._jpeg = lay.views(buf)
+
+    def jpeg_wanted(self):
+        if self._shm is None:
+            return False
+        req = struct.unpack_from("<d", self._shm.buf, _OFF_REQ)[0]
+        return time.time() - req < JPEG_IDLE_S
+
+    def demand_ts(self):
+        """读者最近一次取帧 / 取 JPEG 的时间（unix 秒）；段未创建时 0"""
+        if self._shm is None:
+            return 0.0
+        buf = self._shm.buf
+        return max(struct.unpack_from("<d", buf, _OFF_REQ)[0], struct.unpack_from("<d", buf, _OFF_WANT)[0])
+
+    def publish(self, frame, encode=None):
+        """写入一帧；encode(frame)->bytes 仅在有 JPEG 读者时调用（在持有槽位之前完成）。返回 (frame_id, jpeg|None)"""
+        lay = self._layout
+        if lay is None or frame.shape[:2] != (lay.h, lay.w) or (frame.shape[2] if frame.ndim > 2 else 1) != lay.c:
+            self._create(frame.shape)
+            lay = self._layout
+        jpeg = encode(frame) if encode is not None and self.jpeg_wanted() else None
+        fid = self._next
+        self._next += 1
+        i = fid % lay.n
+        buf = self._shm.buf
+        off = lay.slot_off(i)
+        seq = _SEQ.unpack_from(buf, off)[0]
+        _SEQ.pack_into(buf, off, seq + 1)                 # 奇数：写入中
+        self._raw[i].reshape(frame.shape)[...] = frame
+        jl = 0
+        if jpeg is not None and len(jpeg) <= lay.jpeg_cap:
+            jl = len(jpeg)
+            self._jpeg[i, :jl] = np.frombuffer(jpeg, np.uint8)
+        _META.pack_into(buf, off + 8, fid, time.time(), jl)
+        _SEQ.pack_into(buf, off, seq + 2)                 # 偶数：完成
+        struct.pack_into("<q", buf, _OFF_LATEST, fid)
+        return fid, jpeg
+
+    def close(self):
+        if self._shm is None:
+            return
+        struct.pack_into("<I", self._shm.buf, _OFF_CLOSED, 1)
+        self._raw = self._jpeg = None
+        shm, self._shm, self._layout = self._shm, None, None
+        try: shm.close()
+        except BufferError: pass
+        try: shm.unlink()
+        except FileNotFoundError: pass
+        _OWNED.discard(self.name)
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name, track=False)      # Python ≥ 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        if name in _OWNED:      # 同进程内的读者：登记属于写者，不能注销
+            return shm
+        # 旧版本会把挂载方也登记到 resource_tracker，读者进程退出时会误删写者的段
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class FrameRingReader:
+    """读者：不加锁；写者尚未创建或已重建时自动（重新）挂载"""
+    def __init__(self, name, poll_s=0.005):
+        self.name = name
+        self.poll_s = poll_s
+        self._shm = None
+        self._layout = None
+
+    def _ensure(self):
+        if self._shm is not None and struct.unpack_from("<I", self._shm.buf, _OFF_CLOSED)[0] == 0:
+            return True
+        self.close()
+        try:
+            shm = _attach(self.name)
+        except FileNotFoundError:
+            return False
+        magic, n, h, w, c, cap, closed, _, _, _ = _HDR.unpack_from(shm.buf, 0)
+        if magic != MAGIC or closed:
+            shm.close()
+            return False
+        self._shm, self._layout = shm, _Layout(n, h, w, c, cap)
+        self._raw, self._jpeg = self._layout.views(shm.buf)
+        return True
+
+    def latest_id(self):
+        if not self._ensure():
+            return 0
+        return struct.unpack_from("<q", self._shm.buf, _OFF_LATEST)[0]
+
+    def _slot(self, fid):
+        """(seq, timestamp, jpeg_len) ；槽位正被写入或已被更新的帧覆盖时返回 None"""
+        lay, buf = self._layout, self._shm.buf
+        off = lay.slot_off(fid % lay.n)
+        seq = _SEQ.unpack_from(buf, off)[0]
+        if seq & 1:
+            return None
+        got, ts, jl = _META.unpack_from(buf, off + 8)
+        return (seq, ts, jl) if got == fid else None
+
+    def read(self, last_id=0, copy=False):
+        """比 last_id 新的最新帧（Frame，image 默认为零拷贝视图）；没有则 None"""
+        if self._ensure():
+            struct.pack_into("<d", self._shm.buf, _OFF_WANT, time.time())
+        for _ in range(4):
+            fid = self.latest_id()
+            if fid <= last_id:
+                return None
+            meta = self._slot(fid)
+            if meta is not None:
+                seq, ts, _ = meta
+                i = fid % self._layout.n
+                img = self._raw[i].copy() if copy else self._raw[i]
+                f = Frame(fid, ts, img, i, seq)
+                if not copy or self.valid(f):
+                    return f
+            TORN_READS.inc()
+        return None
+
+    def read_fresh(self, last_id=0, max_age_s=1.0, timeout=2.0, copy=False):
+        """比 last_id 新且拍摄于 max_age_s 秒内的帧；摄像头被暂停 / 降频时（read 已告知写者）轮询等待恢复，
+        最多 timeout 秒，仍没有新鲜帧时返回见到的最新一帧（可能为 None）"""
+        deadline = time.monotonic() + timeout
+        best = None
+        while True:
+            f = self.read(last_id, copy)
+            if f is not None:
+                if time.time() - f.timestamp <= max_age_s:
+                    return f
+                best, last_id = f, f.frame_id
+            if time.monotonic() >= deadline:
+                return best
+            time.sleep(self.poll_s)
+
+    def valid(self, frame):
+        """frame 的槽位自读取后未被改写（零拷贝视图用完后调用）"""
+        return self._shm is not None and _SEQ.unpack_from(self._shm.buf, self._layout.slot_off(frame.slot))[0] == frame.seq
+
+    def read_jpeg(self, last_id=0):
+        """(frame_id, JPEG bytes)；同时告知写者有 JPEG 读者。尚无 JPEG 时返回 (last_id, None)"""
+        if not self._ensure():
+            return last_id, None
+        struct.pack_into("<d", self._shm.buf, _OFF_REQ, time.time())
+        for _ in range(4):
+            fid = self.latest_id()
+            if fid <= last_id:
+                return last_id, None
+            meta = self._slot(fid)
+            if meta is not None:
+                seq, _, jl = meta
+                if jl == 0:
+                    return last_id, None        # 写者下一帧起才会编码
+                data = bytes(self._jpeg[fid % self._layout.n, :jl])
+                if _SEQ.unpack_from(self._shm.buf, self._layout.slot_off(fid % self._layout.n))[0] == seq:
+                    return fid, data
+            TORN_READS.inc()
+        return last_id, None
+
+    def wait_jpeg(self, last_id=0, timeout=1.0):
+        """轮询直到有新的 JPEG 帧或超时"""
+        deadline = time.monotonic() + timeout
+        while True:
+            fid, data = self.read_jpeg(last_id)
+            if data is not None:
+                return fid, data
+            if time.monotonic() >= deadline:
+                self.close()       # 写者可能崩溃后以同名重建，超时后下次重新挂载
+                return fid, data
+            time.sleep(self.poll_s)
+
+    def close(self):
+        shm, self._shm, self._layout = self._shm, None, None
+        self._raw = self._jpeg = None
+        if shm is not None:
+            try: shm.close()
+            except BufferError: pass     # 仍有零拷贝视图被引用，随进程回收
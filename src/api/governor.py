@@ -0,0 +1,170 @@
+# src/api/governor.py
+# -*- coding: utf-8 -*-
+"""
+按需资源调度：没人看的时候让摄像头与传感器采样歇下来，有人来立即恢复
+
+需求来源（都在持有硬件的进程内可见，不需要 worker 额外 RPC）：
+- 摄像头：推流服务的 MJPEG 观看者；帧环读者（各 worker 的 /predict、分区识别、回退的 /video_feed、
+  数据集采集，读帧时在共享内存头记下时间）；本进程内 camera.read_jpeg / get_jpeg
+- 传感器：SSE 订阅者（打开的仪表盘）；/api/sensors 读取（read_all(demand=True)，含经 RPC 的）；
+  有人要摄像头画面时也算
+
+最近 linger_s 秒内有需求为 active：摄像头全速，采样按 sample_interval_s；否则 idle：摄像头暂停
+（camera_idle_fps = 0）或降到 camera_idle_fps，采样降到 idle_sample_s（不超过历史记录 / 自动控制 / 上行
+所需的间隔）。调度线程每 poll_s 秒检查一次；从 idle 恢复时唤醒采集线程并立即采样一次，
+恢复到出第一帧的耗时进 plantai_governor_wake_seconds
+"""
+import threading, time
+
+from src.utils.metrics import counter, gauge, histogram
+
+GOV_STATE = gauge("plantai_governor_active", "资源调度状态（1 = active，0 = idle）", ("resource",))
+GOV_TRANSITIONS = counter("plantai_governor_transitions", "资源调度状态切换次数", ("resource", "to"))
+GOV_SUBSCRIBERS = gauge("plantai_governor_subscribers", "当前订阅者数", ("kind",))
+GOV_WAKE = histogram("plantai_governor_wake_seconds", "摄像头从 idle 恢复到出第一帧的耗时",
+                     buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+CAMERA_TARGET_FPS = gauge("plantai_camera_target_fps", "摄像头采集档位（0 = 暂停，-1 = 全速）")
+
+
+class CaptureGate:
+    """采集节流（摄像头持有，调度器设置）：fps None 全速，0 暂停，>0 降到该帧率"""
+    def __init__(self):
+        self.fps = None
+        self.demand_ts = 0.0        # 本进程内最近一次取帧（unix 秒）
+        self._wake = threading.Event()
+
+    def set(self, fps):
+        self.fps = fps
+        self._wake.set()
+
+    def wake(self):
+        self._wake.set()
+
+    def touch(self):
+        self.demand_ts = time.time()
+
+    def pace(self, running):
+        """采集线程每帧之后调用：按档位等待（set / wake 立即打断）；返回是否等待过（驱动缓冲里可能是旧帧）"""
+        waited = False
+        while running():
+            self._wake.clear()
+            fps = self.fps
+            if fps is None:
+                return waited
+            if fps > 0:
+                self._wake.wait(1.0 / fps)
+                return True
+            self._wake.wait(1.0)
+            waited = True
+        return waited
+
+
+class Governor:
+    def __init__(self, camera=None, sampler=None, streams=None, active_sample_s=5, idle_sample_s=60,
+                 camera_idle_fps=0, linger_s=15, poll_s=0.03):
+        self.camera, self.sampler = camera, sampler
+        self._streams = streams              # callable -> StreamServer | None（推流服务可能后启动）
+        self.active_sample_s, self.idle_sample_s = float(active_sample_s), float(max(active_sample_s, idle_sample_s))
+        self.camera_idle_fps = max(0.0, float(camera_idle_fps))
+        self.linger_s, self.poll_s = float(linger_s), float(poll_s)
+        self.state = {"camera": None, "sensors": None}
+        self.since = {"camera": time.time(), "sensors": time.time()}
+        self._counts = {"viewers": 0, "sse": 0}
+        self._wake_from = None               # (恢复时刻, 恢复前的 frame_id)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="governor", daemon=True)
+        self._thread.start()
+
+    # --- 需求 ---
+    def _camera_demand_ts(self):
+        cam = self.camera
+        ts = getattr(getattr(cam, "gate", None), "demand_ts", 0.0)
+        ring = getattr(cam, "ring", None)
+        return max(ts, ring.demand_ts()) if ring is not None else ts
+
+    def _tick(self):
+        now = time.time()
+        srv = self._streams() if self._streams else None
+        viewers, sse = srv.clients() if srv is not None else (0, 0)
+        if (viewers, sse) != (self._counts["viewers"], self._counts["sse"]):
+            self._counts.update(viewers=viewers, sse=sse)
+            GOV_SUBSCRIBERS.labels("viewers").set(viewers)
+            GOV_SUBSCRIBERS.labels("sse").set(sse)
+        cam_ts = self._camera_demand_ts()
+        cam_active = viewers > 0 or now - cam_ts < self.linger_s
+        sensor_ts = getattr(self.sampler, "demand_ts", 0.0)
+        sensor_active = cam_active or sse > 0 or now - sensor_ts < self.linger_s
+        self._apply_camera(cam_active)
+        self._apply_sensors(sensor_active)
+        self._note_wake()
+
+    def _switch(self, resource, active):
+        if self.state[resource] == active:
+            return False
+        first = self.state[resource] is None
+        self.state[resource] = active
+        self.since[resource] = time.time()
+        GOV_STATE.labels(resource).set(1 if active else 0)
+        if not first:
+            GOV_TRANSITIONS.labels(resource, "active" if active else "idle").inc()
+        return True
+
+    def _apply_camera(self, active):
+        gate = getattr(self.camera, "gate", None)
+        if gate is None or not self._switch("camera", active):
+            return
+        if active:
+            if gate.fps is not None and getattr(self.camera, "running", False):
+                self._wake_from = (time.perf_counter(), self.camera.frame_id)
+            gate.set(None)
+            CAMERA_TARGET_FPS.set(-1)
+        else:
+            gate.set(self.camera_idle_fps)
+            CAMERA_TARGET_FPS.set(self.camera_idle_fps)
+
+    def _apply_sensors(self, active):
+        if self.sampler is None or not self._switch("sensors", active):
+            return
+        if active:
+            # 降频期间缓存可能已旧：立即采一次
+            self.sampler.set_interval(self.active_sample_s, run_now=self.sampler.current_interval > self.active_sample_s)
+        else:
+            self.sampler.set_interval(self.idle_sample_s)
+
+    def _note_wake(self):
+        w = self._wake_from
+        if w is None:
+            return
+        if self.camera.frame_id > w[1]:
+            GOV_WAKE.observe(time.perf_counter() - w[0])
+            self._wake_from = None
+        elif time.perf_counter() - w[0] > 10 or not getattr(self.camera, "running", False):
+            self._wake_from = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self._tick()
+            except Exception as e:
+                print("资源调度出错:", e)
+            self._stop.wait(self.poll_s)
+
+    # --- 查询 / 关闭 ---
+    def status(self):
+        now = time.time()
+        st = {r: {"active": self.state[r], "for_s": round(now - self.since[r], 1)} for r in self.state}
+        st["camera"]["fps"] = getattr(getattr(self.camera, "gate", None), "fps", None)
+        st["sensors"]["interval_s"] = self.sampler.current_interval if self.sampler is not None else None
+        st["subscribers"] = dict(self._counts)
+        st["linger_s"] = self.linger_s
+        return st
+
+    def close(self):
+        """停止调度并恢复全速（摄像头 / 采样照常工作）"""
+        self._stop.set()
+        self._thread.join(timeout=2)
+        gate = getattr(self.camera, "gate", None)
+        if gate is not None:
+            gate.set(None)
+        if self.sampler is not None:
+            self.sampler.set_interval(self.active_sample_s)
@@ -1,8 +1,10 @@
-# src/pi/hardware.py
+# src/api/hardware.py
 import time
-import board
-import neopixel
-import RPi.GPIO as GPIO
+try:
+    import RPi.GPIO as GPIO
+except ImportError:  # 非树莓派环境（开发机/仿真），仅 WS2812Controller(sink=...) 可用
+    GPIO = None
+from src.api.ws_effects import EffectRenderer, NeoPixelSink, Solid, Sequence, build_effect
 
 # ==============================
 # 硬件控制类定义
@@ -67,33 +69,50 @@ class SimpleLightController:
 
 
 class WS2812Controller:
-    """WS2812 RGB 灯带控制"""
-    def __init__(self, led_count=18, gpio_pin=18, brightness=0.5):
+    """WS2812 RGB 灯带控制（灯效由后台 EffectRenderer 渲染，调用均不阻塞）"""
+    def __init__(self, led_count=18, gpio_pin=18, brightness=0.5, fps=30, sink=None):
         self.led_count = led_count
         self.gpio_pin = gpio_pin
         self.brightness = brightness
-        self.pixels = neopixel.NeoPixel(board.D18, self.led_count,
-                                        brightness=self.brightness, auto_write=False)
+        if sink is None:
+            import board, neopixel
+            self.pixels = neopixel.NeoPixel(board.D18, self.led_count,
+                                            brightness=self.brightness, auto_write=False)
+            sink = NeoPixelSink(self.pixels)
+        self.sink = sink
+        self.renderer = EffectRenderer(sink, self.led_count, fps=fps)
         print(f"🌈 WS2812 初始化完成，共 {self.led_count} 个LED")
 
     def fill_color(self, color):
         """color = (R,G,B)"""
-        self.pixels.fill(color)
-        self.pixels.show()
+        self.renderer.play(Solid(self.led_count, tuple(color)))
         print(f"🌈 WS2812 显示颜色: {color}")
 
+    def set_mode(self, mode="white", brightness=128, duration_s=None, **kw):
+        """
+        mode: white/red/green/blue/yellow/purple/warm/cool/sunlight
+              或灯效 sunrise/sunset/spectrum/gradient
+        brightness: 0~255；duration_s 到时自动熄灭（None 为常亮）
+        """
+        eff = build_effect(self.led_count, mode, brightness, duration_s, **kw)
+        self.renderer.play(eff)
+        print(f"🌈 WS2812 模式: {mode}, bri={brightness}, dur={duration_s}")
+        return eff
+
     def off(self):
-        self.fill_color((0, 0, 0))
+        self.renderer.blank()
         print("🌈 WS2812 关闭")
 
     def demo_cycle(self):
-        """简单的颜色循环示例"""
+        """简单的颜色循环示例（后台播放，立即返回）"""
         colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255),
                   (255, 255, 0), (255, 255, 255)]
-        for c in colors:
-            self.fill_color(c)
-            time.sleep(0.5)
-        self.off()
+        self.renderer.play(Sequence(self.led_count, colors, step_s=0.5))
+
+    def close(self):
+        self.renderer.blank()
+        time.sleep(2.0 / self.renderer.fps)
+        self.renderer.stop()
 
 # ==============================
 # 模块测试
@@ -109,7 +128,9 @@ if __name__ == "__main__":
         time.sleep(1)
         light.off()
         ws.demo_cycle()
+        time.sleep(3)
     finally:
+        ws.close()
         GPIO.cleanup()
         print("GPIO 清理完成")
 
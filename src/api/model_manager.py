@@ -0,0 +1,324 @@
+# src/api/model_manager.py
+# -*- coding: utf-8 -*-
+"""
+模型热切换：不重启服务更新 best_model.onnx
+
+- 后台线程轮询检查点文件（大小 / mtime 连续 settle_s 秒不变才算写完），或由管理接口触发
+- 候选模型先复制到 data/models/<sha256 前 12 位>.onnx（内容寻址，回滚不依赖检查点文件还在），
+  在后台加载、预热、跑冒烟集（输出有限且为合法分布、延迟不超过当前模型 max_latency_ratio 倍、
+  与当前模型结论一致率不低于 min_agreement），通过后一次赋值切换
+- 请求开始时 acquire() 拿到模型引用，进行中的请求在旧模型上跑完，旧模型随最后一个引用释放
+- data/models/active.json 记录当前版本与历史；多 worker 部署时只有拿到文件锁的进程验证候选，
+  其他 worker 看到 active.json 变化后跟随加载同一版本；回滚 = 激活历史中的上一个版本
+"""
+import hashlib, json, os, shutil, threading, time
+from pathlib import Path
+
+import numpy as np
+
+from src.api.model_runtime import resize_rgb, normalize_batch
+from src.utils.metrics import counter, gauge, histogram
+from src.utils.scheduler import RepeatedTimer, lower_thread_priority
+
+try:
+    import fcntl
+except ImportError:         # Windows 开发环境：单进程，无需跨进程锁
+    fcntl = None
+
+MODEL_SWAPS = counter("plantai_model_swaps", "模型热切换次数", ("result",))
+MODEL_LOAD = histogram("plantai_model_load_seconds", "候选模型加载 + 预热 + 冒烟测试耗时")
+MODEL_SWAPPED_AT = gauge("plantai_model_swapped_timestamp", "最近一次切换模型的时间（unix 秒）")
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ModelManager:
+    def __init__(self, load, initial, watch=None, store="data/models", smoke_dir=None, poll_s=10, settle_s=3,
+                 warmup_runs=3, max_latency_ratio=3.0, min_agreement=0.0, keep=5, nice=5):
+        """load(path) -> AutoPlantModel；initial 为没有 active.json 时加载的模型；watch 为要监视的检查点文件"""
+        self._load = load
+        self.watch = Path(watch) if watch else None
+        self.store = Path(store)
+        self.store.mkdir(parents=True, exist_ok=True)
+        self.smoke_dir = Path(smoke_dir) if smoke_dir else self.store / "smoke"
+        self.settle_s = float(settle_s)
+        self.warmup_runs = max(1, int(warmup_runs))
+        self.max_latency_ratio = float(max_latency_ratio)
+        self.min_agreement = float(min_agreement)
+        self.keep = max(2, int(keep))
+        self.nice = nice
+        self._busy = threading.Lock()          # 本进程同一时间只处理一个候选
+        self._watch_stat = None
+        self._state_mtime = None
+        self.last_report = None
+
+        state = self._read_state()
+        version = state.get("active")
+        if not version or not (self.store / f"{version}.onnx").is_file():
+            version = None
+            if initial and os.path.isfile(initial):
+                version = self._import(initial)
+                if not state.get("active"):
+                    state = dict(state, active=version, history=[version])
+                    if self.watch is not None and Path(initial) == self.watch:
+                        state["watched"] = version
+                    self._write_state(state)
+        # 还没有模型文件时 backend 为 unavailable，检查点出现后由轮询热加载
+        self._model = self._load(str(self.store / f"{version}.onnx") if version else str(initial))
+        self.version = version
+        self.loaded_at = time.time()
+        self._state_mtime = self._mtime(self.store / "active.json")
+        self._timer = RepeatedTimer(max(1, int(poll_s)), self._tick, name="model-watch")
+
+    # --- 请求侧 ---
+    def acquire(self):
+        """当前模型；一次请求内只调用一次，切换期间进行中的请求继续用拿到的这个"""
+        return self._model
+
+    # --- active.json ---
+    def _read_state(self):
+        try:
+            return json.loads((self.store / "active.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _write_state(self, state):
+        tmp = self.store / "active.json.tmp"
+        tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.store / "active.json")
+        self._state_mtime = self._mtime(self.store / "active.json")
+
+    @staticmethod
+    def _mtime(p):
+        try: return os.stat(p).st_mtime_ns
+        except OSError: return None
+
+    def _import(self, path):
+        """复制到内容寻址存储，返回版本号（sha256 前 12 位）"""
+        version = file_sha256(path)[:12]
+        dst = self.store / f"{version}.onnx"
+        if not dst.is_file():
+            tmp = dst.with_suffix(".tmp")
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, dst)
+        return version
+
+    def _prune(self, history):
+        keep = set(history[:self.keep])
+        for f in self.store.glob("*.onnx"):
+            if f.stem not in keep and f.stem != self.version:
+                try: f.unlink()
+                except OSError: pass
+
+    # --- 加载 / 预热 / 冒烟测试 ---
+    def _smoke_batch(self, size, mean, std):
+        files = sorted(p for p in self.smoke_dir.glob("*") if p.suffix.lower() in IMAGE_EXTS)[:32] \
+            if self.smoke_dir.is_dir() else []
+        if not files:
+            # 没有冒烟集时用固定随机图，只检查输出是否合法
+            return np.random.default_rng(0).normal(0, 1, (4, 3, size, size)).astype(np.float32)
+        from PIL import Image
+        imgs = []
+        for p in files:
+            with Image.open(p) as im:
+                imgs.append(resize_rgb(im, size))
+        return normalize_batch(np.stack(imgs), mean, std)
+
+    @staticmethod
+    def _latency(model, x, runs):
+        best = float("inf")
+        for _ in range(runs):
+            t = time.perf_counter()
+            model.predict_batch(x[:1])
+            best = min(best, time.perf_counter() - t)
+        return best
+
+    def _prepare(self, version, validate=True):
+        """加载并预热；validate 时跑冒烟集并与当前模型对比。返回 (模型 | None, 报告)"""
+        report = {"version": version, "ok": False, "at": time.time()}
+        t0 = time.perf_counter()
+        try:
+            cand = self._load(str(self.store / f"{version}.onnx"))
+            if cand.backend_name == "unavailable":
+                report["error"] = "模型加载失败"
+                return None, report
+            x = self._smoke_batch(cand.size, cand.mean, cand.std)
+            report["latency_ms"] = round(self._latency(cand, x, self.warmup_runs) * 1000, 2)
+            if validate:
+                probs = cand.predict_batch(x)
+                if not np.isfinite(probs).all() or not np.allclose(probs.sum(axis=1), 1, atol=1e-3):
+                    report["error"] = "输出不是合法的概率分布"
+                    return None, report
+                if cand.labels and probs.shape[1] != len(cand.labels):
+                    report["error"] = f"输出 {probs.shape[1]} 类，标签 {len(cand.labels)} 个"
+                    return None, report
+                cur = self._model
+                if cur.backend_name != "unavailable" and cur.size == cand.size:
+                    cur_ms = self._latency(cur, x, 1) * 1000
+                    report["current_latency_ms"] = round(cur_ms, 2)
+                    if report["latency_ms"] > cur_ms * self.max_latency_ratio:
+                        report["error"] = f"延迟 {report['latency_ms']} ms 超过当前模型 {self.max_latency_ratio} 倍"
+                        return None, report
+                    agree = float((cur.predict_batch(x).argmax(axis=1) == probs.argmax(axis=1)).mean())
+                    report["agreement"] = round(agree, 3)
+                    if agree < self.min_agreement:
+                        report["error"] = f"与当前模型一致率 {agree:.0%} 低于 {self.min_agreement:.0%}"
+                        return None, report
+                report["smoke_images"] = len(x)
+            report["ok"] = True
+            return cand, report
+        except Exception as e:
+            report["error"] = f"{type(e).__name__}: {e}"
+            return None, report
+        finally:
+            report["elapsed_s"] = round(time.perf_counter() - t0, 3)
+            MODEL_LOAD.observe(report["elapsed_s"])
+
+    def _swap(self, model, version, result):
+        old = self.version
+        self._model, self.version, self.loaded_at = model, version, time.time()
+        MODEL_SWAPS.labels(result).inc()
+        MODEL_SWAPPED_AT.set(self.loaded_at)
+        print(f"[模型] {old} -> {version}（{result}）")
+
+    # --- 跨进程锁 ---
+    def _locked(self, blocking):
+        """active.json 写者锁；拿不到返回 None"""
+        f = open(self.store / ".lock", "a")
+        if fcntl is None:
+            return f
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return f
+        except OSError:
+            f.close()
+            return None
+
+    # --- 切换入口 ---
+    def promote(self, path, watched=None):
+        """候选模型文件 -> 验证通过后切换并写 active.json；返回报告"""
+        with self._busy:
+            lock = self._locked(blocking=True)
+            try:
+                state = self._read_state()
+                if watched and state.get("watched") == watched:
+                    return {"version": watched, "ok": True, "note": "已由其他进程处理"}
+                version = self._import(path)
+                if watched or (self.watch is not None and Path(path) == self.watch):
+                    state["watched"] = version       # 回滚后不会把检查点文件再当成新候选
+                if version == self.version:
+                    report = {"version": version, "ok": True, "note": "与当前版本相同"}
+                else:
+                    model, report = self._prepare(version)
+                    if model is not None:
+                        self._swap(model, version, "swapped")
+                        state["active"] = version
+                        state["history"] = [version] + [v for v in state.get("history", []) if v != version]
+                    else:
+                        MODEL_SWAPS.labels("rejected").inc()
+                        state["rejected"] = (state.get("rejected", []) + [version])[-20:]
+                        print(f"[模型] 候选 {version} 未通过：{report.get('error')}")
+                self._write_state(state)
+                self._prune(state.get("history", []))
+                self.last_report = report
+                return report
+            finally:
+                lock.close()
+
+    def activate(self, version, result="rollback"):
+        """切到已存储的版本（回滚 / 指定版本），只预热不对比"""
+        with self._busy:
+            lock = self._locked(blocking=True)
+            try:
+                if not (self.store / f"{version}.onnx").is_file():
+                    raise ValueError(f"没有已存储的版本 {version}")
+                model, report = self._prepare(version, validate=False)
+                if model is None:
+                    MODEL_SWAPS.labels("failed").inc()
+                else:
+                    self._swap(model, version, result)
+                    state = self._read_state()
+                    state["active"] = version
+                    state["history"] = [version] + [v for v in state.get("history", []) if v != version]
+                    self._write_state(state)
+                self.last_report = report
+                return report
+            finally:
+                lock.close()
+
+    def rollback(self):
+        """回到历史中的上一个版本"""
+        history = [v for v in self._read_state().get("history", []) if v != self.version]
+        if not history:
+            raise ValueError("没有可回滚的版本")
+        return self.activate(history[0])
+
+    def start_async(self, fn, *args):
+        """管理接口：后台执行 promote / activate / rollback，立即返回"""
+        if self._busy.locked():
+            raise RuntimeError("已有模型切换在进行中")
+        def run():
+            lower_thread_priority(self.nice)
+            try:
+                fn(*args)
+            except Exception as e:
+                self.last_report = {"ok": False, "error": f"{type(e).__name__}: {e}", "at": time.time()}
+        threading.Thread(target=run, name="model-swap", daemon=True).start()
+
+    # --- 后台轮询 ---
+    def _tick(self):
+        lower_thread_priority(self.nice)
+        if self._busy.locked():
+            return
+        # 其他进程切换了版本：跟随
+        mt = self._mtime(self.store / "active.json")
+        if mt != self._state_mtime:
+            self._state_mtime = mt
+            active = self._read_state().get("active")
+            if active and active != self.version and (self.store / f"{active}.onnx").is_file():
+                with self._busy:
+                    model, report = self._prepare(active, validate=False)
+                    if model is not None:
+                        self._swap(model, active, "followed")
+                return
+        # 检查点文件变化：写完（连续两次 stat 相同且已过 settle_s）后作为候选
+        if self.watch is None:
+            return
+        try:
+            st = self.watch.stat()
+        except OSError:
+            return
+        if st.st_size == 0:
+            return      # 占位空文件 / 正在被截断重写
+        sig = (st.st_size, st.st_mtime_ns)
+        if self._watch_stat is None or self._watch_stat[0] != sig:
+            self._watch_stat = (sig, time.time(), False)
+            return
+        sig, since, handled = self._watch_stat
+        if handled or time.time() - since < self.settle_s:
+            return
+        self._watch_stat = (sig, since, True)
+        sha = file_sha256(self.watch)[:12]
+        state = self._read_state()
+        if sha in (state.get("watched"), self.version) or sha in state.get("rejected", []):
+            return
+        # 多个 worker 同时发现时，拿到锁的验证并写 active.json，其余在锁内看到 watched 已更新即返回，随后跟随
+        self.promote(str(self.watch), watched=sha)
+
+    def status(self):
+        state = self._read_state()
+        return {"version": self.version, "loaded_at": self.loaded_at, "backend": self._model.backend_name,
+                "busy": self._busy.locked(), "history": state.get("history", []),
+                "rejected": state.get("rejected", []), "watch": str(self.watch) if self.watch else None,
+                "last_report": self.last_report}
+
+    def close(self):
+        self._timer.stop()
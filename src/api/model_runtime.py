@@ -2,6 +2,12 @@ from pathlib import Path
 import numpy as np
 from PIL import Image
 import yaml
+from src.utils.metrics import histogram
+
+INFER_SECONDS = histogram("plantai_inference_seconds", "推理各阶段耗时", ("stage",))
+INFER_BATCH = histogram("plantai_inference_batch_size", "每次 sess.run 的 batch 大小",
+                        buckets=(1, 2, 4, 8, 16, 32, 64))
+_T_PRE, _T_RUN = INFER_SECONDS.labels("preprocess"), INFER_SECONDS.labels("run")
 
 def _load_preprocess(cfg_path: str):
     size = 224
@@ -15,8 +21,19 @@ def _load_preprocess(cfg_path: str):
     except Exception: pass
     return size, mean, std
 
+def resize_rgb(im: Image.Image, size: int, draft=True):
+    """PIL 图像 -> (size,size,3) uint8；JPEG 用 draft 让解码器直接按 1/2~1/8 缩小解码（仍不小于 2×size 再双线性缩放）"""
+    if draft and im.format == "JPEG":
+        im.draft("RGB", (size * 2, size * 2))
+    return np.asarray(im.convert("RGB").resize((size, size), Image.BILINEAR))
+
+def normalize_batch(x, mean, std):
+    """(N,size,size,3) uint8 -> (N,3,size,size) float32，一次向量化完成"""
+    scale = (1.0 / (255.0 * std)).astype(np.float32)
+    return np.ascontiguousarray(((x.astype(np.float32) * scale) - mean / std).transpose(0, 3, 1, 2))
+
 class AutoPlantModel:
-    def __init__(self, cfg_path, onnx_path, tflite_path, labels_path):
+    def __init__(self, cfg_path, onnx_path, tflite_path, labels_path, threads=None):
         self.backend_name = "unavailable"
         self._impl = None
         size, mean, std = _load_preprocess(cfg_path)
@@ -26,9 +43,14 @@ class AutoPlantModel:
         if onnx_path and Path(onnx_path).exists():
             try:
                 import onnxruntime as ort
-                self.sess = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+                so = ort.SessionOptions()
+                if threads:
+                    so.intra_op_num_threads = int(threads)   # 多进程部署时限制每个进程的推理线程数
+                self.sess = ort.InferenceSession(onnx_path, sess_options=so, providers=["CPUExecutionProvider"])
                 self.input = self.sess.get_inputs()[0].name
                 self.size = size; self.mean = mean; self.std = std; self.labels = labels
+                n = self.sess.get_inputs()[0].shape[0]
+                self.max_batch = n if isinstance(n, int) and n > 0 else None   # 导出时固定了 batch 维
                 self.backend_name = "onnxruntime"
                 self._impl = "onnx"
                 return
@@ -38,15 +60,51 @@ class AutoPlantModel:
         # 若需要再扩展 TFLite 版本
         # ...
 
-    def predict_pil(self, im: Image.Image):
-        if self._impl != "onnx":
-            return "unavailable", 0.0, []
+    def preprocess(self, im: Image.Image):
+        """PIL RGB -> (1,3,size,size) float32"""
         x = im.resize((self.size, self.size), Image.BILINEAR)
         x = np.array(x).astype(np.float32)/255.0
         x = (x - self.mean) / self.std
-        x = x.transpose(2,0,1)[None, ...]
-        prob = self.sess.run(None, {self.input: x})[0][0]
+        return x.transpose(2,0,1)[None, ...]
+
+    def predict_pil(self, im: Image.Image):
+        if self._impl != "onnx":
+            return "unavailable", 0.0, []
+        with _T_PRE.time():
+            x = self.preprocess(im)
+        with _T_RUN.time():
+            prob = self.sess.run(None, {self.input: x})[0][0]
+        INFER_BATCH.observe(x.shape[0])
         ex = np.exp(prob - np.max(prob)); probs = ex/np.sum(ex)
         idx = int(np.argmax(probs))
-        label = self.labels[idx] if idx < len(self.labels) else str(idx)
-        return label, float(probs[idx]), probs.tolist()
+        return self.label_of(idx), float(probs[idx]), probs.tolist()
+
+    def preprocess_regions(self, frame, boxes, bgr=False):
+        """整帧 (H,W,3) uint8 + 像素框 -> (N,3,size,size) float32；裁剪为视图，缩放直接写入批数组"""
+        from src.api.regions import crop_views, resize_crops
+        with _T_PRE.time():
+            x = resize_crops(crop_views(frame, boxes), self.size)
+            return normalize_batch(x[..., ::-1] if bgr else x, self.mean, self.std)
+
+    def predict_regions(self, x):
+        """preprocess_regions 的结果 -> [(label, conf, probs)]，全部区域一次 sess.run"""
+        probs = self.predict_batch(x)
+        idx = probs.argmax(axis=1)
+        return [(self.label_of(int(i)), float(p[i]), p.tolist()) for i, p in zip(idx, probs)]
+
+    def label_of(self, idx):
+        return self.labels[idx] if idx < len(self.labels) else str(idx)
+
+    def predict_batch(self, x):
+        """(N,3,size,size) float32 -> (N,类别) 概率；一次 sess.run（模型 batch 维固定时按其大小分段）"""
+        if self._impl != "onnx":
+            raise RuntimeError("模型不可用")
+        step = self.max_batch or len(x)
+        out = []
+        for i in range(0, len(x), step):
+            with _T_RUN.time():
+                out.append(self.sess.run(None, {self.input: x[i:i + step]})[0])
+            INFER_BATCH.observe(len(x[i:i + step]))
+        logits = np.concatenate(out)
+        ex = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return ex / ex.sum(axis=1, keepdims=True)
@@ -0,0 +1,92 @@
+# src/api/regions.py
+# -*- coding: utf-8 -*-
+"""
+多株分区识别：一个摄像头拍整盘植物，按配置的区域（或自动网格）切出每一株，全部区域一次 batch 推理
+
+- 区域以画面比例 [x, y, w, h]（0~1）配置，与分辨率无关；regions.plants 为空时按 grid 的 rows × cols 自动切分
+- 裁剪是整帧数组上的切片视图（帧环共享内存 / 上传图片），不拷贝；每块直接缩放进预分配的
+  (N,size,size,3) uint8 批数组，归一化与 sess.run 整批各一次
+- 每个区域的结果写 regions.history_csv 一行（time, region, label, confidence, backend）
+"""
+import csv
+from pathlib import Path
+
+import numpy as np
+
+from src.utils.metrics import histogram
+
+REGION_FIELDS = ["time", "region", "label", "confidence", "backend"]
+REGIONS_PER_FRAME = histogram("plantai_regions_per_frame", "每帧分区识别的区域数", buckets=(1, 2, 4, 8, 16, 32, 64))
+
+
+def grid_regions(rows, cols, margin=0.0):
+    """rows × cols 等分网格，每格四周留 margin（占格子的比例）；命名 r1c1, r1c2, ..."""
+    rows, cols, margin = max(1, int(rows)), max(1, int(cols)), min(0.45, max(0.0, float(margin)))
+    w, h = 1.0 / cols, 1.0 / rows
+    return [{"name": f"r{r + 1}c{c + 1}",
+             "box": [(c + margin) * w, (r + margin) * h, w * (1 - 2 * margin), h * (1 - 2 * margin)]}
+            for r in range(rows) for c in range(cols)]
+
+
+def load_regions(rc):
+    """regions 配置块 -> [{"name", "box": [x, y, w, h]}]；框越界或过小抛 ValueError"""
+    rc = rc or {}
+    plants = rc.get("plants") or []
+    if not plants:
+        g = rc.get("grid") or {}
+        return grid_regions(g.get("rows", 2), g.get("cols", 3), g.get("margin", 0.0))
+    out, seen = [], set()
+    for i, p in enumerate(plants):
+        name = str(p.get("name") or f"p{i + 1}")
+        x, y, w, h = (float(v) for v in p["box"])
+        if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > 1.0001 or y + h > 1.0001:
+            raise ValueError(f"区域 {name} 的 box 须为画面比例 [x, y, w, h] 且在 0~1 内：{p['box']}")
+        if name in seen:
+            raise ValueError(f"区域名重复：{name}")
+        seen.add(name)
+        out.append({"name": name, "box": [x, y, w, h]})
+    return out
+
+
+def pixel_boxes(regions, width, height):
+    """比例框 -> 像素框 [(x0, y0, x1, y1)]，至少 1 像素"""
+    out = []
+    for r in regions:
+        x, y, w, h = r["box"]
+        x0, y0 = min(width - 1, int(round(x * width))), min(height - 1, int(round(y * height)))
+        x1, y1 = max(x0 + 1, min(width, int(round((x + w) * width)))), max(y0 + 1, min(height, int(round((y + h) * height))))
+        out.append((x0, y0, x1, y1))
+    return out
+
+
+def crop_views(frame, boxes):
+    """(H,W,C) 整帧 -> 各区域的切片视图（不拷贝）"""
+    return [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in boxes]
+
+
+def resize_crops(crops, size, out=None):
+    """各区域视图缩放进 (N,size,size,3) uint8 批数组（cv2 INTER_AREA 直接写入批数组，没有 cv2 时 PIL）"""
+    if out is None:
+        out = np.empty((len(crops), size, size, 3), np.uint8)
+    try:
+        import cv2
+        for i, c in enumerate(crops):
+            cv2.resize(c, (size, size), dst=out[i], interpolation=cv2.INTER_AREA)
+    except ImportError:
+        from PIL import Image
+        for i, c in enumerate(crops):
+            out[i] = np.asarray(Image.fromarray(np.ascontiguousarray(c)).resize((size, size), Image.BILINEAR))
+    REGIONS_PER_FRAME.observe(len(crops))
+    return out
+
+
+def append_results(path, rows):
+    """一帧的各区域结果一次追加（每行 REGION_FIELDS 顺序）"""
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    new = not p.exists()
+    with p.open("a", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        if new:
+            w.writerow(REGION_FIELDS)
+        w.writerows(rows)
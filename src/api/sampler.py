@@ -0,0 +1,62 @@
+# src/api/sampler.py
+# -*- coding: utf-8 -*-
+"""
+传感器采样器：后台线程按周期调用 SensorSuite.read_all()，缓存最新读数
+请求、历史记录器、自动控制都读缓存，不直接访问 I2C/SPI 总线
+周期可在运行中修改（资源调度器在无人查看时降到记录所需的下限，见 src/api/governor.py）
+"""
+import threading, time
+from src.utils.scheduler import RepeatedTimer
+from src.utils.metrics import histogram, gauge
+
+SAMPLE_SECONDS = histogram("plantai_sensor_sample_seconds", "一次完整采样（read_all）耗时")
+LAST_SAMPLE = gauge("plantai_sensor_last_sample_timestamp", "最近一次采样时间（unix 秒）")
+SAMPLE_INTERVAL = gauge("plantai_sensor_sample_interval_seconds", "当前采样周期（秒）")
+
+class SensorSampler:
+    def __init__(self, suite, interval_s=5):
+        self.suite = suite
+        self.interval_s = max(1, int(interval_s))
+        self._latest = None
+        self._ready = threading.Event()
+        self._listeners = []
+        self.demand_ts = 0.0        # 最近一次界面 / API 读取（unix 秒）
+        SAMPLE_INTERVAL.set(self.interval_s)
+        self._timer = RepeatedTimer(self.interval_s, self._sample, name="sampler")
+
+    def _sample(self):
+        with SAMPLE_SECONDS.time():
+            d = self.suite.read_all()
+        LAST_SAMPLE.set(d.get("timestamp", time.time()))
+        self._latest = d
+        self._ready.set()
+        for fn in list(self._listeners):
+            try: fn(d)
+            except Exception as e: print("采样回调出错:", e)
+
+    def add_listener(self, fn):
+        """fn(reading) 在每次采样后于采样线程中调用"""
+        self._listeners.append(fn)
+
+    def set_interval(self, interval_s, run_now=False):
+        """修改采样周期；run_now 立即采样一次"""
+        if interval_s == self._timer.interval and not run_now:
+            return
+        self._timer.set_interval(interval_s, run_now)
+        SAMPLE_INTERVAL.set(interval_s)
+
+    @property
+    def current_interval(self):
+        return self._timer.interval
+
+    def read_all(self, timeout=None, demand=False):
+        """最新一次读数（dict 副本）；尚无读数时最多等待 timeout 秒，仍无则返回 None
+        demand=True 表示来自界面 / API 的读取（资源调度据此判断有人在看），内部定时任务读取不传"""
+        if demand:
+            self.demand_ts = time.time()
+        if not self._ready.wait(timeout):
+            return None
+        return dict(self._latest)
+
+    def stop(self):
+        self._timer.stop()
@@ -13,6 +13,12 @@ import adafruit_dht
 from adafruit_mcp3xxx.mcp3008 import MCP3008
 from adafruit_mcp3xxx.analog_in import AnalogIn
 import digitalio
+from src.utils.metrics import histogram, counter
+
+CCS811_READY_TIMEOUT_S = 5
+
+SENSOR_READ = histogram("plantai_sensor_read_seconds", "单个传感器读取耗时", ("sensor",))
+SENSOR_ERRORS = counter("plantai_sensor_errors", "单个传感器读取失败次数", ("sensor",))
 
 class SensorSuite:
     def __init__(self, i2c=None):
@@ -44,7 +50,12 @@ class SensorSuite:
     def _init_ccs811(self):
         try:
             self.ccs811 = adafruit_ccs811.CCS811(self.i2c)
+            # 最多等待 CCS811_READY_TIMEOUT_S 秒，避免传感器异常时启动卡死
+            deadline = time.monotonic() + CCS811_READY_TIMEOUT_S
             while not self.ccs811.data_ready:
+                if time.monotonic() > deadline:
+                    print("⚠️ TVOC/CO2 传感器数据未就绪，稍后读取")
+                    break
                 time.sleep(0.5)
             print("✅ TVOC/CO2 传感器已连接")
         except Exception as e:
@@ -70,32 +81,42 @@ class SensorSuite:
             print("⚠️ DHT22 未检测到:", e)
             self.dht = None
 
+    def _read(self, name, fn):
+        """读取单个传感器并计时；异常计入 plantai_sensor_errors 并返回 None"""
+        t = time.perf_counter()
+        try:
+            return fn()
+        except Exception:
+            SENSOR_ERRORS.labels(name).inc()
+            return None
+        finally:
+            SENSOR_READ.labels(name).observe(time.perf_counter() - t)
+
     def read_all(self):
         data = {"timestamp": time.time()}
         # --- 温湿度 (SHT30 优先) ---
+        th = None
         if self.sht30:
-            data["temperature_c"] = round(self.sht30.temperature, 2)
-            data["humidity_pct"] = round(self.sht30.relative_humidity, 2)
+            th = self._read("sht30", lambda: (self.sht30.temperature, self.sht30.relative_humidity))
         elif self.dht:
-            try:
-                data["temperature_c"] = round(self.dht.temperature, 2)
-                data["humidity_pct"] = round(self.dht.humidity, 2)
-            except Exception:
-                data["temperature_c"] = data["humidity_pct"] = None
+            th = self._read("dht22", lambda: (self.dht.temperature, self.dht.humidity))
+        if th and None not in th:
+            data["temperature_c"] = round(th[0], 2)
+            data["humidity_pct"] = round(th[1], 2)
+        else:
+            data["temperature_c"] = data["humidity_pct"] = None
 
         # --- 光照 ---
-        data["light_lux"] = round(self.bh1750.lux, 2) if self.bh1750 else None
+        lux = self._read("bh1750", lambda: self.bh1750.lux) if self.bh1750 else None
+        data["light_lux"] = round(lux, 2) if lux is not None else None
 
         # --- 空气质量 ---
-        if self.ccs811:
-            data["eCO2_ppm"] = self.ccs811.eco2
-            data["TVOC_ppb"] = self.ccs811.tvoc
-        else:
-            data["eCO2_ppm"] = data["TVOC_ppb"] = None
+        air = self._read("ccs811", lambda: (self.ccs811.eco2, self.ccs811.tvoc)) if self.ccs811 else None
+        data["eCO2_ppm"], data["TVOC_ppb"] = air if air else (None, None)
 
         # --- 土壤湿度 ---
-        if self.soil_ch:
-            raw = self.soil_ch.value
+        raw = self._read("yl69", lambda: self.soil_ch.value) if self.soil_ch else None
+        if raw is not None:
             data["soil_raw"] = raw
             data["soil_moisture_pct"] = round(100 - (raw / 65535 * 100), 2)
         else:
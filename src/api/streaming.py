@@ -0,0 +1,268 @@
+# src/api/streaming.py
+# -*- coding: utf-8 -*-
+"""
+长连接推流服务：MJPEG（/video_feed）与 SSE（/events）由独立的 asyncio 服务器提供，
+所有观看者 / 订阅者共用一个事件循环线程，不再各占一个 WSGI 线程
+
+- 帧：事件循环内轮询共享内存帧环（只在有观看者时），新帧放进每个观看者的单槽 asyncio.Queue，
+  慢观看者只会跳帧，不会积压
+- 事件：publish(event, data) 可在任意线程调用（采样线程、控制动作、识别结果），
+  经 call_soon_threadsafe 分发到每个订阅者的有界 asyncio.Queue，满了丢最旧的一条
+- 鉴权：校验 Flask 会话 cookie（与主应用同一 secret），cookie 不区分端口，浏览器会自动带上
+- Flask 的 /video_feed、/events 登录校验后 307 跳转到这里，页面无需改地址
+
+只在持有硬件的进程中运行一份（单进程时为 Web 进程，多 worker 部署时为硬件守护进程）
+"""
+import asyncio, json, threading, time
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+from src.api.frame_ring import FrameRingReader
+from src.utils.metrics import CAMERA_VIEWERS, counter, gauge
+
+SSE_CLIENTS = gauge("plantai_sse_clients", "当前 SSE 订阅者数")
+STREAM_EVENTS = counter("plantai_stream_events", "发布的事件数", ("event",))
+STREAM_DROPPED = counter("plantai_stream_dropped", "慢客户端被丢弃的帧 / 事件数", ("kind",))
+STREAM_REJECTED = counter("plantai_stream_rejected", "推流服务拒绝的连接数", ("reason",))
+
+
+def _session_loader(secret, max_age_s):
+    """Flask 会话 cookie -> 会话 dict；签名无效或过期时 None"""
+    from flask import Flask
+    app = Flask("plantai-stream")
+    app.secret_key = secret
+    s = app.session_interface.get_signing_serializer(app)
+    def load(value):
+        try:
+            return s.loads(value, max_age=max_age_s)
+        except Exception:
+            return None
+    return load
+
+
+def _hostname(netloc):
+    return urlsplit("//" + (netloc or "")).hostname
+
+
+class StreamServer:
+    def __init__(self, host="0.0.0.0", port=5001, ring=None, camera=None, secret=None, require_login=True,
+                 fps=15, heartbeat_s=15, send_timeout_s=10, event_queue=256, max_clients=500, poll_s=0.01):
+        self.host, self.port = host, int(port)
+        self.ring, self.camera = ring, camera
+        self.require_login = bool(require_login)
+        self.fps = max(1.0, float(fps))          # 没有帧环时退回 camera.read_jpeg 的轮询帧率
+        self.heartbeat_s, self.send_timeout_s = float(heartbeat_s), float(send_timeout_s)
+        self.event_queue, self.max_clients = max(1, int(event_queue)), int(max_clients)
+        self.poll_s = float(poll_s)
+        self._load_session = _session_loader(secret, 31 * 86400)
+        self._viewers = set()       # asyncio.Queue(maxsize=1)，每个 MJPEG 观看者一个
+        self._subs = set()          # asyncio.Queue(maxsize=event_queue)，每个 SSE 订阅者一个
+        self._latest = {}           # 每类事件最近一条，新订阅者连上即补发
+        self._frames_task = None
+        self._loop = self._server = self._error = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stream-loop", daemon=True)
+        self._thread.start()
+        self._ready.wait(10)
+        if self._error is not None:
+            raise self._error
+
+    # --- 事件循环线程 ---
+    def _run(self):
+        loop = self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, reuse_address=True, backlog=256))
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            loop.close()
+            return
+        print(f"📡 推流服务 http://{self.host}:{self.port}（/video_feed、/events）")
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._server.close()
+            tasks = asyncio.all_tasks(loop)
+            for t in tasks:
+                t.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, _ = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                k, _, v = line.partition(":")
+                if k:
+                    headers[k.strip().lower()] = v.strip()
+            path = urlsplit(target).path
+            if method != "GET":
+                self._reply(writer, "405 Method Not Allowed", {"ok": False, "error": "只支持 GET"})
+            elif path == "/healthz":
+                self._reply(writer, "200 OK", self.status())
+            elif path not in ("/video_feed", "/events"):
+                self._reply(writer, "404 Not Found", {"ok": False, "error": "not found"})
+            elif not self._authorized(headers):
+                STREAM_REJECTED.labels("unauthorized").inc()
+                self._reply(writer, "401 Unauthorized", {"ok": False, "error": "未登录"}, self._cors(headers))
+            elif len(self._viewers) + len(self._subs) >= self.max_clients:
+                STREAM_REJECTED.labels("max_clients").inc()
+                self._reply(writer, "503 Service Unavailable", {"ok": False, "error": "连接数已满"},
+                            ["Retry-After: 10"] + self._cors(headers))
+            elif path == "/video_feed":
+                await self._mjpeg(reader, writer)
+            else:
+                await self._sse(reader, writer, headers)
+            await asyncio.wait_for(writer.drain(), self.send_timeout_s)
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                asyncio.TimeoutError):
+            pass        # 请求不完整、客户端断开或发送超时（慢客户端）
+        except asyncio.CancelledError:
+            pass        # 服务关闭
+        finally:
+            writer.close()
+
+    def _head(self, writer, status, ctype, extra=()):
+        lines = [f"HTTP/1.1 {status}", f"Content-Type: {ctype}", "Cache-Control: no-cache, no-store",
+                 "Connection: close", *extra]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    def _reply(self, writer, status, obj, extra=()):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self._head(writer, status, "application/json", [f"Content-Length: {len(body)}", *extra])
+        writer.write(body)
+
+    def _authorized(self, headers):
+        if not self.require_login:
+            return True
+        c = SimpleCookie()
+        try:
+            c.load(headers.get("cookie", ""))
+        except Exception:
+            return False
+        sess = self._load_session(c["session"].value) if "session" in c else None
+        return bool(sess and sess.get("_user_id"))
+
+    def _cors(self, headers):
+        """同主机不同端口的页面（主应用）跨源订阅 SSE 时需要，且要带 cookie"""
+        origin = headers.get("origin")
+        if origin and urlsplit(origin).hostname == _hostname(headers.get("host")):
+            return [f"Access-Control-Allow-Origin: {origin}", "Access-Control-Allow-Credentials: true",
+                    "Vary: Origin"]
+        return []
+
+    async def _next(self, reader, q, timeout):
+        """等队列中的下一条；超时返回 None；客户端已断开时抛 ConnectionResetError"""
+        try:
+            return await asyncio.wait_for(q.get(), timeout)
+        except asyncio.TimeoutError:
+            if reader.at_eof():
+                raise ConnectionResetError
+            return None
+
+    async def _mjpeg(self, reader, writer):
+        q = asyncio.Queue(maxsize=1)
+        self._viewers.add(q)
+        CAMERA_VIEWERS.inc()
+        if self._frames_task is None or self._frames_task.done():
+            self._frames_task = asyncio.ensure_future(self._pump_frames())
+        try:
+            self._head(writer, "200 OK", "multipart/x-mixed-replace; boundary=frame")
+            while True:
+                buf = await self._next(reader, q, self.heartbeat_s)
+                if buf is None:
+                    continue        # 摄像头未启动：保持连接，开始出帧后继续推
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(buf))
+                writer.write(buf)
+                writer.write(b"\r\n")
+                await asyncio.wait_for(writer.drain(), self.send_timeout_s)
+        finally:
+            self._viewers.discard(q)
+            CAMERA_VIEWERS.dec()
+
+    async def _pump_frames(self):
+        """有观看者时取新帧分发给每个观看者（单槽队列，旧帧直接替换）；没有观看者即退出"""
+        reader = FrameRingReader(self.ring) if self.ring else None
+        loop = asyncio.get_running_loop()
+        last, last_t = 0, time.monotonic()
+        try:
+            while self._viewers:
+                buf = None
+                if reader is not None and reader.latest_id() > 0:
+                    fid, buf = reader.read_jpeg(last)
+                    if buf is not None:
+                        last, last_t = fid, time.monotonic()
+                    elif time.monotonic() - last_t > 1.0:
+                        reader.close()      # 写者可能崩溃后以同名重建，下次重新挂载
+                        last_t = time.monotonic()
+                elif self.camera is not None:
+                    buf = await loop.run_in_executor(None, self.camera.read_jpeg)
+                    await asyncio.sleep(1.0 / self.fps)
+                if buf is None:
+                    await asyncio.sleep(self.poll_s)
+                    continue
+                for q in list(self._viewers):
+                    if q.full():
+                        q.get_nowait()
+                        STREAM_DROPPED.labels("frame").inc()
+                    q.put_nowait(buf)
+                await asyncio.sleep(self.poll_s)
+        finally:
+            if reader is not None:
+                reader.close()
+
+    async def _sse(self, reader, writer, headers):
+        q = asyncio.Queue(maxsize=self.event_queue)
+        self._subs.add(q)
+        SSE_CLIENTS.inc()
+        try:
+            self._head(writer, "200 OK", "text/event-stream; charset=utf-8",
+                       ["X-Accel-Buffering: no", *self._cors(headers)])
+            writer.write(b"retry: 3000\n\n")
+            for msg in list(self._latest.values()):
+                writer.write(msg)
+            await asyncio.wait_for(writer.drain(), self.send_timeout_s)
+            while True:
+                msg = await self._next(reader, q, self.heartbeat_s)
+                writer.write(msg if msg is not None else b": keepalive\n\n")
+                await asyncio.wait_for(writer.drain(), self.send_timeout_s)
+        finally:
+            self._subs.discard(q)
+            SSE_CLIENTS.dec()
+
+    def _fanout(self, event, msg):
+        self._latest[event] = msg
+        for q in list(self._subs):
+            if q.full():
+                q.get_nowait()
+                STREAM_DROPPED.labels("event").inc()
+            q.put_nowait(msg)
+
+    # --- 任意线程调用 ---
+    def publish(self, event, data):
+        """推送一条 SSE 事件（event: <event>，data 为 JSON）"""
+        msg = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n".encode("utf-8")
+        STREAM_EVENTS.labels(event).inc()
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._fanout, event, msg)
+
+    def clients(self):
+        """(MJPEG 观看者数, SSE 订阅者数)"""
+        return len(self._viewers), len(self._subs)
+
+    def status(self):
+        return {"port": self.port, "viewers": len(self._viewers), "subscribers": len(self._subs),
+                "events": sorted(self._latest)}
+
+    def close(self):
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout=5)
@@ -0,0 +1,310 @@
+# src/api/ws_effects.py
+# -*- coding: utf-8 -*-
+"""
+WS2812 灯效引擎
+- 后台线程按固定帧率渲染，不阻塞请求
+- 每帧是 (led_count, 3) 的 uint8 NumPy 数组，向量化生成
+- 各模式的亮度调色板（含 gamma 校正）预先计算并缓存
+- 只有帧内容变化时才推送到灯带；静态帧渲染一次后线程休眠
+"""
+import threading, time
+from functools import lru_cache
+import numpy as np
+
+# 模式 -> 基准颜色 (R,G,B)，与 plantai_config.yaml 中 ws2812.mode 对应
+MODE_COLORS = {
+    "white":    (255, 255, 255),
+    "red":      (255, 0, 0),
+    "green":    (0, 255, 0),
+    "blue":     (0, 0, 255),
+    "yellow":   (255, 200, 0),
+    "purple":   (160, 0, 255),     # 红+蓝，常用植物补光
+    "warm":     (255, 147, 41),    # ~2700K
+    "cool":     (201, 226, 255),   # ~6500K
+    "sunlight": (255, 241, 224),   # ~5500K
+}
+
+# 日出色温曲线关键点：(进度, R, G, B)
+_SUNRISE_KEYS = np.array([
+    [0.00,  40,   0,   0],
+    [0.25, 180,  30,   0],
+    [0.50, 255, 110,  20],
+    [0.75, 255, 190, 120],
+    [1.00, 255, 241, 224],
+], dtype=np.float32)
+
+PALETTE_LEVELS = 256
+GAMMA = 2.2
+
+
+def _gamma_lut():
+    x = np.arange(256, dtype=np.float32) / 255.0
+    return np.round(255.0 * x ** GAMMA).astype(np.uint8)
+
+_GAMMA = _gamma_lut()
+
+
+def mode_color(mode):
+    """模式名或 (R,G,B) -> np.uint8[3]"""
+    if isinstance(mode, str):
+        if mode not in MODE_COLORS:
+            raise ValueError(f"未知灯光模式: {mode}")
+        mode = MODE_COLORS[mode]
+    return np.clip(np.asarray(mode, dtype=np.int32), 0, 255).astype(np.uint8)
+
+
+@lru_cache(maxsize=64)
+def mode_palette(mode, brightness=255):
+    """
+    预计算某模式的亮度调色板: (PALETTE_LEVELS, 3) uint8
+    palette[k] = 第 k 级亮度下的颜色（已 gamma 校正，已乘整体亮度）
+    """
+    base = mode_color(mode).astype(np.float32)
+    levels = np.linspace(0.0, 1.0, PALETTE_LEVELS, dtype=np.float32)[:, None]
+    lin = np.clip(base[None, :] * levels * (max(0, min(255, int(brightness))) / 255.0), 0, 255)
+    pal = _GAMMA[lin.astype(np.uint8)]
+    pal.setflags(write=False)
+    return pal
+
+
+@lru_cache(maxsize=8)
+def sunrise_palette(brightness=255):
+    """日出曲线调色板：进度 0→1 对应暗红→暖橙→日光，亮度同时爬升"""
+    k = np.linspace(0.0, 1.0, PALETTE_LEVELS, dtype=np.float32)
+    rgb = np.stack([np.interp(k, _SUNRISE_KEYS[:, 0], _SUNRISE_KEYS[:, c]) for c in (1, 2, 3)], axis=1)
+    rgb *= (0.05 + 0.95 * k)[:, None] * (max(0, min(255, int(brightness))) / 255.0)
+    pal = _GAMMA[np.clip(rgb, 0, 255).astype(np.uint8)]
+    pal.setflags(write=False)
+    return pal
+
+
+@lru_cache(maxsize=8)
+def hue_wheel(brightness=255):
+    """色环调色板 (PALETTE_LEVELS, 3)：HSV 中 S=V=1 的一圈"""
+    h = np.linspace(0.0, 6.0, PALETTE_LEVELS, endpoint=False, dtype=np.float32)
+    rgb = np.clip(np.stack([np.abs(h - 3) - 1, 2 - np.abs(h - 2), 2 - np.abs(h - 4)], axis=1), 0, 1)
+    rgb *= 255.0 * (max(0, min(255, int(brightness))) / 255.0)
+    pal = _GAMMA[rgb.astype(np.uint8)]
+    pal.setflags(write=False)
+    return pal
+
+
+# ==============================
+# 灯效：frame(t) 返回 (n,3) uint8；static=True 表示帧不随时间变化
+# ==============================
+
+class Effect:
+    static = False
+    def __init__(self, n, duration_s=None):
+        self.n = int(n)
+        self.duration_s = duration_s
+
+    def frame(self, t):
+        raise NotImplementedError
+
+    def settled(self, t):
+        """t 之后帧不再变化（渐变结束）"""
+        return self.static
+
+
+class Solid(Effect):
+    """纯色，可带淡入 (fade_s)"""
+    def __init__(self, n, mode="white", brightness=255, duration_s=None, fade_s=0.0):
+        super().__init__(n, duration_s)
+        self.pal = mode_palette(mode, int(brightness))
+        self.fade_s = float(fade_s)
+        self.static = self.fade_s <= 0
+        self._full = np.broadcast_to(self.pal[-1], (self.n, 3))
+
+    def frame(self, t):
+        if self.static or t >= self.fade_s:
+            return self._full
+        k = int(t / self.fade_s * (PALETTE_LEVELS - 1))
+        return np.broadcast_to(self.pal[k], (self.n, 3))
+
+    def settled(self, t):
+        return self.static or t >= self.fade_s
+
+
+class Gradient(Effect):
+    """两色线性渐变（沿灯带方向）"""
+    static = True
+    def __init__(self, n, c1="red", c2="blue", brightness=255, duration_s=None):
+        super().__init__(n, duration_s)
+        a = mode_color(c1).astype(np.float32); b = mode_color(c2).astype(np.float32)
+        x = np.linspace(0.0, 1.0, self.n, dtype=np.float32)[:, None]
+        lin = (a + (b - a) * x) * (max(0, min(255, int(brightness))) / 255.0)
+        self._frame = _GAMMA[np.clip(lin, 0, 255).astype(np.uint8)]
+
+    def frame(self, t):
+        return self._frame
+
+
+class Spectrum(Effect):
+    """彩虹光谱，沿灯带滚动；period_s 为滚动一圈的时间"""
+    def __init__(self, n, brightness=255, duration_s=None, period_s=10.0):
+        super().__init__(n, duration_s)
+        self.pal = hue_wheel(int(brightness))
+        self.period_s = max(0.1, float(period_s))
+        self._base = (np.arange(self.n) * PALETTE_LEVELS // max(1, self.n)).astype(np.int32)
+
+    def frame(self, t):
+        shift = int((t / self.period_s) * PALETTE_LEVELS)
+        return self.pal[(self._base + shift) % PALETTE_LEVELS]
+
+
+class Sunrise(Effect):
+    """
+    日出/日落渐变：ramp_s 内从暗红爬升到日光（reverse=True 为日落）
+    ramp_s 默认与 duration_s 相同（限时播放时在结束前走完），不限时为 600 秒
+    灯带两端略滞后于中间，模拟地平线
+    """
+    def __init__(self, n, brightness=255, duration_s=None, ramp_s=None, reverse=False):
+        super().__init__(n, duration_s)
+        self.pal = sunrise_palette(int(brightness))
+        if ramp_s is None:
+            ramp_s = duration_s if duration_s else 600.0
+        self.ramp_s = max(0.1, float(ramp_s))
+        self.reverse = reverse
+        x = np.linspace(-1.0, 1.0, self.n, dtype=np.float32)
+        self._lag = 0.15 * np.abs(x)  # 端部滞后比例
+
+    def frame(self, t):
+        p = min(1.0, t / self.ramp_s)
+        if self.reverse:
+            p = 1.0 - p
+        k = np.clip((p - self._lag) / (1.0 - self._lag.max()), 0.0, 1.0)
+        return self.pal[(k * (PALETTE_LEVELS - 1)).astype(np.int32)]
+
+    def settled(self, t):
+        return t >= self.ramp_s
+
+
+class Sequence(Effect):
+    """依次播放若干纯色，每色 step_s 秒"""
+    def __init__(self, n, colors, step_s=0.5, brightness=255):
+        super().__init__(n, len(colors) * step_s)
+        self.step_s = float(step_s)
+        self._frames = [np.broadcast_to(mode_palette(tuple(c) if not isinstance(c, str) else c, int(brightness))[-1],
+                                        (self.n, 3)) for c in colors]
+
+    def frame(self, t):
+        return self._frames[min(len(self._frames) - 1, int(t / self.step_s))]
+
+
+EFFECTS = {"solid": Solid, "gradient": Gradient, "spectrum": Spectrum, "sunrise": Sunrise}
+
+
+def build_effect(n, mode="white", brightness=255, duration_s=None, **kw):
+    """按名称构造灯效；mode 可为纯色模式名、灯效名或 'sunset'"""
+    if mode == "sunset":
+        return Sunrise(n, brightness, duration_s, reverse=True, **kw)
+    if mode in EFFECTS and mode != "solid":
+        return EFFECTS[mode](n, brightness=brightness, duration_s=duration_s, **kw)
+    return Solid(n, mode, brightness, duration_s, **kw)
+
+
+# ==============================
+# 像素输出
+# ==============================
+
+class MemoryPixelSink:
+    """内存像素输出（测试/仿真用），记录最后一帧与推送次数"""
+    def __init__(self, led_count):
+        self.led_count = led_count
+        self.frame = np.zeros((led_count, 3), dtype=np.uint8)
+        self.pushes = 0
+
+    def show(self, frame):
+        self.frame = np.array(frame, dtype=np.uint8, copy=True)
+        self.pushes += 1
+
+
+class NeoPixelSink:
+    """写入 neopixel.NeoPixel（需 auto_write=False）"""
+    def __init__(self, pixels):
+        self.pixels = pixels
+
+    def show(self, frame):
+        self.pixels[:] = [tuple(c) for c in frame.tolist()]
+        self.pixels.show()
+
+
+# ==============================
+# 渲染器
+# ==============================
+
+class EffectRenderer:
+    """固定帧率后台渲染；无灯效时线程阻塞等待，不占 CPU"""
+    def __init__(self, sink, led_count, fps=30):
+        self.sink = sink
+        self.led_count = led_count
+        self.fps = max(1, int(fps))
+        self._effect = None
+        self._t0 = 0.0
+        self._last = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thr = threading.Thread(target=self._loop, name="ws-render", daemon=True)
+        self._thr.start()
+
+    @property
+    def effect(self):
+        return self._effect
+
+    def play(self, effect):
+        with self._lock:
+            self._effect = effect
+            self._t0 = time.monotonic()
+        self._wake.set()
+
+    def blank(self):
+        self.play(Solid(self.led_count, (0, 0, 0)))
+
+    def _push(self, frame):
+        if self._last is not None and np.array_equal(frame, self._last):
+            return False
+        self.sink.show(frame)
+        self._last = np.array(frame, copy=True)
+        return True
+
+    def _loop(self):
+        period = 1.0 / self.fps
+        while not self._stop.is_set():
+            with self._lock:
+                eff, t0 = self._effect, self._t0
+            if eff is None:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            t = time.monotonic() - t0
+            if eff.duration_s is not None and t >= eff.duration_s:
+                with self._lock:
+                    if self._effect is eff:
+                        self._effect = Solid(self.led_count, (0, 0, 0))
+                continue
+            try:
+                self._push(eff.frame(t))
+            except Exception as e:
+                print("WS2812 渲染错误:", e)
+                with self._lock:
+                    if self._effect is eff:
+                        self._effect = None
+                continue
+            if eff.settled(t):
+                # 静态帧：睡到时长结束或被新灯效唤醒
+                if eff.duration_s is None:
+                    with self._lock:
+                        if self._effect is eff:
+                            self._effect = None
+                    continue
+                self._wake.wait(max(0.0, eff.duration_s - t))
+            else:
+                # 对齐到下一帧时刻
+                self._wake.wait(period - (time.monotonic() - t0) % period)
+            self._wake.clear()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
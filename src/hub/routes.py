@@ -0,0 +1,179 @@
+# src/hub/routes.py
+# -*- coding: utf-8 -*-
+"""
+汇聚站（hub）接口，hub.enabled 时由 create_app 注册（前缀 /hub）
+
+  POST /hub/api/ingest      节点批量上报：NDJSON 请求体，Content-Encoding: gzip | zstd | identity
+                            头 X-Node-Id: <节点名>、Authorization: Bearer <hub.token 或 hub.tokens[节点]>，
+                            可选 X-After-Seq: <节点认为已被接收的序号>，比已接收的大时 409（节点从 received_seq 重发）
+  GET  /hub/api/latest      各节点最新状态（需登录）
+  GET  /hub/api/compare     ?field=temperature_c&since=&until=&nodes=a,b&bucket=900  多节点对比（预聚合）
+  GET  /hub/api/history     ?node=&kind=sensor|event|inference&since=&until=&limit=  单节点原始记录
+  GET  /hub                 汇总页面
+
+since/until 可为 epoch 秒、YYYY-MM-DD 或 ISO 时间
+"""
+import hmac, os, zlib
+from datetime import datetime
+
+from flask import Blueprint, jsonify, request, render_template
+from flask_login import login_required
+
+from src.api import devices
+from src.hub.store import HUB_BYTES
+
+hub_bp = Blueprint("hub", __name__, url_prefix="/hub")
+
+
+class _BadBody(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _store(timeout=None):
+    return devices.services.get("hub", timeout=timeout)
+
+
+def _hub_cfg():
+    return devices.cfg.get("hub") or {}
+
+
+def _authorized(node):
+    hc = _hub_cfg()
+    expect = (hc.get("tokens") or {}).get(node) or os.environ.get("PLANTAI_HUB_TOKEN") or hc.get("token")
+    if not expect:
+        return False        # 未配置令牌时拒绝一切上报
+    return hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {expect}".encode())
+
+
+def _decode(body, encoding, limit):
+    """按 Content-Encoding 解压，解压后超过 limit 字节即拒绝（防压缩炸弹）"""
+    enc = (encoding or "identity").strip().lower()
+    if enc in ("", "identity"):
+        data = body
+    elif enc in ("gzip", "x-gzip", "deflate"):
+        d = zlib.decompressobj(47)      # 自动识别 gzip / zlib 头
+        try:
+            data = d.decompress(body, limit + 1)
+        except zlib.error as e:
+            raise _BadBody(400, f"解压失败: {e}")
+    elif enc == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise _BadBody(415, "hub 未安装 zstandard，请改用 gzip")
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(body) as r:
+                data = r.read(limit + 1)
+        except zstandard.ZstdError as e:
+            raise _BadBody(400, f"解压失败: {e}")
+    else:
+        raise _BadBody(415, f"不支持的 Content-Encoding: {enc}")
+    if len(data) > limit:
+        raise _BadBody(413, f"解压后超过 {limit} 字节，请减小批次")
+    return data
+
+
+def _client_error(e):
+    """参数错误：本进程的 ValueError，或 worker 模式下守护进程抛回的 ValueError"""
+    return isinstance(e, ValueError) or getattr(e, "type", None) == "ValueError"
+
+
+def _parse_ts(s):
+    if not s:
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        return datetime.fromisoformat(s).timestamp()
+
+
+@hub_bp.route("/api/ingest", methods=["POST"])
+def api_ingest():
+    node = request.headers.get("X-Node-Id", "")
+    if not _authorized(node):
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    hc = _hub_cfg()
+    max_body = int(hc.get("max_body_mb", 8)) << 20
+    if (request.content_length or 0) > max_body:
+        return jsonify({"ok": False, "error": f"请求体超过 {max_body} 字节"}), 413
+    store = _store(timeout=5)
+    if store is None:
+        return jsonify({"ok": False, "error": "hub 初始化中"}), 503, {"Retry-After": "5"}
+    enc = request.headers.get("Content-Encoding", "identity")
+    body = request.get_data(cache=False)
+    HUB_BYTES.labels(enc.lower()).inc(len(body))
+    try:
+        data = _decode(body, enc, int(hc.get("max_batch_mb", 32)) << 20)
+        res = store.ingest(node, data, _after_seq())
+    except _BadBody as e:
+        return jsonify({"ok": False, "error": str(e)}), e.status
+    except Exception as e:
+        if not _client_error(e):
+            raise
+        return jsonify({"ok": False, "error": str(e)}), 400
+    if res.get("gap"):
+        return jsonify(dict(res, ok=False, error="序号不连续（汇聚站重启丢了未落盘的记录）")), 409
+    return jsonify(dict(res, ok=True))
+
+
+def _after_seq():
+    v = request.headers.get("X-After-Seq", "")
+    return int(v) if v.isdigit() else None
+
+
+@hub_bp.route("/api/latest")
+@login_required
+def api_latest():
+    store = _store(timeout=5)
+    if store is None:
+        return jsonify({"ok": False, "error": "hub 初始化中"}), 503
+    nodes = [n for n in request.args.get("nodes", "").split(",") if n] or None
+    return jsonify(store.latest(nodes))
+
+
+@hub_bp.route("/api/compare")
+@login_required
+def api_compare():
+    store = _store(timeout=5)
+    if store is None:
+        return jsonify({"ok": False, "error": "hub 初始化中"}), 503
+    a = request.args
+    nodes = [n for n in a.get("nodes", "").split(",") if n] or None
+    try:
+        res = store.compare(a.get("field", "temperature_c"), _parse_ts(a.get("since")), _parse_ts(a.get("until")),
+                            nodes, int(a["bucket"]) if a.get("bucket") else None)
+    except Exception as e:
+        if not _client_error(e):
+            raise
+        return jsonify({"ok": False, "error": str(e)}), 400
+    return jsonify(res)
+
+
+@hub_bp.route("/api/history")
+@login_required
+def api_history():
+    store = _store(timeout=5)
+    if store is None:
+        return jsonify({"ok": False, "error": "hub 初始化中"}), 503
+    a = request.args
+    try:
+        items = store.history(a.get("node", ""), a.get("kind", "sensor"), _parse_ts(a.get("since")),
+                              _parse_ts(a.get("until")), int(a.get("limit", 1000)))
+    except Exception as e:
+        if not _client_error(e):
+            raise
+        return jsonify({"ok": False, "error": str(e)}), 400
+    return jsonify({"count": len(items), "items": items})
+
+
+@hub_bp.route("")
+@login_required
+def hub_page():
+    return render_template("hub.html", title="PlantAI 汇聚站", theme=devices.cfg.get("theme", "auto"))
+
+
+@hub_bp.app_context_processor
+def _hub_nav():
+    return {"hub_enabled": True}
@@ -0,0 +1,434 @@
+# src/hub/store.py
+# -*- coding: utf-8 -*-
+"""
+汇聚站（hub）存储：多个温室节点批量上报的写优化落盘 + 写入时预聚合
+
+目录布局（root = data/hub）：
+  nodes/<节点>/<类型>/YYYY-MM-DD.ndjson[.gz|.zst]   原始记录，按节点 / 类型 / UTC 日分区，只追加
+  rollup/<bucket_s>s/<节点>/YYYY-MM-DD.npy         传感器按 bucket_s 秒分桶的 [count, sum, min, max]
+  state.json                                       各节点最新状态、计数与已落盘序号
+
+写入：一批上报解析后先进内存缓冲（按分区分组），满 flush_bytes 或每 flush_interval_s 秒整批追加，
+每个分区一次 write；同一时刻预聚合数组用 np.add.at / fmin.at / fmax.at 向量化更新
+查询：最新状态直接读内存；跨节点对比只读预聚合数组（节点数 × 天数 × 每天桶数），不回扫原始记录；
+原始记录查询只打开范围内的按天文件
+去重：记录带节点内递增的 seq；seq ≤ 已接收序号的丢弃。received_seq 为已接收，durable_seq 为已落盘
+（节点应以 durable_seq 作为可删除本地队列的位置）。汇聚站重启时 received_seq 回到 durable_seq，
+节点发批次时带 after_seq（它认为汇聚站已收到的位置），大于 received_seq 的整批拒收，节点从 received_seq 重发
+"""
+import json, os, re, threading, time
+from collections import OrderedDict, deque
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+
+from src.utils import history
+from src.utils.metrics import counter, gauge, histogram
+from src.utils.scheduler import RepeatedTimer
+
+KINDS = ("sensor", "event", "inference")
+SENSOR_FIELDS = ("temperature_c", "humidity_pct", "light_lux", "eCO2_ppm", "TVOC_ppb", "soil_moisture_pct")
+NODE_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_FILE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})\.ndjson(\.gz|\.zst)?$")
+DAY_S = 86400
+_EPOCH_ORD = date(1970, 1, 1).toordinal()
+MAX_POINTS = 2000
+
+HUB_RECORDS = counter("plantai_hub_records", "hub 接收的记录数", ("kind",))
+HUB_DUPLICATES = counter("plantai_hub_duplicates", "按序号去重丢弃的记录数")
+HUB_REJECTED = counter("plantai_hub_rejected", "格式错误被拒的记录数")
+HUB_BYTES = counter("plantai_hub_ingest_bytes", "上报请求体字节数（压缩后）", ("encoding",))
+HUB_INGEST_SECONDS = histogram("plantai_hub_ingest_seconds", "一批上报的解析与入库耗时")
+HUB_FLUSH_SECONDS = histogram("plantai_hub_flush_seconds", "hub 缓冲写盘耗时")
+HUB_BUFFERED = gauge("plantai_hub_buffered_bytes", "hub 尚未写盘的字节数")
+HUB_NODES = gauge("plantai_hub_nodes", "已知节点数")
+
+
+def _ts(v):
+    """epoch 秒，或 ISO 时间字符串（无时区的按 hub 本地时间）"""
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return float(v)
+    if isinstance(v, str) and v:
+        return datetime.fromisoformat(v).timestamp()
+    raise ValueError(f"无效时间 {v!r}")
+
+
+def _num(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _day_index(ts):
+    return int(ts // DAY_S)
+
+
+def _file_day(name):
+    return date.fromisoformat(name).toordinal() - _EPOCH_ORD
+
+
+def _day_name(di):
+    return time.strftime("%Y-%m-%d", time.gmtime(di * DAY_S))
+
+
+def _nulls(a, nd=3):
+    return [None if x != x else round(x, nd) for x in a.tolist()]
+
+
+class HubStore:
+    def __init__(self, root="data/hub", bucket_s=300, flush_bytes=4 << 20, flush_interval_s=5, fsync="flush",
+                 compress_after_days=7, compression="gzip", offline_after_s=900, max_cached_days=512):
+        self.root = Path(root)
+        self.bucket_s = max(1, int(bucket_s))
+        if DAY_S % self.bucket_s:
+            raise ValueError("hub.bucket_s 须能整除 86400")
+        self.flush_bytes = int(flush_bytes)
+        self.flush_interval_s = float(flush_interval_s)
+        self.fsync = fsync
+        self.compress_after_days = int(compress_after_days)
+        self.compression = compression
+        self.offline_after_s = float(offline_after_s)
+        self.max_cached_days = int(max_cached_days)
+        self.rollup_dir = self.root / "rollup" / f"{self.bucket_s}s"
+        self._lock = threading.Lock()          # 缓冲、节点状态、预聚合数组
+        self._flush_lock = threading.Lock()    # 写盘串行；原始查询持有它以免读到写了一半的批
+        self._buf = {}                          # (节点, 类型, 日序号) -> [行 bytes]
+        self._buf_bytes = 0
+        self._roll = OrderedDict()              # (节点, 日序号) -> ndarray (桶数, 字段数, 4)，LRU
+        self._dirty = set()
+        self._dirs = set()
+        self._nodes = {}
+        self._last_compress = 0.0
+        self._load_state()
+        self._timer = RepeatedTimer(self.flush_interval_s, self.flush_if_due, name="hub-flush") \
+            if self.flush_interval_s else None
+
+    # --- 状态 ---
+    def _load_state(self):
+        f = self.root / "state.json"
+        self.root.mkdir(parents=True, exist_ok=True)
+        if f.is_file():
+            self._nodes = json.loads(f.read_text(encoding="utf-8")).get("nodes", {})
+        for st in self._nodes.values():
+            st["received_seq"] = st.get("durable_seq", 0)
+        HUB_NODES.set(len(self._nodes))
+
+    def _node(self, node):
+        st = self._nodes.get(node)
+        if st is None:
+            st = self._nodes[node] = {"first_seen": time.time(), "last_seen": None, "received_seq": 0,
+                                      "durable_seq": 0, "counts": {k: 0 for k in KINDS},
+                                      "sensor": None, "event": None, "inference": None}
+            HUB_NODES.set(len(self._nodes))
+        return st
+
+    def nodes(self):
+        with self._lock:
+            return sorted(self._nodes)
+
+    # --- 预聚合 ---
+    def _rollup_file(self, node, di):
+        return self.rollup_dir / node / f"{_day_name(di)}.npy"
+
+    def _rollup(self, node, di):
+        """(节点, 日) 的预聚合数组；内存没有时读 .npy，再没有而原始文件存在时由原始记录重建"""
+        key = (node, di)
+        a = self._roll.get(key)
+        if a is not None:
+            self._roll.move_to_end(key)
+            return a
+        f = self._rollup_file(node, di)
+        if f.is_file():
+            a = np.load(f)
+        else:
+            a = np.zeros((DAY_S // self.bucket_s, len(SENSOR_FIELDS), 4))
+            a[:, :, 2:] = np.nan
+            raw = self._raw_files(node, "sensor", di, di)
+            if raw:
+                recs = [r for _, r in self._read_raw(raw, di * DAY_S, (di + 1) * DAY_S)]
+                vals = np.array([[_num(r.get(k)) for k in SENSOR_FIELDS] for r in recs]).reshape(-1, len(SENSOR_FIELDS))
+                self._accumulate(a, di, np.array([r["ts"] for r in recs]), vals)
+                self._dirty.add(key)
+        self._roll[key] = a
+        while len(self._roll) > self.max_cached_days:
+            old = next((k for k in self._roll if k not in self._dirty), None)
+            if old is None:
+                break
+            del self._roll[old]
+        return a
+
+    def _accumulate(self, a, di, ts, vals):
+        if not len(ts):
+            return
+        b = ((ts - di * DAY_S) // self.bucket_s).astype(np.intp)
+        ok = ~np.isnan(vals)
+        np.add.at(a[:, :, 0], b, ok)
+        np.add.at(a[:, :, 1], b, np.where(ok, vals, 0.0))
+        np.fmin.at(a[:, :, 2], b, vals)
+        np.fmax.at(a[:, :, 3], b, vals)
+
+    # --- 写 ---
+    def ingest(self, node, data, after_seq=None):
+        """
+        data: NDJSON（已解压），每行 {"kind": sensor|event|inference, "ts": epoch秒|ISO, "seq": int, ...}
+        after_seq: 节点认为已被接收的序号；大于 received_seq 时（重启丢了未落盘的部分）整批不收，返回 gap=True
+        返回 {accepted, duplicates, rejected, received_seq, durable_seq[, gap]}
+        """
+        if not NODE_RE.match(node or ""):
+            raise ValueError(f"无效节点名 {node!r}")
+        t0 = time.perf_counter()
+        # 解析与落盘行的准备都在锁外；ts 已是 epoch 数字的行原样写入，不再重新序列化
+        recs, bad = [], 0
+        for line in data.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                r = json.loads(line)
+                kind = r.setdefault("kind", "sensor")
+                if kind not in KINDS:
+                    raise ValueError(kind)
+                ts = r.get("ts")
+                if isinstance(ts, (int, float)) and not isinstance(ts, bool) and "timestamp" not in r:
+                    r["ts"] = float(ts)
+                    line += b"\n"
+                else:
+                    r["ts"] = _ts(ts if ts is not None else r.pop("timestamp", None))
+                    line = json.dumps(r, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+                seq = r.get("seq")
+                vals = [_num(r.get(k)) for k in SENSOR_FIELDS] if kind == "sensor" else None
+                recs.append((kind, r, int(seq) if seq is not None else None, line, vals))
+            except (ValueError, TypeError, AttributeError):
+                bad += 1
+        if bad:
+            HUB_REJECTED.inc(bad)
+
+        with self._lock:
+            st = self._node(node)
+            seen = st["received_seq"]
+            if after_seq is not None and after_seq > seen:
+                return {"accepted": 0, "duplicates": 0, "rejected": bad, "received_seq": seen,
+                        "durable_seq": st["durable_seq"], "gap": True}
+            top, dup, n = seen, 0, {k: 0 for k in KINDS}
+            sensors = {}
+            for kind, r, seq, line, vals in recs:
+                if seq is not None:
+                    if seq <= seen:
+                        dup += 1
+                        continue
+                    top = max(top, seq)
+                ts = r["ts"]
+                di = _day_index(ts)
+                self._buf.setdefault((node, kind, di), []).append(line)
+                self._buf_bytes += len(line)
+                n[kind] += 1
+                if kind == "sensor":
+                    sensors.setdefault(di, []).append((ts, vals))
+                cur = st[kind]
+                if cur is None or ts >= cur["ts"]:
+                    st[kind] = r
+            for di, rows in sensors.items():
+                self._accumulate(self._rollup(node, di), di, np.array([t for t, _ in rows]),
+                                 np.array([v for _, v in rows]))
+                self._dirty.add((node, di))
+            st["received_seq"] = top
+            st["last_seen"] = time.time()
+            for k, v in n.items():
+                st["counts"][k] += v
+                if v:
+                    HUB_RECORDS.labels(k).inc(v)
+            HUB_BUFFERED.set(self._buf_bytes)
+            full = self._buf_bytes >= self.flush_bytes
+            res = {"accepted": sum(n.values()), "duplicates": dup, "rejected": bad,
+                   "received_seq": top, "durable_seq": st["durable_seq"]}
+        if dup:
+            HUB_DUPLICATES.inc(dup)
+        if full:
+            self._flush("bytes")
+        HUB_INGEST_SECONDS.observe(time.perf_counter() - t0)
+        return res
+
+    def flush_if_due(self):
+        self._flush("interval")
+        if self.compress_after_days >= 0 and time.time() - self._last_compress > 3600:
+            self._last_compress = time.time()
+            self.compress_old()
+
+    def flush(self):
+        self._flush("manual")
+
+    def _write(self, path, data, sync):
+        if path.parent not in self._dirs:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._dirs.add(path.parent)
+        with open(path, "ab") as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _flush(self, reason):
+        with self._flush_lock:
+            with self._lock:
+                if not self._buf and not self._dirty:
+                    return
+                buf, self._buf, self._buf_bytes = self._buf, {}, 0
+                rolls = {k: self._roll[k].copy() for k in self._dirty if k in self._roll}
+                self._dirty = set()
+                seqs = {n: st["received_seq"] for n, st in self._nodes.items()}
+                state = json.dumps({"nodes": {n: dict(st, durable_seq=seqs[n]) for n, st in self._nodes.items()}},
+                                   ensure_ascii=False)
+                HUB_BUFFERED.set(0)
+            t0 = time.perf_counter()
+            sync = self.fsync == "flush"
+            for (node, kind, di), lines in buf.items():
+                self._write(self.root / "nodes" / node / kind / f"{_day_name(di)}.ndjson", b"".join(lines), sync)
+            for (node, di), a in rolls.items():
+                f = self._rollup_file(node, di)
+                f.parent.mkdir(parents=True, exist_ok=True)
+                with open(f.with_suffix(".tmp"), "wb") as fh:
+                    np.save(fh, a)
+                os.replace(f.with_suffix(".tmp"), f)
+            # 原始记录与预聚合落盘之后才更新 durable_seq（state.json 原子替换）
+            tmp = self.root / "state.json.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.write(state)
+                if sync:
+                    fh.flush()
+                    os.fsync(fh.fileno())
+            os.replace(tmp, self.root / "state.json")
+            with self._lock:
+                for n, s in seqs.items():
+                    self._nodes[n]["durable_seq"] = s
+            HUB_FLUSH_SECONDS.observe(time.perf_counter() - t0)
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.stop()
+        self._flush("close")
+
+    def compress_old(self):
+        """压缩早于 compress_after_days 天的原始 .ndjson（当天及缓冲中的分区不会被选中）"""
+        cutoff = _day_index(time.time()) - self.compress_after_days
+        for f in (self.root / "nodes").glob("*/*/*.ndjson"):
+            m = _FILE_RE.match(f.name)
+            if m and _file_day(m.group(1)) < cutoff:
+                # 写盘串行（补传的迟到记录不会在压缩中途追加）；改名在 _lock 内，重建预聚合不会读到重复
+                with self._flush_lock:
+                    try:
+                        history.compress_file(f, self.compression, lock=self._lock)
+                    except OSError as e:
+                        print("hub 压缩失败:", f, e)
+
+    # --- 查询 ---
+    def latest(self, nodes=None):
+        """各节点最新传感器读数 / 事件 / 推理结果与在线状态（只读内存）"""
+        now = time.time()
+        with self._lock:
+            names = sorted(self._nodes) if not nodes else [n for n in nodes if n in self._nodes]
+            out = []
+            for n in names:
+                st = self._nodes[n]
+                age = now - st["last_seen"] if st["last_seen"] else None
+                out.append({"node": n, "last_seen": st["last_seen"], "age_s": None if age is None else round(age, 1),
+                            "online": age is not None and age < self.offline_after_s,
+                            "sensor": st["sensor"], "event": st["event"], "inference": st["inference"],
+                            "counts": dict(st["counts"]), "received_seq": st["received_seq"],
+                            "durable_seq": st["durable_seq"]})
+        return {"now": now, "nodes": out}
+
+    def compare(self, field, since=None, until=None, nodes=None, bucket=None):
+        """
+        多节点同一字段按时间桶对齐：{t: [桶起点 epoch], nodes: {节点: {mean, min, max, count}}}
+        只读预聚合数组；bucket 为 bucket_s 的整数倍，桶数超过 MAX_POINTS 时自动加大
+        """
+        fi = SENSOR_FIELDS.index(field)
+        until = float(until) if until is not None else time.time()
+        since = float(since) if since is not None else until - DAY_S
+        if until <= since:
+            raise ValueError("until 须晚于 since")
+        k = max(1, int(bucket or self.bucket_s) // self.bucket_s)
+        k = max(k, -(-int((until - since) / self.bucket_s) // MAX_POINTS))
+        step = k * self.bucket_s
+        d0, d1 = _day_index(since), _day_index(until - 1e-6)
+        nb = DAY_S // self.bucket_s
+        with self._lock:
+            names = sorted(self._nodes) if not nodes else [n for n in nodes if n in self._nodes]
+            cube = np.zeros((len(names), (d1 - d0 + 1) * nb, 4))
+            cube[:, :, 2:] = np.nan
+            for i, n in enumerate(names):
+                for di in range(d0, d1 + 1):
+                    if (n, di) in self._roll or self._rollup_file(n, di).is_file() or self._has_raw(n, di):
+                        j = (di - d0) * nb
+                        cube[i, j:j + nb] = self._rollup(n, di)[:, fi, :]
+        base = d0 * DAY_S
+        i0 = int((since - base) // step) * k
+        i1 = min(cube.shape[1], -(-int(until - base) // step) * k)
+        seg = cube[:, i0:i1]
+        pad = (-seg.shape[1]) % k
+        if pad:
+            tail = np.zeros((len(names), pad, 4)); tail[:, :, 2:] = np.nan
+            seg = np.concatenate([seg, tail], axis=1)
+        g = seg.reshape(len(names), -1, k, 4)
+        cnt, tot = g[..., 0].sum(axis=2), g[..., 1].sum(axis=2)
+        lo, hi = np.fmin.reduce(g[..., 2], axis=2), np.fmax.reduce(g[..., 3], axis=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(cnt > 0, tot / cnt, np.nan)
+        t = base + (i0 + np.arange(g.shape[1]) * k) * self.bucket_s
+        return {"field": field, "bucket_s": step, "t": t.astype(np.int64).tolist(),
+                "nodes": {n: {"mean": _nulls(mean[i]), "min": _nulls(lo[i]), "max": _nulls(hi[i]),
+                              "count": cnt[i].astype(np.int64).tolist()} for i, n in enumerate(names)}}
+
+    def _has_raw(self, node, di):
+        f = self.root / "nodes" / node / "sensor" / f"{_day_name(di)}.ndjson"
+        return any(f.with_name(f.name + ext).is_file() for ext in ("", ".gz", ".zst"))
+
+    def _raw_files(self, node, kind, d0, d1):
+        d = self.root / "nodes" / node / kind
+        if not d.is_dir():
+            return []
+        out = []
+        for f in d.iterdir():
+            m = _FILE_RE.match(f.name)
+            if m:
+                di = _file_day(m.group(1))
+                if d0 <= di <= d1:
+                    out.append((di, not m.group(2), f))
+        # 同一天可能既有压缩文件又有之后补传的 .ndjson：都读，压缩的在前
+        return [f for _, _, f in sorted(out)]
+
+    @staticmethod
+    def _read_raw(files, since, until):
+        for f in files:
+            with history.open_text(f) as fh:
+                for line in fh:
+                    try:
+                        r = json.loads(line)
+                    except ValueError:
+                        continue     # 异常断电留下的半行
+                    if since <= r.get("ts", 0) < until:
+                        yield r["ts"], r
+
+    def history(self, node, kind="sensor", since=None, until=None, limit=1000):
+        """单个节点的原始记录（时间升序，范围内最后 limit 条），含尚未写盘的缓冲"""
+        if kind not in KINDS:
+            raise ValueError(f"无效类型 {kind!r}")
+        if not NODE_RE.match(node or ""):
+            raise ValueError(f"无效节点名 {node!r}")
+        until = float(until) if until is not None else time.time() + 1
+        since = float(since) if since is not None else until - DAY_S
+        d0, d1 = _day_index(since), _day_index(until - 1e-6)
+        out = deque(maxlen=max(1, int(limit)))
+        with self._flush_lock:
+            for _, r in self._read_raw(self._raw_files(node, kind, d0, d1), since, until):
+                out.append(r)
+            with self._lock:
+                pending = [l for (n, k, di), lines in self._buf.items()
+                           if n == node and k == kind and d0 <= di <= d1 for l in lines]
+        for line in pending:
+            r = json.loads(line)
+            if since <= r["ts"] < until:
+                out.append(r)
+        return sorted(out, key=lambda r: r["ts"])
@@ -0,0 +1,417 @@
+# src/hub/uplink.py
+# -*- coding: utf-8 -*-
+"""
+节点侧上行队列（store-and-forward）：读数、动作、识别结果先写本地日志，再按批压缩发往汇聚站 /hub/api/ingest
+
+日志：<dir>/<首条 seq>.ndjson 分段追加（满 segment_kb 换段），每条带单调递增的 seq；
+  新建日志时 seq 从当前毫秒时间戳起，SD 卡重装后的新日志仍大于汇聚站已收到的序号
+  cursor.json 记录汇聚站已落盘的序号（durable_seq），之前的整段删除；重启 / 断网恢复后从这里续传
+发送：后台线程 "uplink"
+  - 批大小按往返耗时自适应：快则加倍（至 batch_max），慢或 413 则减半（至 batch_min）
+  - 失败指数退避（1s 起翻倍、带抖动、上限 backoff_max_s），服务端给出 Retry-After 时照办
+  - max_kbps 限制上行带宽，max_cpu 限制发送线程 CPU 占比（读日志 + 压缩后按耗时补睡）
+  - 已发出未落盘（sent > acked）时定期发空批次取回 durable_seq；批次带 X-After-Seq = sent，
+    汇聚站重启丢了未落盘的部分时（received_seq < sent，或 409）从 received_seq 重发
+"""
+import bisect, gzip, json, os, random, threading, time
+from pathlib import Path
+
+from src.utils.metrics import counter, gauge, histogram
+
+UPLINK_PENDING = gauge("plantai_uplink_pending_records", "本地日志中尚未被汇聚站落盘确认的记录数")
+UPLINK_RECORDS = counter("plantai_uplink_records", "写入上行日志的记录数", ("kind",))
+UPLINK_SENT = counter("plantai_uplink_sent_records", "成功发出的记录数（含重发）")
+UPLINK_BYTES = counter("plantai_uplink_bytes", "上行字节数", ("stage",))
+UPLINK_FAILURES = counter("plantai_uplink_failures", "上行失败次数", ("reason",))
+UPLINK_DROPPED = counter("plantai_uplink_dropped_records", "日志超过 max_mb 被丢弃的最旧记录数（估计）")
+UPLINK_RTT = histogram("plantai_uplink_request_seconds", "一次上行请求往返耗时")
+UPLINK_BATCH = gauge("plantai_uplink_batch_records", "当前批大小上限")
+UPLINK_BACKOFF = gauge("plantai_uplink_backoff_seconds", "当前退避等待秒数（0 = 正常）")
+
+_PREFIX = b'{"seq":'
+
+
+def _line_seq(line):
+    """日志行由本模块写出，seq 固定是第一个键"""
+    return int(line[len(_PREFIX):line.index(b",", len(_PREFIX))])
+
+
+class Journal:
+    """分段追加的本地日志（线程安全）"""
+    def __init__(self, root="data/uplink", segment_kb=1024, fsync_interval_s=5.0, max_mb=512):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = int(segment_kb) << 10
+        self.fsync_interval_s = float(fsync_interval_s)
+        self.max_bytes = int(max_mb) << 20
+        self._cond = threading.Condition()
+        self._fh = None
+        self._seg_bytes = 0
+        self._last_sync = time.monotonic()
+        self._unsynced = False
+        self._hint = None          # (读到的最后 seq, 段首 seq, 偏移)：顺序读时不必从段首扫描
+        try:
+            self.acked = int(json.loads((self.root / "cursor.json").read_text())["acked"])
+        except (OSError, ValueError, KeyError):
+            self.acked = 0
+        self._firsts = sorted(int(f.stem) for f in self.root.glob("*.ndjson") if f.stem.isdigit())
+        self.next_seq = max(self.acked + 1, self._recover() + 1) if self._firsts else \
+            max(self.acked + 1, int(time.time() * 1000))
+        if not self.acked:      # 没有游标：第一条之前都视为已确认
+            self.acked = (self._firsts[0] if self._firsts else self.next_seq) - 1
+        UPLINK_PENDING.set(self.pending())
+
+    def _path(self, first):
+        return self.root / f"{first:016d}.ndjson"
+
+    def _recover(self):
+        """最后一段截掉断电留下的半行，返回其中最大的 seq"""
+        first = self._firsts[-1]
+        f = self._path(first)
+        data = f.read_bytes()
+        good, last = 0, first - 1
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                last = _line_seq(line)
+            except ValueError:
+                break
+            good += len(line)
+        if good < len(data):
+            with open(f, "r+b") as fh:
+                fh.truncate(good)
+            print(f"⚠️ 上行日志 {f.name} 截掉 {len(data) - good} 字节半行")
+        return last
+
+    # --- 写 ---
+    def append(self, kind, rec):
+        """写入一条记录（rec 中 ts 缺省为当前时间），返回 seq"""
+        with self._cond:
+            seq = self.next_seq
+            self.next_seq += 1
+            body = json.dumps(dict(rec, kind=kind, ts=rec.get("ts", time.time())), ensure_ascii=False,
+                              separators=(",", ":"))
+            line = f'{{"seq":{seq},{body[1:]}\n'.encode("utf-8")
+            if self._fh is None or self._seg_bytes >= self.segment_bytes:
+                self._roll(seq)
+            self._fh.write(line)
+            self._fh.flush()
+            self._seg_bytes += len(line)
+            self._unsynced = True
+            self._cond.notify_all()
+        UPLINK_RECORDS.labels(kind).inc()
+        UPLINK_PENDING.set(self.pending())
+        return seq
+
+    def _roll(self, seq):
+        if self._fh is None and self._firsts:
+            # 启动后第一次写：最后一段未满就接着写
+            f = self._path(self._firsts[-1])
+            size = f.stat().st_size if f.exists() else 0
+            if size < self.segment_bytes:
+                self._fh, self._seg_bytes = open(f, "ab"), size
+                return
+        if self._fh is not None:
+            self._sync()
+            self._fh.close()
+        self._firsts.append(seq)
+        self._fh, self._seg_bytes = open(self._path(seq), "ab"), 0
+        self._enforce_cap()
+
+    def _enforce_cap(self):
+        sizes = [self._path(s).stat().st_size for s in self._firsts[:-1]]
+        total = sum(sizes)
+        while total > self.max_bytes and len(self._firsts) > 1:
+            first = self._firsts.pop(0)
+            total -= sizes.pop(0)
+            UPLINK_DROPPED.inc(max(0, self._firsts[0] - first))
+            self._path(first).unlink(missing_ok=True)
+            print(f"⚠️ 上行日志超过上限，丢弃最旧一段 {first}")
+
+    def _sync(self):
+        if self._fh is not None and self._unsynced:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+        self._unsynced = False
+        self._last_sync = time.monotonic()
+
+    def sync_if_due(self):
+        with self._cond:
+            if self._unsynced and time.monotonic() - self._last_sync >= self.fsync_interval_s:
+                self._sync()
+
+    # --- 读 / 确认 ---
+    def last_seq(self):
+        return self.next_seq - 1
+
+    def pending(self):
+        return max(0, self.next_seq - 1 - self.acked)
+
+    def wait(self, after_seq, timeout, stop=None):
+        """等到有 seq > after_seq 的记录、stop 被置位或超时"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.next_seq - 1 > after_seq or (stop is not None and stop.is_set()),
+                                       timeout)
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def read(self, after_seq, max_records, max_bytes):
+        """seq > after_seq 的最多 max_records 条 / max_bytes 字节，返回 ([行], 最后 seq)"""
+        with self._cond:
+            firsts = list(self._firsts)
+        if not firsts:
+            return [], after_seq
+        if self._hint and self._hint[0] == after_seq and self._hint[1] in firsts:
+            i, off = firsts.index(self._hint[1]), self._hint[2]
+        else:
+            i, off = max(0, bisect.bisect_right(firsts, after_seq + 1) - 1), 0
+        out, size, last = [], 0, after_seq
+        while i < len(firsts) and len(out) < max_records and size < max_bytes:
+            try:
+                fh = open(self._path(firsts[i]), "rb")
+            except FileNotFoundError:
+                i, off = i + 1, 0     # 已被 trim / 上限清理
+                continue
+            with fh:
+                fh.seek(off)
+                for line in fh:
+                    if not line.endswith(b"\n"):
+                        break         # 写者正在写的半行
+                    off += len(line)
+                    try:
+                        s = _line_seq(line)
+                    except ValueError:
+                        continue      # 损坏的行
+                    if s <= after_seq:
+                        continue
+                    out.append(line)
+                    size += len(line)
+                    last = s
+                    if len(out) >= max_records or size >= max_bytes:
+                        break
+                else:
+                    if i + 1 < len(firsts):
+                        i, off = i + 1, 0
+                        continue
+            break
+        self._hint = (last, firsts[i] if i < len(firsts) else None, off)
+        return out, last
+
+    def trim(self, acked):
+        """汇聚站已落盘到 acked：保存游标，删除全部记录都 ≤ acked 的段"""
+        acked = min(int(acked), self.next_seq - 1)
+        if acked <= self.acked:
+            return
+        self.acked = acked
+        tmp = self.root / "cursor.json.tmp"
+        tmp.write_text(json.dumps({"acked": acked}))
+        os.replace(tmp, self.root / "cursor.json")
+        with self._cond:
+            while len(self._firsts) > 1 and self._firsts[1] <= acked + 1:
+                self._path(self._firsts.pop(0)).unlink(missing_ok=True)
+        UPLINK_PENDING.set(self.pending())
+
+    def rebase(self, seq):
+        """汇聚站已收到的序号比本地还大（日志被换过）：之后的记录从 seq+1 编号"""
+        with self._cond:
+            self.next_seq = max(self.next_seq, int(seq) + 1)
+
+    def close(self):
+        with self._cond:
+            if self._fh is not None:
+                self._sync()
+                self._fh.close()
+                self._fh = None
+
+
+class Uplink:
+    """日志 -> 汇聚站的发送线程"""
+    def __init__(self, journal, url, node_id, token="", compression="gzip", level=6, batch_min=50,
+                 batch_max=5000, max_batch_kb=1024, target_s=2.0, max_kbps=0, max_cpu=0.25,
+                 backoff_max_s=300, ack_poll_s=3.0, timeout_s=30.0):
+        self.journal = journal
+        self.url = url.rstrip("/") + "/hub/api/ingest"
+        self.node_id = node_id
+        self.token = token
+        self.compression = compression
+        if compression == "zstd":
+            try:
+                import zstandard
+                self._zstd = zstandard.ZstdCompressor(level=level or 3)
+            except ImportError:
+                print("⚠️ 未安装 zstandard，上行改用 gzip")
+                self.compression = "gzip"
+        self.level = int(level)
+        self.batch_min, self.batch_max = max(1, int(batch_min)), max(1, int(batch_max))
+        self.batch = self.batch_min
+        self.max_batch_bytes = int(max_batch_kb) << 10
+        self.target_s = float(target_s)
+        self.rate = float(max_kbps) * 1000 / 8 if max_kbps else 0.0      # 字节/秒
+        self.max_cpu = min(1.0, max(0.01, float(max_cpu)))
+        self.backoff_max_s = float(backoff_max_s)
+        self.ack_poll_s = float(ack_poll_s)
+        self.timeout_s = float(timeout_s)
+        self.sent = journal.acked          # 已发出（汇聚站已接收，未必已落盘）
+        self.failures = 0
+        self.state = "idle"
+        self.last_error = None
+        self.last_ok = None
+        self._next_send = 0.0
+        self._stop = threading.Event()
+        UPLINK_BATCH.set(self.batch)
+        self._thr = threading.Thread(target=self._loop, name="uplink", daemon=True)
+        self._thr.start()
+
+    def append(self, kind, rec):
+        return self.journal.append(kind, rec)
+
+    def status(self):
+        j = self.journal
+        return {"state": self.state, "url": self.url, "node_id": self.node_id, "last_seq": j.last_seq(),
+                "sent": self.sent, "acked": j.acked, "pending": j.pending(), "batch": self.batch,
+                "failures": self.failures, "last_error": self.last_error, "last_ok": self.last_ok,
+                "retry_in_s": round(max(0.0, self._next_send - time.monotonic()), 1)}
+
+    # --- 发送 ---
+    def _compress(self, raw):
+        if self.compression == "zstd":
+            return self._zstd.compress(raw), "zstd"
+        return gzip.compress(raw, self.level, mtime=0), "gzip"
+
+    def _post(self, session, body, encoding, after=None):
+        headers = {"X-Node-Id": self.node_id, "Content-Type": "application/x-ndjson"}
+        if after is not None:
+            headers["X-After-Seq"] = str(after)
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        t0 = time.perf_counter()
+        r = session.post(self.url, data=body, headers=headers, timeout=self.timeout_s)
+        dt = time.perf_counter() - t0
+        UPLINK_RTT.observe(dt)
+        return r, dt
+
+    def _backoff(self, reason, retry_after=None):
+        self.failures += 1
+        self.last_error = reason
+        UPLINK_FAILURES.labels(reason.split(":")[0]).inc()
+        delay = min(self.backoff_max_s, 2.0 ** min(self.failures - 1, 20)) * random.uniform(0.5, 1.0)
+        if retry_after:
+            delay = max(delay, min(self.backoff_max_s, retry_after))
+        self.state = "backoff"
+        self._next_send = time.monotonic() + delay
+        self.sent = self.journal.acked      # 未确认的从已落盘处重发，汇聚站按 seq 去重
+        UPLINK_BACKOFF.set(round(delay, 1))
+
+    def _ok(self, res, n):
+        self.failures = 0
+        self.last_error = None
+        self.last_ok = time.time()
+        self.state = "sending" if self.sent < self.journal.last_seq() else "idle"
+        UPLINK_BACKOFF.set(0)
+        if n and res.get("duplicates") == n and res.get("received_seq", 0) > self.journal.last_seq():
+            print(f"⚠️ 汇聚站已收到的序号 {res['received_seq']} 大于本地日志，之后的记录重新编号")
+            self.journal.rebase(res["received_seq"])
+        self.journal.trim(res.get("durable_seq", 0))
+        self._resume(res.get("received_seq", 0))
+
+    def _resume(self, received):
+        """汇聚站已接收的比已发出的少（重启丢了未落盘的部分）：从 received_seq 重发"""
+        if received < self.sent:
+            self.sent = max(self.journal.acked, received)
+        self.sent = max(self.sent, self.journal.acked)
+
+    def _loop(self):
+        import requests
+        session = requests.Session()
+        while not self._stop.is_set():
+            try:
+                self._step(session, requests)
+            except Exception as e:
+                print("上行线程出错:", e)
+                self._backoff(f"error:{type(e).__name__}")
+
+    def _step(self, session, requests):
+        """发送循环的一步：退避等待 / 空闲等待 / 取回落盘确认 / 发一批"""
+        self.journal.sync_if_due()
+        wait = self._next_send - time.monotonic()
+        if wait > 0:
+            self._stop.wait(wait)
+            return
+        if self.sent >= self.journal.last_seq():
+            if self.journal.acked >= self.sent:
+                self.state = "idle"
+                self.journal.wait(self.sent, self.ack_poll_s * 10, self._stop)
+                return
+            # 已发出未落盘：过一会儿用空批次取回 durable_seq
+            if self._stop.wait(self.ack_poll_s):
+                return
+            try:
+                r, _ = self._post(session, b"", None)
+                if r.status_code != 200:
+                    return self._backoff(f"http:{r.status_code}")
+                self._ok(r.json(), 0)
+            except (requests.RequestException, ValueError) as e:
+                self._backoff(f"network:{type(e).__name__}")
+            return
+
+        cpu0 = time.thread_time()
+        lines, last = self.journal.read(self.sent, self.batch, self.max_batch_bytes)
+        if not lines:
+            self.sent = max(self.sent, last)
+            return
+        raw = b"".join(lines)
+        body, enc = self._compress(raw)
+        # 限 CPU：读日志 + 压缩耗时 × (1/max_cpu - 1) 的空闲
+        pause = (time.thread_time() - cpu0) * (1.0 / self.max_cpu - 1.0)
+        if pause > 0 and self._stop.wait(pause):
+            return
+        self.state = "sending"
+        # 之前还有未落盘的：告诉汇聚站本批接在哪之后，它没有这段时整批拒收（409）
+        after = self.sent if self.sent > self.journal.acked else None
+        try:
+            r, dt = self._post(session, body, enc, after)
+        except requests.RequestException as e:
+            return self._backoff(f"network:{type(e).__name__}")
+        if self.rate:
+            # 限带宽：下一批最早在本批字节数 / 速率之后发出
+            self._next_send = time.monotonic() + len(body) / self.rate
+        if r.status_code == 413:
+            self.batch = max(self.batch_min, self.batch // 2)
+            UPLINK_BATCH.set(self.batch)
+            return self._backoff("http:413")
+        if r.status_code == 409:
+            try:
+                received = int(r.json().get("received_seq", 0))
+            except (ValueError, TypeError, AttributeError):
+                return self._backoff("http:409")
+            print(f"⚠️ 汇聚站只收到序号 {received}（已发出 {self.sent}），从那里重发")
+            UPLINK_FAILURES.labels("gap").inc()
+            return self._resume(received)
+        if r.status_code != 200:
+            ra = r.headers.get("Retry-After", "")
+            return self._backoff(f"http:{r.status_code}", float(ra) if ra.isdigit() else None)
+        try:
+            res = r.json()
+        except ValueError:
+            return self._backoff("http:bad_json")
+        UPLINK_SENT.inc(len(lines))
+        UPLINK_BYTES.labels("raw").inc(len(raw))
+        UPLINK_BYTES.labels("compressed").inc(len(body))
+        self.sent = last
+        if dt < self.target_s / 2 and len(lines) >= self.batch:
+            self.batch = min(self.batch_max, self.batch * 2)
+        elif dt > self.target_s:
+            self.batch = max(self.batch_min, self.batch // 2)
+        UPLINK_BATCH.set(self.batch)
+        self._ok(res, len(lines))
+
+    def close(self):
+        self._stop.set()
+        self.journal.wake()
+        self._thr.join(timeout=self.timeout_s + 5)
+        self.journal.close()
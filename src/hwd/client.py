@@ -0,0 +1,150 @@
+# src/hwd/client.py
+# -*- coding: utf-8 -*-
+"""
+硬件守护进程的 RPC 客户端（Web worker 侧）
+- multiprocessing.connection over AF_UNIX，HMAC 认证；每个线程一条连接，fork 后自动重建
+- batch([(目标, 方法, args, kwargs), ...]) 一次往返完成多次调用；call() 为单次调用
+- RemoteProxy 让 services.get("sensors").read_all(...) 等代码在两种部署下写法一致
+"""
+import os, threading, time
+from multiprocessing.connection import Client
+
+from src.utils.metrics import histogram, counter
+
+RPC_SECONDS = histogram("plantai_hwd_rpc_seconds", "硬件守护进程 RPC 往返耗时", ("target",))
+RPC_ERRORS = counter("plantai_hwd_rpc_errors", "硬件守护进程 RPC 失败次数", ("kind",))
+
+
+class HwdUnavailable(ConnectionError):
+    """守护进程未运行 / 连接中断 / 超时"""
+
+
+class RemoteError(RuntimeError):
+    """守护进程内调用抛出的异常；type 为原异常类名"""
+    def __init__(self, type_name, message):
+        super().__init__(message)
+        self.type = type_name
+
+
+def socket_path(cfg=None):
+    """环境变量 PLANTAI_HWD_SOCKET 优先，其次 serving.socket"""
+    return os.environ.get("PLANTAI_HWD_SOCKET") or ((cfg or {}).get("serving") or {}).get("socket", "data/hwd.sock")
+
+
+def load_authkey(address, create=False):
+    """认证密钥：环境变量 PLANTAI_HWD_KEY，否则 <socket>.key（守护进程启动时生成，权限 0600）"""
+    key = os.environ.get("PLANTAI_HWD_KEY")
+    if key:
+        return key.encode()
+    path = address + ".key"
+    if create:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(os.urandom(32).hex())
+    with open(path) as f:
+        return f.read().strip().encode()
+
+
+class HwdClient:
+    def __init__(self, address, authkey=None, timeout=15.0):
+        self.address = address
+        self._authkey = authkey
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        c = getattr(self._local, "conn", None)
+        if c is not None and self._local.pid == os.getpid():
+            return c
+        if self._authkey is None:
+            self._authkey = load_authkey(self.address)
+        c = Client(self.address, family="AF_UNIX", authkey=self._authkey)
+        self._local.conn, self._local.pid = c, os.getpid()
+        return c
+
+    def _drop(self):
+        c = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if c is not None:
+            try: c.close()
+            except OSError: pass
+
+    def batch(self, calls):
+        """calls: [(target, method, args, kwargs)] -> [(ok, 值或 {type, error})]，顺序一致"""
+        calls = [(t, m, tuple(a), dict(kw)) for t, m, a, kw in calls]
+        target = calls[0][0] if len(calls) == 1 else "batch"
+        t0 = time.perf_counter()
+        try:
+            conn = self._conn()
+            conn.send(calls)
+        except (OSError, EOFError):
+            # 发送失败时守护进程没有执行任何调用，重连重试一次是安全的
+            self._drop()
+            try:
+                conn = self._conn()
+                conn.send(calls)
+            except (OSError, EOFError) as e:
+                self._drop()
+                RPC_ERRORS.labels("connect").inc()
+                raise HwdUnavailable(f"硬件守护进程不可用: {e}") from e
+        try:
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"{self.timeout}s 内无响应")
+            res = conn.recv()
+        except (OSError, EOFError, TimeoutError) as e:
+            # 响应可能迟到，连接已不同步，只能丢弃；调用是否执行未知，不重试
+            self._drop()
+            RPC_ERRORS.labels("timeout" if isinstance(e, TimeoutError) else "disconnect").inc()
+            raise HwdUnavailable(f"硬件守护进程无响应: {e}") from e
+        RPC_SECONDS.labels(target).observe(time.perf_counter() - t0)
+        return res
+
+    def call(self, target, method, *args, **kwargs):
+        ok, value = self.batch([(target, method, args, kwargs)])[0]
+        if not ok:
+            RPC_ERRORS.labels("remote").inc()
+            raise RemoteError(value.get("type"), value.get("error"))
+        return value
+
+    def proxy(self, target):
+        return RemoteProxy(self, target)
+
+    def wait_ready(self, target, timeout=300.0):
+        """等守护进程中同名子系统就绪后返回代理；守护进程尚未启动时持续重连，子系统失败则抛 RuntimeError"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                info = self.call("hwd", "status").get(target)
+            except HwdUnavailable:
+                info = None
+            if info and info["state"] == "ready":
+                return self.proxy(target)
+            if info and info["state"] == "failed":
+                raise RuntimeError(f"守护进程中 {target} 初始化失败: {info['error']}")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"等待守护进程 {target} 就绪超时")
+            time.sleep(0.5)
+
+
+class RemoteProxy:
+    """把属性访问转成 RPC：proxy.read_all(3) == client.call(target, "read_all", 3)"""
+    def __init__(self, client, target):
+        self._client = client
+        self._target = target
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        def _call(*args, **kwargs):
+            return self._client.call(self._target, name, *args, **kwargs)
+        _call.__name__ = name
+        return _call
+
+    def __repr__(self):
+        return f"<RemoteProxy {self._target} @ {self._client.address}>"
+
+
+def register_remote(services, client, names=("sensors", "camera", "control")):
+    """在 worker 的子系统登记表中以代理替代本地硬件子系统"""
+    for name in names:
+        services.register(name, lambda n=name: client.wait_ready(n))
@@ -0,0 +1,135 @@
+# src/hwd/server.py
+# -*- coding: utf-8 -*-
+"""
+硬件守护进程：唯一持有传感器总线、GPIO/WS2812、摄像头与定时器（历史记录、自动控制）的进程，
+多个无状态 Web worker（gunicorn）经 Unix socket RPC 调用它
+
+  python -m src.hwd.server [--config configs/plantai_config.yaml] [--socket data/hwd.sock]
+
+请求：[(目标, 方法, args, kwargs), ...]  ->  响应：[(True, 返回值) | (False, {type, error}), ...]
+只允许白名单内的方法；每条连接一个线程。视频帧不走 RPC，worker 直接读共享内存帧环（src/api/frame_ring.py）
+"""
+import argparse, os, signal, sys, threading
+from multiprocessing.connection import Listener
+from multiprocessing import AuthenticationError
+
+from src.api import devices
+from src.hwd.client import socket_path, load_authkey
+from src.utils.lazy import timed_import, uptime
+from src.utils.metrics import counter, REGISTRY
+
+HWD_CALLS = counter("plantai_hwd_calls", "守护进程处理的 RPC 调用数", ("target", "method", "ok"))
+
+ALLOWED = {
+    "sensors": {"read_all"},
+    "camera": {"start", "stop", "read_jpeg"},
+    "control": {"control", "apply_settings", "config"},
+    "uplink": {"append", "status"},
+    "dataset": {"start", "stop", "snap", "status", "note_prediction"},
+    "streams": {"publish", "status"},
+    "stats": {"summary", "anomalies"},
+    "governor": {"status"},
+    "hub": {"ingest", "latest", "compare", "history", "nodes"},
+    "hwd": {"status", "metrics", "profile"},
+}
+
+
+class HardwareDaemon:
+    def __init__(self, address):
+        self.address = address
+        self._listener = None
+
+    # --- 守护进程自身的方法（目标 "hwd"）---
+    def status(self):
+        return devices.services.status()
+
+    def metrics(self):
+        return REGISTRY.render()
+
+    def profile(self, **kw):
+        return timed_import("src.utils.profiler").sample_stacks(**kw)
+
+    # --- 分发 ---
+    def _dispatch(self, target, method, args, kwargs):
+        if method not in ALLOWED.get(target, ()):
+            raise PermissionError(f"不允许的调用 {target}.{method}")
+        if target == "hwd":
+            return getattr(self, method)(*args, **kwargs)
+        obj = devices.services.get(target)
+        if obj is None:
+            raise RuntimeError(f"{target} 初始化中")
+        return getattr(obj, method)(*args, **kwargs)
+
+    def _serve(self, conn):
+        try:
+            while True:
+                try:
+                    calls = conn.recv()
+                except (EOFError, OSError):
+                    return
+                out = []
+                for target, method, args, kwargs in calls:
+                    try:
+                        out.append((True, self._dispatch(target, method, args, kwargs)))
+                        HWD_CALLS.labels(target, method, "1").inc()
+                    except Exception as e:
+                        out.append((False, {"type": type(e).__name__, "error": str(e)}))
+                        HWD_CALLS.labels(target, method, "0").inc()
+                try:
+                    conn.send(out)
+                except (OSError, EOFError):
+                    return
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)     # 上次异常退出遗留的 socket
+        os.makedirs(os.path.dirname(os.path.abspath(self.address)), exist_ok=True)
+        authkey = load_authkey(self.address, create=not os.environ.get("PLANTAI_HWD_KEY"))
+        old = os.umask(0o177)
+        try:
+            self._listener = Listener(self.address, family="AF_UNIX", authkey=authkey)
+        finally:
+            os.umask(old)
+        print(f"🔌 硬件守护进程监听 {self.address} ({uptime()*1000:.0f} ms)")
+        while True:
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError as e:
+                print("[hwd] 拒绝未认证连接:", e)
+                continue
+            except OSError:
+                if self._listener is None:
+                    return
+                raise
+            threading.Thread(target=self._serve, args=(conn,), name="hwd-conn", daemon=True).start()
+
+    def close(self):
+        lst, self._listener = self._listener, None
+        if lst is not None:
+            lst.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="PlantAI 硬件守护进程")
+    ap.add_argument("--config", help="配置文件，默认 PLANTAI_CFG 或 configs/plantai_config.yaml")
+    ap.add_argument("--socket", help="Unix socket 路径，默认 PLANTAI_HWD_SOCKET 或 serving.socket")
+    args = ap.parse_args()
+
+    devices.load_config(args.config)
+    daemon = HardwareDaemon(args.socket or socket_path(devices.cfg))
+    signal.signal(signal.SIGTERM, lambda *a: sys.exit(0))
+    devices.register_hardware()
+    devices.services.start()
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+        devices.services.stop_all()
+
+
+if __name__ == "__main__":
+    main()
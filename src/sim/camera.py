@@ -0,0 +1,128 @@
+# src/sim/camera.py
+# -*- coding: utf-8 -*-
+"""
+仿真摄像头：按 fps 生成合成 BGR 帧（渐变背景 + 移动的“叶片” + 噪声）
+接口与 src.api.camera.Camera 一致（start/open、read_jpeg/get_jpeg、stop/release），同样发布到共享内存帧环
+"""
+import random, threading, time
+import numpy as np
+from src.utils.metrics import CAMERA_FRAMES, CAMERA_ENCODE
+from src.api.frame_ring import FrameRing
+from src.api.governor import CaptureGate
+
+_CAPTURED, _ENCODED = CAMERA_FRAMES.labels("capture"), CAMERA_FRAMES.labels("encode")
+
+def _encode_jpeg(frame, quality=80):
+    with CAMERA_ENCODE.time():
+        try:
+            import cv2
+            ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+            out = buf.tobytes() if ok else None
+        except ImportError:
+            from io import BytesIO
+            from PIL import Image
+            b = BytesIO()
+            Image.fromarray(frame[:, :, ::-1]).save(b, format="JPEG", quality=quality)
+            out = b.getvalue()
+    if out is not None:
+        _ENCODED.inc()
+    return out
+
+
+class SimCamera:
+    def __init__(self, index=0, width=640, height=480, fps=15, latency_ms=0, fail_rate=0.0, seed=None,
+                 ring=None, ring_slots=4):
+        self.index = index
+        self.width, self.height = int(width), int(height)
+        self.fps = max(1, int(fps))
+        self.latency_s = max(0.0, float(latency_ms)) / 1000.0
+        self.fail_rate = float(fail_rate)
+        self.rng = random.Random(seed)
+        self.frame = None
+        self.frame_id = 0
+        self.running = False
+        self.thread = None
+        self.ring = FrameRing(ring, ring_slots) if ring else None
+        self._jpeg = None
+        self._cond = threading.Condition()
+        self.gate = CaptureGate()
+        y = np.linspace(0, 255, self.height, dtype=np.float32)[:, None]
+        x = np.linspace(0, 255, self.width, dtype=np.float32)[None, :]
+        self._bg = np.stack([np.broadcast_to(60 + 0.3 * y, (self.height, self.width)),
+                             np.broadcast_to(90 + 0.4 * x, (self.height, self.width)),
+                             np.broadcast_to(40 + 0.2 * (x + y) / 2, (self.height, self.width))],
+                            axis=2).astype(np.uint8)
+        self._noise = np.random.default_rng(seed).integers(0, 12, (8, self.height, self.width, 3), dtype=np.uint8)
+
+    # --- 生命周期 ---
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._loop, name="camera", daemon=True)
+            self.thread.start()
+        return True
+
+    open = start
+
+    def stop(self):
+        self.running = False
+        self.gate.wake()
+        with self._cond:
+            self._cond.notify_all()
+
+    release = stop
+
+    # --- 采集 ---
+    def _render(self, i):
+        f = self._bg + self._noise[i % len(self._noise)]
+        r = max(8, self.height // 8)
+        cx = int((self.width - 2 * r) * (0.5 + 0.5 * np.sin(i / (2.0 * self.fps)))) + r
+        cy = self.height // 2
+        f[cy - r:cy + r, cx - r:cx + r, 1] = 200   # “叶片”
+        return f
+
+    def _loop(self):
+        period = 1.0 / self.fps
+        nxt = time.monotonic()
+        while self.running:
+            if self.latency_s:
+                time.sleep(self.latency_s)
+            if not (self.fail_rate > 0 and self.rng.random() < self.fail_rate):
+                frame = self._render(self.frame_id)
+                _CAPTURED.inc()
+                jpeg = self.ring.publish(frame, _encode_jpeg)[1] if self.ring is not None else None
+                with self._cond:
+                    self.frame = frame
+                    self.frame_id += 1
+                    self._jpeg = (self.frame_id, jpeg) if jpeg is not None else None
+                    self._cond.notify_all()
+            nxt += period
+            if self.gate.pace(lambda: self.running):
+                nxt = time.monotonic()      # 暂停 / 降频后重新计时，恢复即出帧
+            else:
+                time.sleep(max(0.0, nxt - time.monotonic()))
+        if self.ring is not None:
+            self.ring.close()
+
+    def wait_frame(self, last_id=-1, timeout=1.0):
+        """阻塞到有比 last_id 新的帧，返回 (frame_id, frame)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.frame_id > last_id or not self.running, timeout)
+            return self.frame_id, self.frame
+
+    def get_jpeg(self):
+        self.gate.touch()
+        if self.frame is None:
+            return None
+        cached = self._jpeg
+        if cached is not None and cached[0] == self.frame_id:
+            return cached[1]
+        return _encode_jpeg(self.frame)
+
+    def read_jpeg(self):
+        """每次调用等待下一帧（模拟 cap.read() 的节拍）"""
+        if not self.running:
+            return None
+        self.gate.touch()
+        _, frame = self.wait_frame(self.frame_id, timeout=1.0)
+        return None if frame is None else self.get_jpeg()
@@ -0,0 +1,77 @@
+# src/sim/hardware.py
+# -*- coding: utf-8 -*-
+"""
+仿真执行器：与 src.api.hardware 中各控制器接口一致，不依赖 GPIO/neopixel
+WS2812 直接复用真实控制器（灯效引擎）+ 内存像素输出
+"""
+import random, time
+from src.api.hardware import WS2812Controller
+from src.api.ws_effects import MemoryPixelSink
+
+class _SimDevice:
+    def __init__(self, latency_ms=0, fail_rate=0.0, seed=None):
+        self.latency_s = max(0.0, float(latency_ms)) / 1000.0
+        self.fail_rate = float(fail_rate)
+        self.rng = random.Random(seed)
+        self.events = []        # (time, action)
+
+    def _io(self, action):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        if self.fail_rate > 0 and self.rng.random() < self.fail_rate:
+            raise IOError(f"仿真 GPIO 故障: {action}")
+        self.events.append((time.time(), action))
+        del self.events[:-1000]
+
+
+class SimPumpController(_SimDevice):
+    """继电器/水泵控制（仿真）；传入 suite 时浇水会抬高仿真土壤湿度"""
+    def __init__(self, pin=23, active_high=False, suite=None, **kw):
+        super().__init__(**kw)
+        self.pin = pin
+        self.active_high = active_high
+        self.suite = suite
+        self.is_on = False
+        self._on_at = None
+
+    def on(self):
+        self._io("on")
+        self.is_on, self._on_at = True, time.time()
+
+    def off(self):
+        self._io("off")
+        if self.is_on and self.suite is not None and hasattr(self.suite, "water"):
+            self.suite.water(time.time() - self._on_at)
+        self.is_on = False
+
+    def pulse(self, duration_s=3):
+        self.on()
+        time.sleep(duration_s)
+        self.off()
+
+
+class SimLightController(_SimDevice):
+    """单色补光（仿真）"""
+    def __init__(self, pin=24, pwm=False, **kw):
+        super().__init__(**kw)
+        self.pin = pin
+        self.pwm = pwm
+        self.duty = 0
+
+    def on(self):
+        self._io("on"); self.duty = 100
+
+    def off(self):
+        self._io("off"); self.duty = 0
+
+    def set_brightness(self, duty):
+        if not self.pwm:
+            return
+        self._io(f"duty {duty}")
+        self.duty = max(0, min(100, duty))
+
+
+def SimWS2812Controller(led_count=18, gpio_pin=18, brightness=0.5, fps=30, **_):
+    """真实 WS2812Controller，像素写入 MemoryPixelSink（.sink.frame 可读）"""
+    return WS2812Controller(led_count=led_count, gpio_pin=gpio_pin, brightness=brightness,
+                            fps=fps, sink=MemoryPixelSink(led_count))
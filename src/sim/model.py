@@ -0,0 +1,31 @@
+# src/sim/model.py
+# -*- coding: utf-8 -*-
+"""
+生成一个极小的 ONNX 分类模型（GlobalAveragePool -> Gemm -> 类别数），
+输入 [N,3,H,W] 的 batch/尺寸均为动态，用于仿真与基准测试；需要 onnx 包
+"""
+from pathlib import Path
+import numpy as np
+
+def make_tiny_onnx(path, n_classes=4, seed=0):
+    import onnx
+    from onnx import helper, TensorProto, numpy_helper
+    rng = np.random.default_rng(seed)
+    w = numpy_helper.from_array(rng.normal(0, 1, (3, n_classes)).astype(np.float32), "W")
+    b = numpy_helper.from_array(np.zeros(n_classes, dtype=np.float32), "B")
+    nodes = [
+        helper.make_node("GlobalAveragePool", ["input"], ["pooled"]),
+        helper.make_node("Flatten", ["pooled"], ["flat"], axis=1),
+        helper.make_node("Gemm", ["flat", "W", "B"], ["logits"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "plantai_tiny",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["N", 3, "H", "W"])],
+        [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["N", n_classes])],
+        initializer=[w, b],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    onnx.save(model, str(path))
+    return str(path)
@@ -0,0 +1,70 @@
+# src/sim/sensors.py
+# -*- coding: utf-8 -*-
+"""
+仿真传感器：接口与 src.api.sensors.SensorSuite 一致（read_all 返回同样的键）
+读数按昼夜周期变化并叠加噪声；可配置读数延迟与单个传感器失败概率
+"""
+import math, random, threading, time
+from src.utils.metrics import histogram, counter
+
+SENSOR_READ = histogram("plantai_sensor_read_seconds", "单个传感器读取耗时", ("sensor",))
+SENSOR_ERRORS = counter("plantai_sensor_errors", "单个传感器读取失败次数", ("sensor",))
+
+class SimSensorSuite:
+    def __init__(self, latency_ms=20, noise=0.02, fail_rate=0.0, seed=None, day_s=86400):
+        self.latency_s = max(0.0, float(latency_ms)) / 1000.0
+        self.noise = float(noise)
+        self.fail_rate = float(fail_rate)
+        self.day_s = float(day_s)         # 一个“昼夜”的秒数，压测时可缩短
+        self.rng = random.Random(seed)
+        self._soil = 55.0
+        self._soil_t = time.time()
+        self._lock = threading.Lock()     # 模拟单条 I2C 总线：读数串行
+
+    def water(self, seconds):
+        """水泵联动：浇水使土壤湿度上升"""
+        with self._lock:
+            self._soil = min(95.0, self._soil + 4.0 * float(seconds))
+
+    def _n(self, v):
+        return v * (1.0 + self.rng.gauss(0.0, self.noise))
+
+    def _fail(self, name):
+        if self.fail_rate > 0 and self.rng.random() < self.fail_rate:
+            SENSOR_ERRORS.labels(name).inc()
+            return True
+        return False
+
+    def read_all(self):
+        with self._lock, SENSOR_READ.labels("sim").time():
+            if self.latency_s:
+                time.sleep(self.latency_s)
+            now = time.time()
+            phase = 2 * math.pi * ((now % self.day_s) / self.day_s)
+            sun = max(0.0, math.sin(phase - math.pi / 2))   # 0 点最暗，12 点最亮
+            # 土壤每小时约下降 0.5%
+            self._soil = max(5.0, self._soil - (now - self._soil_t) / 3600.0 * 0.5)
+            self._soil_t = now
+            data = {"timestamp": now}
+
+            if self._fail("sht30"):
+                data["temperature_c"] = data["humidity_pct"] = None
+            else:
+                data["temperature_c"] = round(self._n(20.0 + 6.0 * sun), 2)
+                data["humidity_pct"] = round(self._n(70.0 - 20.0 * sun), 2)
+
+            data["light_lux"] = None if self._fail("bh1750") else round(max(0.0, self._n(5.0 + 900.0 * sun)), 2)
+
+            if self._fail("ccs811"):
+                data["eCO2_ppm"] = data["TVOC_ppb"] = None
+            else:
+                data["eCO2_ppm"] = int(self._n(450.0 + 150.0 * (1.0 - sun)))
+                data["TVOC_ppb"] = int(max(0.0, self._n(30.0)))
+
+            if self._fail("yl69"):
+                data["soil_raw"] = data["soil_moisture_pct"] = None
+            else:
+                pct = min(100.0, max(0.0, self._n(self._soil)))
+                data["soil_raw"] = int((100.0 - pct) / 100.0 * 65535)
+                data["soil_moisture_pct"] = round(pct, 2)
+            return data
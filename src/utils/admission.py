@@ -0,0 +1,170 @@
+# src/utils/admission.py
+# -*- coding: utf-8 -*-
+"""
+请求分级与准入控制：重接口不能占满 Web 线程，控制 / 传感器接口始终有线程可用
+
+- 每个路由归入一个请求类（high / low / bulk / default），每类有自己的并发上限 limit 与排队上限 queue
+- 同步 WSGI 中请求线程就是执行者，按类限制“同时能占用多少个线程”即等价于每类一个有界执行器：
+  超过 limit 的请求排队等待（最多 max_wait_s 秒），排队数已满或等待超时立即返回
+  503 + Retry-After，不再占线程
+- 流式响应（CSV 下载等）在响应体发送完毕、连接关闭时才释放名额
+- 各类延迟（含排队）进直方图；/api/admin/admission 返回各类在途、排队、拒绝数与近期 p50/p95/p99
+
+limit 为 0 表示不限并发（只统计）。排队的请求同样占着一个 Web 线程，gunicorn gthread 下应保证
+各受限类 limit + queue 之和小于 serving.threads，否则高优先级请求仍可能排在 Web 线程池后面
+"""
+import threading, time
+from collections import deque
+
+from src.utils.metrics import counter, gauge, histogram
+
+CLASS_SECONDS = histogram("plantai_request_class_seconds", "按请求类统计的耗时（含排队）", ("class",))
+CLASS_WAIT = histogram("plantai_request_class_wait_seconds", "准入排队等待时间", ("class",))
+CLASS_SHED = counter("plantai_request_class_shed", "准入控制拒绝的请求数（503）", ("class", "reason"))
+CLASS_IN_FLIGHT = gauge("plantai_request_class_in_flight", "各请求类在途数", ("class",))
+CLASS_WAITING = gauge("plantai_request_class_waiting", "各请求类排队数", ("class",))
+
+DEFAULT_CLASSES = {
+    "high": {"limit": 0},
+    "low": {"limit": 1, "queue": 1, "max_wait_s": 10, "retry_after_s": 5},
+    "bulk": {"limit": 1, "queue": 2, "max_wait_s": 15, "retry_after_s": 2},
+    "default": {"limit": 0},
+}
+DEFAULT_ROUTES = {
+    "high": ["/api/control", "/api/sensors", "/api/settings", "/api/v1/status", "/ping", "/metrics"],
+    "low": ["/api/history", "/api/history/download", "/api/export/<table>", "/api/reports/pdf",
+            "/hub/api/compare", "/hub/api/history"],
+    "bulk": ["/predict", "/api/plants/predict"],
+}
+
+
+class Shed(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason, self.retry_after = reason, retry_after
+
+
+class RequestClass:
+    def __init__(self, name, limit=0, queue=0, max_wait_s=10, retry_after_s=5, window=1024):
+        self.name = name
+        self.limit, self.queue = int(limit), int(queue)
+        self.max_wait_s, self.retry_after_s = float(max_wait_s), int(retry_after_s)
+        self._sem = threading.Semaphore(self.limit) if self.limit > 0 else None
+        self._lock = threading.Lock()
+        self.in_flight = self.waiting = 0
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "timeout": 0}
+        self._recent = deque(maxlen=window)       # 近期耗时（秒），算分位数
+        self._m_seconds, self._m_wait = CLASS_SECONDS.labels(name), CLASS_WAIT.labels(name)
+        self._m_in_flight, self._m_waiting = CLASS_IN_FLIGHT.labels(name), CLASS_WAITING.labels(name)
+
+    def enter(self):
+        """取得名额，返回开始时间；拿不到时抛 Shed"""
+        t0 = time.perf_counter()
+        if self._sem is not None and not self._sem.acquire(blocking=False):
+            with self._lock:
+                if self.waiting >= self.queue:
+                    self._shed("queue_full")
+                self.waiting += 1
+                self._m_waiting.set(self.waiting)
+            ok = self._sem.acquire(timeout=self.max_wait_s)
+            with self._lock:
+                self.waiting -= 1
+                self._m_waiting.set(self.waiting)
+                if not ok:
+                    self._shed("timeout")
+            self._m_wait.observe(time.perf_counter() - t0)
+        with self._lock:
+            self.in_flight += 1
+            self.admitted += 1
+            self._m_in_flight.set(self.in_flight)
+        return t0
+
+    def _shed(self, reason):
+        self.shed[reason] += 1
+        CLASS_SHED.labels(self.name, reason).inc()
+        raise Shed(reason, self.retry_after_s)
+
+    def exit(self, t0):
+        dt = time.perf_counter() - t0
+        with self._lock:
+            self.in_flight -= 1
+            self._m_in_flight.set(self.in_flight)
+            self._recent.append(dt)
+        if self._sem is not None:
+            self._sem.release()
+        self._m_seconds.observe(dt)
+
+    def stats(self):
+        with self._lock:
+            v = sorted(self._recent)
+            st = {"limit": self.limit, "queue": self.queue, "in_flight": self.in_flight, "waiting": self.waiting,
+                  "admitted": self.admitted, "shed": dict(self.shed)}
+        pct = lambda p: round(v[min(len(v) - 1, int(len(v) * p / 100))] * 1000, 1) if v else None
+        st.update(p50_ms=pct(50), p95_ms=pct(95), p99_ms=pct(99), samples=len(v))
+        return st
+
+
+class Admission:
+    def __init__(self, classes=None, routes=None):
+        classes = {**DEFAULT_CLASSES, **(classes or {})}
+        self.classes = {n: RequestClass(n, **c) for n, c in classes.items()}
+        self.routes = {}
+        for name, rules in (routes or DEFAULT_ROUTES).items():
+            if name not in self.classes:
+                raise ValueError(f"admission.routes 中的请求类 {name} 未定义")
+            for r in rules:
+                self.routes[r] = name
+
+    def class_of(self, rule):
+        return self.classes[self.routes.get(rule, "default")]
+
+    def reserved_threads(self):
+        """有并发上限的类最多能占用的线程数（limit + queue）"""
+        return sum(c.limit + c.queue for c in self.classes.values() if c.limit > 0)
+
+    def stats(self):
+        return {n: c.stats() for n, c in self.classes.items()}
+
+
+def install(app, cfg=None, threads=None):
+    """按 cfg（admission: 配置块）在 app 上启用准入控制，返回 Admission（未启用时 None）"""
+    from flask import g, request, jsonify
+    cfg = cfg or {}
+    if not cfg.get("enabled", True):
+        return None
+    adm = Admission(cfg.get("classes"), cfg.get("routes"))
+    if threads and adm.reserved_threads() >= threads:
+        print(f"⚠️ 准入控制：受限请求类最多占用 {adm.reserved_threads()} 个线程，不少于 serving.threads={threads}，"
+              "高优先级请求可能仍要排队")
+
+    @app.before_request
+    def _admit():
+        rule = request.url_rule.rule if request.url_rule is not None else None
+        cls = adm.class_of(rule)
+        try:
+            g._adm = (cls, cls.enter())
+        except Shed as e:
+            resp = jsonify({"ok": False, "error": f"服务繁忙（{cls.name}: {e.reason}），请稍后重试",
+                            "class": cls.name, "retry_after_s": e.retry_after})
+            resp.status_code = 503
+            resp.headers["Retry-After"] = str(e.retry_after)
+            return resp
+
+    @app.after_request
+    def _release_on_close(resp):
+        # 流式响应在响应体发送完、连接关闭时才释放；其余留给 teardown_request（不依赖响应被 close）
+        if resp.is_streamed:
+            held = g.pop("_adm", None)
+            if held is not None:
+                resp.call_on_close(lambda: held[0].exit(held[1]))
+        return resp
+
+    @app.teardown_request
+    def _release(exc=None):
+        held = g.pop("_adm", None)       # 普通响应、视图异常、after_request 未执行时在这里释放
+        if held is not None:
+            held[0].exit(held[1])
+
+    app.extensions["plantai_admission"] = adm
+    return adm
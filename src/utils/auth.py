@@ -27,7 +27,8 @@ def create_user_if_not_exists(path, username, password, role="admin"):
         row = cur.fetchone()
         if not row:
             ph = generate_password_hash(password)
-            conn.execute("INSERT INTO users(username, password_hash, role) VALUES (?,?,?)", (username, ph, role))
+            # 多个 worker 同时启动时可能并发建号，OR IGNORE 防止唯一约束报错
+            conn.execute("INSERT OR IGNORE INTO users(username, password_hash, role) VALUES (?,?,?)", (username, ph, role))
             conn.commit()
 
 def get_user_by_name(path, username):
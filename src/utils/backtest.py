@@ -0,0 +1,238 @@
+# src/utils/backtest.py
+# -*- coding: utf-8 -*-
+"""
+自动控制回测：把历史读数插值到控制周期（60 秒一拍）的 NumPy 数组上，对一整组参数组合
+同时重放 devices.auto_control_tick 的策略（阈值、静音时段、300 秒冷却），统计浇水次数、用水量、
+补光时长与土壤低于阈值的时间
+
+向量化方式：不逐拍循环，而是对所有组合同时按“事件”推进——
+- 下一次触发 = 当前位置之后第一个满足 读数 < 阈值 的拍，用稀疏表（各 2^k 区间最小 / 最大值）
+  倍增跳跃查找，每个组合 O(log T)；落在静音时段则直接跳到时段结束
+- 浇水有反馈：触发后土壤 = 自然曲线 + 累计浇水量，下一次以“阈值 - 已浇水量”继续查找
+- 补光无反馈：一段连续偏暗的拍内按冷却间隔等距触发，整段一次算出
+循环次数只与触发次数有关，与拍数和组合数无关
+
+土壤模型（近似）：历史曲线去掉浇水造成的跳升（单步上升超过 jump）即“自然干燥曲线”，
+每次浇水按 gain（%/秒 × 水泵秒数）叠加，触发判断不考虑饱和；光照按历史读数开环判断（不含补光自身的影响）
+"""
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from src.utils import history
+
+TICK_S = 60          # auto_control_tick 的周期
+SOIL_KEY, LUX_KEY, TIME_KEY = "土壤湿度%", "光照lux", "时间"
+
+Grid = namedtuple("Grid", "soil_low pump_s pump_cooldown_s lux_target light_cooldown_s quiet_start quiet_end")
+
+
+def load_history(path, since=None, until=None):
+    """历史 CSV -> (本地时间秒, 土壤, 光照) 数组，空值 NaN；时间按本地钟面（与静音时段的小时一致）"""
+    rows = list(history.iter_rows(path, since, until))
+    t = np.array([r.get(TIME_KEY) or "NaT" for r in rows], dtype="datetime64[s]").astype(np.float64)
+    def col(k):
+        out = np.full(len(rows), np.nan)
+        for i, r in enumerate(rows):
+            try: out[i] = float(r.get(k))
+            except (TypeError, ValueError): pass
+        return out
+    soil, lux = col(SOIL_KEY), col(LUX_KEY)
+    ok = ~np.isnan(t)
+    order = np.argsort(t[ok], kind="stable")
+    return t[ok][order], soil[ok][order], lux[ok][order]
+
+
+def _tables(arr, op):
+    """稀疏表：levels[k][i] = op(arr[i : i + 2^k])（越界部分不计入），最后一级 2^k >= len(arr)"""
+    levels = [arr]
+    k = 1
+    while k < len(arr):
+        prev = levels[-1]
+        nxt = prev.copy()
+        op(prev[:-k], prev[k:], out=nxt[:-k])
+        levels.append(nxt)
+        k *= 2
+    return levels
+
+
+def _first(levels, p, v, below=True):
+    """每个起点 p 之后第一个 arr < v（below）/ arr >= v 的下标；没有则 >= T"""
+    T = len(levels[0])
+    p = p.copy()
+    for k in range(len(levels) - 1, -1, -1):
+        live = p < T
+        blk = levels[k][np.where(live, p, 0)]
+        skip = live & ((blk >= v) if below else (blk < v))
+        p += skip.astype(np.int64) << k
+    return p
+
+
+def _quiet_hours(q0, q1, h):
+    """与 devices._within_quiet_hours 相同的判断（start == end 时全天静音）"""
+    return np.where(q0 < q1, (h >= q0) & (h < q1), (h >= q0) | (h < q1))
+
+
+class Replay:
+    def __init__(self, t, soil, lux, tick_s=TICK_S, jump=3.0):
+        ok_s, ok_l = ~np.isnan(soil), ~np.isnan(lux)
+        if ok_s.sum() < 2 or ok_l.sum() < 2:
+            raise ValueError("历史数据不足（土壤 / 光照至少各需 2 条有效读数）")
+        self.tick_s = float(tick_s)
+        self.t = np.arange(math.ceil(t[0] / tick_s) * tick_s, t[-1] + 1e-9, tick_s)
+        self.T = len(self.t)
+        # 自然干燥曲线：去掉单步跳升（浇水），其余变化（含噪声）原样累积
+        ts, s = t[ok_s], soil[ok_s]
+        d = np.diff(s)
+        wet = d > jump
+        self.jumps = d[wet]
+        natural = np.concatenate(([s[0]], s[0] + np.cumsum(np.where(wet, 0.0, d))))
+        self.natural = np.interp(self.t, ts, natural).astype(np.float32)
+        self.lux = np.interp(self.t, t[ok_l], lux[ok_l]).astype(np.float32)
+        self.sod = self.t % 86400                     # 本地钟面秒
+        self.hour = (self.sod // 3600).astype(np.int64)
+        self._soil_min = _tables(self.natural, np.minimum)
+        self._lux_min = _tables(self.lux, np.minimum)
+        self._lux_max = _tables(self.lux, np.maximum)
+
+    def estimate_gain(self, pump_s):
+        """历史中每次浇水的平均跳升 / 当时的水泵秒数（%/秒）；没有跳升时 None"""
+        return float(np.median(self.jumps)) / float(pump_s) if len(self.jumps) else None
+
+    def _cool(self, cooldown_s):
+        """冷却（now - last > cooldown）换算为下一次可触发的拍数间隔"""
+        return (np.asarray(cooldown_s, dtype=np.float64) // self.tick_s).astype(np.int64) + 1
+
+    def _ticks_until(self, j, hour):
+        """从第 j 拍到下一次钟面到达 hour 点的拍数（向上取整）"""
+        dt = (np.asarray(hour, dtype=np.float64) * 3600 - self.sod[np.minimum(j, self.T - 1)]) % 86400
+        return np.ceil(dt / self.tick_s).astype(np.int64)
+
+    def _quiet_mask(self, q0, q1):
+        h = np.arange(24)[:, None]
+        m = _quiet_hours(q0[None, :], q1[None, :], h)
+        return m.all(axis=0), ~m.any(axis=0)      # 全天静音 / 从不静音
+
+    # --- 水泵（有反馈）---
+    def pump_events(self, soil_low, pump_s, cooldown_s, q0, q1, gain):
+        """返回 (触发拍下标矩阵 [轮次, 组合]（-1 为无）, 每次浇水的土壤增量)"""
+        n = len(soil_low)
+        cool = self._cool(cooldown_s)
+        always, _ = self._quiet_mask(q0, q1)
+        step = gain * np.asarray(pump_s, dtype=np.float64)
+        p = np.where(always, self.T, 0).astype(np.int64)
+        W = np.zeros(n)
+        events = []
+        while True:
+            live = p < self.T
+            if not live.any():
+                break
+            j = _first(self._soil_min, p, soil_low - W)
+            hit = live & (j < self.T)
+            quiet = hit & _quiet_hours(q0, q1, self.hour[np.minimum(j, self.T - 1)])
+            act = hit & ~quiet
+            p = np.where(quiet, j + self._ticks_until(j, q1), np.where(act, j + cool, self.T))
+            W += np.where(act, step, 0.0)
+            if act.any():
+                events.append(np.where(act, j, -1))
+        ev = np.array(events, dtype=np.int64) if events else np.full((0, n), -1, np.int64)
+        return ev, step
+
+    # --- 补光（开环）---
+    def light_events(self, lux_target, cooldown_s, q0, q1, on_s=None):
+        """返回 (触发次数, 亮灯拍数)；on_s 为 WS2812 每次时长（秒），None 表示普通补光亮到光照达标 / 进入静音"""
+        n = len(lux_target)
+        cool = self._cool(cooldown_s)
+        always, never = self._quiet_mask(q0, q1)
+        p = np.where(always, self.T, 0).astype(np.int64)
+        count = np.zeros(n, np.int64)
+        lit = np.zeros(n, np.float64)
+        while True:
+            live = p < self.T
+            if not live.any():
+                break
+            j = _first(self._lux_min, p, lux_target)
+            hit = live & (j < self.T)
+            jj = np.minimum(j, self.T - 1)
+            quiet = hit & _quiet_hours(q0, q1, self.hour[jj])
+            act = hit & ~quiet
+            # 这一段偏暗的结束：光照回到目标以上，或进入静音时段
+            end = _first(self._lux_max, j, lux_target, below=False)
+            end = np.minimum(end, np.where(never, self.T, jj + self._ticks_until(jj, q0)))
+            end = np.minimum(end, self.T)
+            k = np.where(act, -(-(end - j) // cool), 0)         # 段内按冷却等距触发的次数
+            count += k
+            lit += np.where(act, end - j, 0) if on_s is None else k * (float(on_s) / self.tick_s)
+            p = np.where(quiet, j + self._ticks_until(jj, q1), np.where(act, j + k * cool, self.T))
+        return count, lit
+
+    # --- 土壤轨迹统计（按组合分块展开）---
+    def soil_stats(self, events, step, dry_pct, chunk=16):
+        """每个组合：土壤低于 dry_pct 的小时数、最小值与均值（按模型重建的轨迹，限制在 0~100）"""
+        n = events.shape[1]
+        dry_pct = np.broadcast_to(np.asarray(dry_pct, dtype=np.float64), (n,))
+        dry_h, lo, mean = np.zeros(n), np.zeros(n), np.zeros(n)
+        for a in range(0, n, chunk):
+            b = min(n, a + chunk)
+            inc = np.zeros((b - a, self.T + 1), np.float32)
+            ev = events[:, a:b]
+            r, c = np.nonzero(ev >= 0)
+            np.add.at(inc, (c, ev[r, c]), step[a:b][c])
+            soil = np.clip(self.natural[None, :] + np.cumsum(inc[:, :-1], axis=1), 0.0, 100.0)
+            dry_h[a:b] = (soil < dry_pct[a:b, None]).sum(axis=1) * self.tick_s / 3600
+            lo[a:b], mean[a:b] = soil.min(axis=1), soil.mean(axis=1)
+        return dry_h, lo, mean
+
+    def run(self, grid, gain, flow_ml_s=30.0, dry_pct=None, ws_on_s=None):
+        """对 Grid（各字段为等长数组）逐组合回测，返回 dict 列"""
+        g = Grid(*[np.asarray(x) for x in grid])
+        q0, q1 = g.quiet_start.astype(np.int64), g.quiet_end.astype(np.int64)
+        # 土壤 / 光照两部分互不影响，各自相同参数的组合只算一次
+        soil_keys = np.stack([g.soil_low, g.pump_s, g.pump_cooldown_s, q0, q1], axis=1).astype(np.float64)
+        uniq, inv = np.unique(soil_keys, axis=0, return_inverse=True)
+        inv = inv.reshape(-1)
+        ev, step = self.pump_events(uniq[:, 0], uniq[:, 1], uniq[:, 2], uniq[:, 3].astype(np.int64),
+                                    uniq[:, 4].astype(np.int64), gain)
+        pumps = (ev >= 0).sum(axis=0)
+        dry_h, lo, mean = self.soil_stats(ev, step, uniq[:, 0] if dry_pct is None else dry_pct)
+        light_keys = np.stack([g.lux_target, g.light_cooldown_s, q0, q1], axis=1).astype(np.float64)
+        luniq, linv = np.unique(light_keys, axis=0, return_inverse=True)
+        linv = linv.reshape(-1)
+        light_n, lit = self.light_events(luniq[:, 0], luniq[:, 1], luniq[:, 2].astype(np.int64),
+                                         luniq[:, 3].astype(np.int64), ws_on_s)
+        return {
+            **g._asdict(),
+            "pump_activations": pumps[inv],
+            "water_l": pumps[inv] * g.pump_s * flow_ml_s / 1000.0,
+            "light_activations": light_n[linv],
+            "light_on_min": lit[linv] * self.tick_s / 60,
+            "dry_h": dry_h[inv], "soil_min": lo[inv], "soil_mean": mean[inv],
+        }
+
+    def simulate_loop(self, p, gain, ws_on_s=None):
+        """逐拍 Python 循环的参考实现（与 auto_control_tick 一一对应），用于校验向量化结果"""
+        soil_low, pump_s, pump_cd, lux_target, light_cd, q0, q1 = p
+        W, last_pump, last_light = 0.0, -math.inf, -math.inf
+        pumps = lights = lit = 0
+        on = False          # 普通补光：触发后亮到光照达标或进入静音
+        for i in range(self.T):
+            now = i * self.tick_s
+            if _quiet_hours(q0, q1, self.hour[i]):
+                on = False
+                continue
+            if self.natural[i] + W < soil_low and now - last_pump > pump_cd:
+                pumps += 1
+                W += gain * pump_s
+                last_pump = now
+            if self.lux[i] < lux_target:
+                if now - last_light > light_cd:
+                    lights += 1
+                    last_light = now
+                    on = True
+                lit += on
+            else:
+                on = False
+        if ws_on_s is not None:
+            lit = lights * ws_on_s / self.tick_s
+        return pumps, lights, lit
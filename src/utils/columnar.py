@@ -0,0 +1,260 @@
+# src/utils/columnar.py
+# -*- coding: utf-8 -*-
+"""
+列式导出：历史读数 / 分区识别 / 动作记录 -> Arrow IPC、Parquet 或 NumPy .npz
+
+- 列名为英文、类型固定：time 为 UTC 毫秒时间戳（int64 / timestamp[ms]），读数通道 float32，
+  文本列（区域、标签、动作）为 string（Parquet 自带字典编码）
+- 按 batch_rows 行一批读 CSV、转列、写出；Arrow 流与 Parquet（每批一个 row group）边写边产出字节，
+  HTTP 下载不必先在内存里拼完整个文件
+- 落盘的 Arrow 为 IPC 文件格式（Feather v2），load() 用内存映射打开，多年数据也是即开即用
+- 没有 pyarrow 时退回 .npz（未压缩）：各列先攒齐再一次写出，不能流式
+
+  from src.utils import columnar
+  cols = columnar.load("data/history.arrow")     # {列名: numpy 数组}
+"""
+import csv, io, time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from src.utils import history
+from src.utils.metrics import counter
+
+EXPORT_ROWS = counter("plantai_export_rows", "列式导出的行数", ("table", "format"))
+
+# 表 -> [(列名, CSV 表头, 类型)]；类型 f = float32，s = 文本；time 列单独处理
+TABLES = {
+    "history": ("时间", [("temperature_c", "温度°C", "f"), ("humidity_pct", "湿度%", "f"),
+                       ("light_lux", "光照lux", "f"), ("eco2_ppm", "CO₂ ppm", "f"),
+                       ("tvoc_ppb", "TVOC ppb", "f"), ("soil_moisture_pct", "土壤湿度%", "f")]),
+    "plants": ("time", [("region", "region", "s"), ("label", "label", "s"),
+                        ("confidence", "confidence", "f"), ("backend", "backend", "s")]),
+    "actions": ("time", [("action", "action", "s"), ("detail", "detail", "s")]),
+}
+FORMATS = {"arrow": ".arrow", "parquet": ".parquet", "npz": ".npz"}
+MIME = {"arrow": "application/vnd.apache.arrow.stream", "parquet": "application/vnd.apache.parquet",
+        "npz": "application/octet-stream"}
+
+
+def have_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def default_format():
+    return "arrow" if have_pyarrow() else "npz"
+
+
+def check_format(fmt):
+    """格式不支持抛 ValueError，缺 pyarrow 抛 RuntimeError"""
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的格式：{fmt}（可选 {', '.join(FORMATS)}）")
+    if fmt != "npz" and not have_pyarrow():
+        raise RuntimeError(f"{fmt} 需要 pyarrow（pip install pyarrow），或改用 format=npz")
+
+
+def source_path(table, cfg):
+    """表对应的 CSV（随配置）；未知表 None"""
+    return {"history": cfg.get("history_csv", "data/history.csv"),
+            "plants": (cfg.get("regions") or {}).get("history_csv", "data/plants.csv"),
+            "actions": "data/actions.csv"}.get(table)
+
+
+# --- 读 CSV -> 列批 ---
+_NAT = np.iinfo(np.int64).min
+
+
+def _utc_ms(stamps):
+    """本地时间字符串数组 -> UTC 毫秒（空值为 _NAT）；时区偏移按小时查一次（夏令时切换也对）"""
+    naive = np.array(stamps, dtype="datetime64[s]").astype(np.int64)
+    ok = naive != _NAT
+    hours, inv = np.unique(np.where(ok, naive, 0) // 3600, return_inverse=True)
+    offset = np.array([h * 3600 - time.mktime(time.gmtime(h * 3600)[:8] + (-1,)) for h in hours.tolist()],
+                      dtype=np.int64)
+    return np.where(ok, (naive - offset[inv.reshape(-1)]) * 1000, _NAT)
+
+
+def _floats(vals):
+    try:
+        return np.array(vals, dtype=np.float32)
+    except ValueError:
+        out = np.full(len(vals), np.nan, np.float32)
+        for i, v in enumerate(vals):
+            try: out[i] = float(v)
+            except (TypeError, ValueError): pass
+        return out
+
+
+def _rows(table, path, since, until):
+    """CSV 行 dict；history 走按天文件（只打开范围内的），其余为单文件按时间列过滤"""
+    if table == "history":
+        yield from history.iter_rows(path, since, until)
+        return
+    if not Path(path).exists():
+        return
+    lo = str(history._parse_day(since)) if since else None
+    hi = str(history._parse_day(until) + timedelta(days=1)) if until else None
+    key = TABLES[table][0]
+    with open(path, newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            t = r.get(key) or ""
+            if (lo and t < lo) or (hi and t >= hi):
+                continue
+            yield r
+
+
+def iter_batches(table, path, since=None, until=None, batch_rows=65536):
+    """按批产出 {列名: numpy 数组}，time 为 int64 UTC 毫秒；时间无法解析的行丢弃"""
+    tkey, cols = TABLES[table]
+    buf = []
+    def flush():
+        stamps = [r.get(tkey) or "NaT" for r in buf]
+        try:
+            t = _utc_ms(stamps)
+            ok = None
+        except ValueError:        # 个别行时间损坏：逐行解析
+            ok = np.array([_valid_stamp(s) for s in stamps])
+            t = _utc_ms([s for s, k in zip(stamps, ok) if k])
+        out = {"time": t}
+        rows = buf if ok is None else [r for r, k in zip(buf, ok) if k]
+        for name, key, kind in cols:
+            vals = [r.get(key) for r in rows]
+            out[name] = _floats(vals) if kind == "f" else np.array([v or "" for v in vals], dtype=str)
+        if ok is None:
+            bad = out["time"] == _NAT
+            if bad.any():
+                out = {k: v[~bad] for k, v in out.items()}
+        return out
+    for r in _rows(table, path, since, until):
+        buf.append(r)
+        if len(buf) >= batch_rows:
+            yield flush()
+            buf = []
+    if buf:
+        yield flush()
+
+
+def _valid_stamp(s):
+    try:
+        datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+# --- 写出 ---
+def _schema(table):
+    import pyarrow as pa
+    fields = [pa.field("time", pa.timestamp("ms", tz="UTC"))]
+    for name, _, kind in TABLES[table][1]:
+        fields.append(pa.field(name, pa.float32() if kind == "f" else pa.string()))
+    return pa.schema(fields)
+
+
+def _record_batch(schema, b):
+    import pyarrow as pa
+    arrays = [pa.array(b["time"], type=pa.int64()).cast(schema.field("time").type)]
+    for f in list(schema)[1:]:
+        v = b[f.name]
+        arrays.append(pa.array(v, type=f.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _Chunks(io.RawIOBase):
+    """只追加的内存 sink：写入的字节由 take() 取走，用于边写边产出"""
+    def __init__(self):
+        self._parts, self._pos = [], 0
+    def writable(self):
+        return True
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+    def tell(self):
+        return self._pos
+    def take(self):
+        out, self._parts = b"".join(self._parts), []
+        return out
+
+
+def iter_export(table, path, fmt, since=None, until=None, batch_rows=65536, stream=True):
+    """导出为字节块的生成器（HTTP 流式下载 / 写文件共用）；arrow 在 stream=True 时为 IPC 流格式，否则为文件格式"""
+    check_format(fmt)
+    rows = EXPORT_ROWS.labels(table, fmt)
+    batches = iter_batches(table, path, since, until, batch_rows)
+    if fmt == "npz":
+        parts = {}
+        for b in batches:
+            rows.inc(len(b["time"]))
+            for k, v in b.items():
+                parts.setdefault(k, []).append(v)
+        cols = {k: np.concatenate(v) for k, v in parts.items()} or _empty(table)
+        sink = io.BytesIO()
+        np.savez(sink, **cols)
+        yield sink.getvalue()
+        return
+    import pyarrow as pa
+    schema = _schema(table)
+    sink = _Chunks()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+        write = lambda rb: writer.write_table(pa.Table.from_batches([rb]))
+    else:
+        writer = (pa.ipc.new_stream if stream else pa.ipc.new_file)(pa.PythonFile(sink, mode="w"), schema)
+        write = writer.write_batch
+    for b in batches:
+        rows.inc(len(b["time"]))
+        write(_record_batch(schema, b))
+        chunk = sink.take()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.take()
+
+
+def _empty(table):
+    out = {"time": np.zeros(0, np.int64)}
+    for name, _, kind in TABLES[table][1]:
+        out[name] = np.zeros(0, np.float32 if kind == "f" else "<U1")
+    return out
+
+
+def export_file(table, path, out, fmt=None, since=None, until=None, batch_rows=65536):
+    """导出到文件，返回 (格式, 字节数)；先写临时文件再改名"""
+    fmt = fmt or default_format()
+    out = Path(out)
+    tmp = out.with_name(out.name + ".part")
+    n = 0
+    with open(tmp, "wb") as f:
+        for chunk in iter_export(table, path, fmt, since, until, batch_rows, stream=False):
+            f.write(chunk)
+            n += len(chunk)
+    tmp.replace(out)
+    return fmt, n
+
+
+def load(path):
+    """导出文件 -> {列名: numpy 数组}；.arrow 内存映射、数值列零拷贝，time 为 int64 UTC 毫秒"""
+    p = str(path)
+    if p.endswith(".npz"):
+        with np.load(p) as z:
+            return {k: z[k] for k in z.files}
+    import pyarrow as pa
+    if p.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        t = pq.read_table(p, memory_map=True)
+    else:
+        t = pa.ipc.open_file(pa.memory_map(p, "r")).read_all()
+    out = {}
+    for name in t.column_names:
+        col = t.column(name)
+        if pa.types.is_timestamp(col.type):
+            col = col.cast(pa.int64())
+        out[name] = col.to_numpy()
+    return out
@@ -0,0 +1,133 @@
+# src/utils/downsample.py
+# -*- coding: utf-8 -*-
+"""
+曲线降采样：Largest-Triangle-Three-Buckets（LTTB），NumPy 列数组上整体向量化
+
+经典 LTTB 逐桶串行：桶 i 的锚点 A 是桶 i-1 已选中的点。这里分两遍全量计算——
+第一遍以上一桶均值为 A，第二遍以第一遍选中的点为 A——每遍都是一次性的数组运算，
+结果与串行版本几乎一致，峰谷都能保留，百万点也在几十毫秒内
+"""
+import warnings
+from operator import itemgetter
+
+import numpy as np
+
+
+def lttb_indices(x, y, n, passes=2):
+    """从 (x, y) 中挑 n 个点，返回升序下标（含首尾点）；x 需单调不减，y 中的 NaN 按线性插值参与挑选"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    N = len(x)
+    if n >= N or N <= 2:
+        return np.arange(N)
+    x = x - x[0]            # epoch 秒直接做累加与叉积会损失精度
+    n = max(int(n), 3)
+    nan = np.isnan(y)
+    if nan.all():
+        return np.unique(np.linspace(0, N - 1, n).astype(np.int64))
+    if nan.any():
+        y = y.copy()
+        y[nan] = np.interp(x[nan], x[~nan], y[~nan])
+
+    # 中间 N-2 个点均分为 n-2 桶：edges[b] ~ edges[b+1] 为桶 b（每桶至少 1 点）
+    nb = n - 2
+    edges = (1 + np.arange(nb + 1) * ((N - 2) / nb)).astype(np.int64)
+    edges[-1] = N - 1
+    sizes = np.diff(edges)
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    ax = (cx[edges[1:]] - cx[edges[:-1]]) / sizes
+    ay = (cy[edges[1:]] - cy[edges[:-1]]) / sizes
+
+    # C：下一桶均值，最后一桶用末点
+    Cx = np.append(ax[1:], x[-1])
+    Cy = np.append(ay[1:], y[-1])
+    # A：第一遍为上一桶均值，第一桶用首点
+    Ax = np.insert(ax[:-1], 0, x[0])
+    Ay = np.insert(ay[:-1], 0, y[0])
+
+    bucket = np.repeat(np.arange(nb), sizes)
+    starts = edges[:-1] - 1
+    xi, yi = x[1:-1], y[1:-1]
+    for p in range(passes):
+        # 三角形面积（的两倍）对桶内点是线性的：|P·y + Q·x + R|，系数按桶算好再展开
+        P, Q = Ax - Cx, Cy - Ay
+        R = -P * Ay - Ax * Q
+        area = np.abs(np.repeat(P, sizes) * yi + np.repeat(Q, sizes) * xi + np.repeat(R, sizes))
+        # 每桶面积最大值（reduceat），再取各桶第一个达到最大值的位置
+        hit = np.flatnonzero(area == np.repeat(np.maximum.reduceat(area, starts), sizes))
+        pick = hit[np.r_[True, bucket[hit[1:]] != bucket[hit[:-1]]]] + 1
+        if p + 1 < passes:
+            Ax = np.insert(x[pick[:-1]], 0, x[0])
+            Ay = np.insert(y[pick[:-1]], 0, y[0])
+    return np.concatenate(([0], pick, [N - 1]))
+
+
+def _columns(rows, keys):
+    """dict 行 -> (通道数, 行数) float 数组，空值 / 非数字为 NaN"""
+    get = itemgetter(*keys)
+    try:
+        # 整表拼成一串交给 C 解析，比逐个 float() 快一个数量级；空值补 nan，
+        # 有脏数据时 numpy 告警并截断，退回逐个解析
+        text = ",%s," % ",".join([",".join(get(r)) for r in rows])
+        text = text.replace(",,", ",nan,").replace(",,", ",nan,")
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            out = np.fromstring(text[1:-1], sep=",")
+        if out.size == len(rows) * len(keys):
+            return out.reshape(len(rows), len(keys)).T
+    except (TypeError, KeyError, ValueError, DeprecationWarning):
+        pass
+    out = np.full((len(keys), len(rows)), np.nan)
+    for j, k in enumerate(keys):
+        for i, r in enumerate(rows):
+            try:
+                out[j, i] = float(r.get(k))
+            except (TypeError, ValueError):
+                pass
+    return out
+
+
+def _time_axis(rows, key):
+    """时间列 -> epoch 秒；解析失败或非单调时退回行号（历史按时间顺序写入，等间隔近似）"""
+    try:
+        t = np.array([r.get(key) or "NaT" for r in rows], dtype="datetime64[s]").astype(np.float64)
+        if not np.isnan(t).any() and not (np.diff(t) < 0).any():
+            return t
+    except ValueError:
+        pass
+    return np.arange(len(rows), dtype=np.float64)
+
+
+def downsample_rows(rows, points, time_key, channels):
+    """
+    对 dict 行按各数值通道分别做 LTTB，取下标并集保持行对齐，返回不超过 points 行。
+    每通道先按 points / 通道数 取点（并集必不超预算），再二分每通道点数，使并集尽量接近 points
+    """
+    N = len(rows)
+    points = int(points)
+    if N <= points:
+        return rows
+    x = _time_axis(rows, time_key)
+    cols = _columns(rows, channels)
+    cols = [c for c in cols if not np.isnan(c).all()]
+    if not cols:
+        return [rows[i] for i in np.unique(np.linspace(0, N - 1, points).astype(np.int64))]
+    def union(budget):
+        return np.unique(np.concatenate([lttb_indices(x, c, budget) for c in cols]))
+
+    lo = max(3, points // len(cols))
+    idx = union(lo)
+    if len(cols) > 1:
+        # lo 可行（并集 ≤ points），hi 不可行；各通道重叠越多可放得越大。二分至多 8 轮，差 2% 以内即停
+        hi = points + 1
+        for _ in range(8):
+            if hi - lo <= 1 or len(idx) >= points * 0.98:
+                break
+            mid = (lo + hi) // 2
+            more = union(mid)
+            if len(more) <= points:
+                lo, idx = mid, more
+            else:
+                hi = mid
+    return [rows[i] for i in idx[:points]]
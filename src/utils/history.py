@@ -0,0 +1,435 @@
+# src/utils/history.py
+# -*- coding: utf-8 -*-
+"""
+历史记录：按天分文件 + 缓冲写入 + 旧文件压缩，读取时透明跨文件
+
+目录布局（history_csv = data/history.csv 时）：
+  data/history/2026-10-19.csv          当天，追加写
+  data/history/2026-10-01.csv.gz       超过 compress_after_days 天的压缩（gzip，或 zstd 需 zstandard）
+  data/history.csv                     旧版单文件；HistoryWriter 启动时按天拆分迁移，迁移前读者照常读取
+
+写入：行先进内存缓冲，满 flush_rows 行或距上次刷写 flush_interval_s 秒时整批写入；
+fsync 策略 flush（每次刷写）/ rotate（仅换日与关闭时）/ never。文件句柄常开，不再每行 open/close
+读取：按文件名日期挑文件，范围查询只读相关天；tail 从最新文件尾部倒读
+"""
+import csv, gzip, io, os, re, shutil, threading, time
+from contextlib import nullcontext
+from datetime import date, datetime
+from pathlib import Path
+
+from src.utils.metrics import counter, gauge, histogram
+from src.utils.scheduler import RepeatedTimer
+
+_DAY_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})\.csv(\.gz|\.zst)?$")
+_FILES_LOCK = threading.Lock()     # 本进程内：按天文件的压缩改名 / 删除与列目录互斥
+_COMPRESS_LOCK = threading.Lock()  # 本进程内：压缩串行
+_MIGRATING_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})\.csv\.(migrating|merged)$")
+
+HISTORY_FLUSHES = counter("plantai_history_flushes", "历史缓冲刷写次数", ("reason",))
+HISTORY_ROWS = counter("plantai_history_rows", "写入的历史行数")
+HISTORY_FSYNC = histogram("plantai_history_fsync_seconds", "历史文件 fsync 耗时")
+HISTORY_BUFFERED = gauge("plantai_history_buffered_rows", "尚未刷写的历史行数")
+
+
+def day_dir(path):
+    """data/history.csv -> data/history/"""
+    p = Path(path)
+    return p.with_suffix("") if p.suffix else p.with_name(p.name + ".d")
+
+
+def history_files(path):
+    """
+    [(日期 | None, 文件)]，旧版单文件（日期 None）在最前，其余按日期升序
+    同一天可能有多个文件：压缩文件 + 之后补写的 .csv（迟到的行、时钟回拨），压缩的在前，都要读
+    """
+    out = []
+    legacy = Path(path)
+    if legacy.is_file():
+        out.append((None, legacy))
+    d = day_dir(path)
+    if not d.is_dir():
+        return out
+    # 迁移换入阶段（旧文件已改名为 .migrating-src）：未换入的天先读 .migrating（旧数据）再读当天文件；
+    # 正在合并的天读 .merged（已含两者）
+    swapping = legacy.with_name(legacy.name + ".migrating-src").is_file()
+    files, merged = [], set()
+    with _FILES_LOCK:           # 与压缩的改名 / 删除互斥：不会同时列出合并前后的两份
+        for f in d.iterdir():
+            m = _DAY_RE.match(f.name)
+            if m:
+                files.append((date.fromisoformat(m.group(1)), 2 if not m.group(2) else 0, f))
+                continue
+            m = _MIGRATING_RE.match(f.name) if swapping else None
+            if m:
+                day = date.fromisoformat(m.group(1))
+                if m.group(2) == "merged":
+                    merged.add(day)
+                files.append((day, 1 if m.group(2) == "migrating" else 3, f))
+    if merged:
+        files = [x for x in files if x[0] not in merged or x[1] in (0, 3)]
+    out.extend((day, f) for day, _, f in sorted(files, key=lambda x: x[:2]))
+    return out
+
+
+def open_text(f):
+    name = str(f)
+    if name.endswith(".gz"):
+        return gzip.open(name, "rt", encoding="utf-8", newline="")
+    if name.endswith(".zst"):
+        import zstandard
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(name, "rb")), encoding="utf-8", newline="")
+    return open(name, "r", encoding="utf-8", newline="")
+
+
+def _parse_day(v):
+    if v is None or isinstance(v, date):
+        return v.date() if isinstance(v, datetime) else v
+    return datetime.strptime(str(v)[:10], "%Y-%m-%d").date()
+
+
+def iter_rows(path, since=None, until=None):
+    """按日期范围（含首尾，date / datetime / 'YYYY-MM-DD'）逐行产出 dict；按天文件只打开范围内的"""
+    since, until = _parse_day(since), _parse_day(until)
+    for day, f in history_files(path):
+        if day is not None and ((since and day < since) or (until and day > until)):
+            continue
+        try:
+            fh = open_text(f)
+        except FileNotFoundError:
+            continue                    # 列出之后刚被压缩合并进同一天的压缩文件
+        with fh:
+            r = csv.DictReader(fh)
+            if day is not None:
+                yield from r            # 按天文件：文件名已决定日期，逐行不必再解析
+                continue
+            for row in r:
+                try:
+                    d = datetime.strptime(row.get("时间"), "%Y-%m-%d %H:%M:%S").date()
+                except (TypeError, ValueError):
+                    continue
+                if (since and d < since) or (until and d > until):
+                    continue
+                yield row
+
+
+def _tail_lines(f, n, block=64 * 1024):
+    """未压缩文件末尾 n 行（从文件尾倒读，不读整个文件），返回 (表头, 行列表)"""
+    with open(f, "rb") as fh:
+        header = fh.readline().decode("utf-8").rstrip("\r\n")
+        body_start = fh.tell()
+        fh.seek(0, os.SEEK_END)
+        pos = fh.tell()
+        buf = b""
+        while pos > body_start and buf.count(b"\n") <= n:
+            step = min(block, pos - body_start)
+            pos -= step
+            fh.seek(pos)
+            buf = fh.read(step) + buf
+    lines = buf.decode("utf-8", errors="replace").splitlines()
+    if pos > body_start:
+        lines = lines[1:]            # 第一行可能不完整
+    return header, ([l for l in lines if l][-n:] if n else [])
+
+
+def tail_rows(path, n=50):
+    """最新 n 行（旧 -> 新），跨按天文件与旧版单文件"""
+    chunks, need = [], n
+    for day, f in reversed(history_files(path)):
+        if need <= 0:
+            break
+        try:
+            if str(f).endswith(".csv"):
+                header, lines = _tail_lines(f, need)
+                rows = list(csv.DictReader([header] + lines))
+            else:
+                with open_text(f) as fh:
+                    rows = list(csv.DictReader(fh))[-need:]
+        except FileNotFoundError:
+            continue                    # 列出之后刚被压缩合并
+        chunks.append(rows)
+        need -= len(rows)
+    out = []
+    for rows in reversed(chunks):
+        out.extend(rows)
+    return out
+
+
+def iter_csv_bytes(path, since=None, until=None, chunk=256 * 1024):
+    """把范围内所有文件拼成一个 CSV（只有一行表头）按块产出，用于下载；无范围时原样拷贝不解析"""
+    if since or until:
+        out = io.StringIO()
+        w = None
+        for row in iter_rows(path, since, until):
+            if w is None:
+                w = csv.DictWriter(out, fieldnames=list(row.keys()))
+                w.writeheader()
+            w.writerow(row)
+            if out.tell() >= chunk:
+                yield out.getvalue().encode("utf-8")
+                out.seek(0); out.truncate()
+        if out.tell():
+            yield out.getvalue().encode("utf-8")
+        return
+    first = True
+    for _, f in history_files(path):
+        try:
+            fh = open_text(f)
+        except FileNotFoundError:
+            continue
+        with fh:
+            header = fh.readline()
+            if first:
+                yield header.encode("utf-8")
+                first = False
+            while True:
+                s = fh.read(chunk)
+                if not s:
+                    break
+                yield s.encode("utf-8")
+
+
+def _open_binary(name):
+    """压缩文件 -> 解压后的二进制读取流"""
+    if str(name).endswith(".gz"):
+        return gzip.open(name, "rb")
+    import zstandard
+    return zstandard.ZstdDecompressor().stream_reader(open(name, "rb"), read_across_frames=True, closefd=True)
+
+
+def _copy(src, out, skip_header=False):
+    if skip_header:
+        src.readline()
+    while True:
+        b = src.read(1 << 20)
+        if not b: break
+        out.write(b)
+
+
+def compress_file(f, codec="gzip", level=None, skip_header=False, lock=None):
+    """
+    压缩为 .gz / .zst（先写临时文件再改名），成功后删除原文件；返回新路径
+    同一天已有压缩文件时（过了压缩期才补传的记录）合并：先写旧压缩文件内容，再写本文件
+    （skip_header 时跳过本文件的表头行）。lock 给出时改名与删除在锁内完成，持锁的读者不会看到新旧重复
+    """
+    f = Path(f)
+    if codec == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            print("⚠️ 未安装 zstandard，改用 gzip 压缩历史")
+            codec = "gzip"
+    dst = f.with_name(f.name + (".zst" if codec == "zstd" else ".gz"))
+    olds = [p for p in (f.with_name(f.name + ".gz"), f.with_name(f.name + ".zst")) if p.is_file()]
+    tmp = dst.with_name(dst.name + ".tmp")
+    with open(tmp, "wb") as raw:
+        if codec == "zstd":
+            out = zstandard.ZstdCompressor(level=level or 10).stream_writer(raw, closefd=False)
+        else:
+            out = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=level or 6, mtime=0)
+        with out:
+            for p in olds:
+                with _open_binary(p) as src:
+                    _copy(src, out)
+            with open(f, "rb") as src:
+                _copy(src, out, skip_header and bool(olds))
+        raw.flush()
+        os.fsync(raw.fileno())
+    with lock or nullcontext():
+        os.replace(tmp, dst)
+        for p in olds:
+            if p != dst:
+                p.unlink()
+        f.unlink()
+    return dst
+
+
+class HistoryWriter:
+    """
+    缓冲 + 按天切分的历史写入器（线程安全）；只应由持有传感器的那个进程创建
+    row[0] 为 'YYYY-MM-DD HH:MM:SS'，按它决定写入哪一天的文件
+    """
+    def __init__(self, path, header, flush_rows=32, flush_interval_s=60, fsync="flush",
+                 compress_after_days=7, compression="gzip"):
+        self.path = str(path)
+        self.dir = day_dir(path)
+        self.header = list(header)
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval_s = max(0.0, float(flush_interval_s))
+        self.fsync = fsync
+        self.compress_after_days = int(compress_after_days)
+        self.compression = compression
+        self._buf = []
+        self._day = None
+        self._fh = None
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.dir.mkdir(parents=True, exist_ok=True)
+        legacy = Path(self.path)
+        if legacy.is_file() or legacy.with_name(legacy.name + ".migrating-src").is_file():
+            self.migrate_legacy()       # 含上次迁移中途断电后的续做
+        self._timer = RepeatedTimer(self.flush_interval_s, self.flush_if_due, name="history-flush") \
+            if self.flush_interval_s else None
+        self.compress_old()
+
+    # --- 写 ---
+    def append(self, row):
+        with self._lock:
+            self._buf.append(row)
+            HISTORY_ROWS.inc()
+            if len(self._buf) >= self.flush_rows:
+                self._flush("rows")
+            HISTORY_BUFFERED.set(len(self._buf))
+
+    def flush_if_due(self):
+        with self._lock:
+            if self._buf and time.monotonic() - self._last_flush >= self.flush_interval_s:
+                self._flush("interval")
+            HISTORY_BUFFERED.set(len(self._buf))
+
+    def flush(self):
+        with self._lock:
+            self._flush("manual")
+            HISTORY_BUFFERED.set(0)
+
+    def _open(self, day):
+        f = self.dir / f"{day}.csv"
+        new = not f.exists() or f.stat().st_size == 0
+        self._fh = open(f, "a", newline="", encoding="utf-8")
+        self._day = day
+        if new:
+            csv.writer(self._fh).writerow(self.header)
+
+    def _sync(self):
+        self._fh.flush()
+        with HISTORY_FSYNC.time():
+            os.fsync(self._fh.fileno())
+
+    def _flush(self, reason):
+        if not self._buf:
+            return
+        rotated = False
+        rows, self._buf = self._buf, []
+        for row in rows:
+            day = str(row[0])[:10] if _DAY_RE.match(f"{str(row[0])[:10]}.csv") else date.today().isoformat()
+            if day != self._day:
+                if self._fh is not None:
+                    self._sync()        # 换日：旧文件落盘后关闭
+                    self._fh.close()
+                    rotated = True
+                self._open(day)
+            csv.writer(self._fh).writerow(row)
+        if self.fsync == "flush":
+            self._sync()
+        else:
+            self._fh.flush()
+        self._last_flush = time.monotonic()
+        HISTORY_FLUSHES.labels(reason).inc()
+        if rotated:
+            threading.Thread(target=self.compress_old, name="history-compress", daemon=True).start()
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.stop()
+        with self._lock:
+            self._flush("close")
+            if self._fh is not None:
+                if self.fsync != "never":
+                    self._sync()
+                self._fh.close()
+                self._fh = None
+            HISTORY_BUFFERED.set(0)
+
+    # --- 维护 ---
+    def compress_old(self):
+        """压缩早于 compress_after_days 天的 .csv（当天正在写的文件不会被选中）"""
+        if self.compress_after_days < 0:
+            return
+        today = date.today()
+        # 换日后台线程与启动时的压缩可能同时跑：串行，合并进同一个压缩文件时不会互相覆盖
+        with _COMPRESS_LOCK:
+            for day, f in history_files(self.path):
+                if day is None or not f.name.endswith(".csv") or day.isoformat() == self._day:
+                    continue
+                if (today - day).days > self.compress_after_days:
+                    try:
+                        compress_file(f, self.compression, skip_header=True, lock=_FILES_LOCK)
+                    except OSError as e:
+                        print("历史压缩失败:", f, e)
+
+    def migrate_legacy(self):
+        """
+        旧版单文件按天拆分到 day_dir，完成后改名为 *.migrated（保留备份，可手动删除）
+        分两阶段，任何时刻断电重启都能续做而不会重复写入：
+        1. 拆分：每天写 <day>.csv.migrating（读者不看）；全部落盘后旧文件改名为 *.migrating-src（提交点）
+        2. 换入：逐天把 .migrating 与该天已有的新写入合并到 .merged，删掉 .migrating 后改名为 <day>.csv；
+           .migrating 已删而 .merged 还在的天只差最后一步改名
+        """
+        legacy = Path(self.path)
+        src = legacy.with_name(legacy.name + ".migrating-src")
+        t = time.time()
+        n = None
+        if not src.exists():
+            n = self._migrate_split(legacy)
+            if hasattr(os, "sync"):
+                os.sync()              # 拆分结果落盘后再改名旧文件
+            os.replace(legacy, src)
+        days = self._migrate_swap()
+        if hasattr(os, "sync"):
+            os.sync()
+        os.replace(src, legacy.with_name(legacy.name + ".migrated"))
+        what = "上次中断的迁移已续做完成" if n is None else f"{n} 行"
+        print(f"📦 历史迁移：{what} -> {days} 个按天文件（{time.time()-t:.1f}s），原文件已改名为 {legacy.name}.migrated")
+
+    def _migrate_split(self, legacy):
+        for f in self.dir.glob("*.csv.migrating"):
+            f.unlink()                 # 上次拆分中途断电留下的，整份重做
+        seen, n = set(), 0
+        cur_day, fh_out, w = None, None, None
+        try:
+            with open(legacy, "r", encoding="utf-8", newline="") as fh:
+                r = csv.reader(fh)
+                header = next(r, None) or self.header
+                for row in r:
+                    day = row[0][:10] if row else ""
+                    if not _DAY_RE.match(f"{day}.csv"):
+                        continue
+                    if day != cur_day:
+                        # 旧文件按时间顺序，同一时刻只开一个输出文件
+                        if fh_out is not None:
+                            fh_out.close()
+                        fh_out = open(self.dir / f"{day}.csv.migrating", "a" if day in seen else "w",
+                                      newline="", encoding="utf-8")
+                        w = csv.writer(fh_out)
+                        if day not in seen:
+                            seen.add(day)
+                            w.writerow(header)
+                        cur_day = day
+                    w.writerow(row)
+                    n += 1
+        finally:
+            if fh_out is not None:
+                fh_out.close()
+        return n
+
+    def _migrate_swap(self):
+        days = set()
+        for tmp in sorted(self.dir.glob("*.csv.migrating")):
+            day = tmp.name[:10]
+            days.add(day)
+            existing, merged = self.dir / f"{day}.csv", self.dir / f"{day}.csv.merged"
+            if existing.exists():      # 该天已有迁移之后的新写入：旧数据在前，新数据接在后面
+                with open(merged, "w", newline="", encoding="utf-8") as out:
+                    with open(tmp, "r", encoding="utf-8", newline="") as fh:
+                        shutil.copyfileobj(fh, out)
+                    with open(existing, "r", encoding="utf-8", newline="") as ex:
+                        ex.readline()
+                        shutil.copyfileobj(ex, out)
+                    out.flush()
+                    os.fsync(out.fileno())
+                tmp.unlink()
+            else:
+                os.replace(tmp, existing)
+        for merged in sorted(self.dir.glob("*.csv.merged")):
+            days.add(merged.name[:10])
+            os.replace(merged, self.dir / f"{merged.name[:10]}.csv")
+        return len(days)
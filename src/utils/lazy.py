@@ -0,0 +1,123 @@
+# src/utils/lazy.py
+# -*- coding: utf-8 -*-
+"""
+子系统后台初始化 + 重模块导入计时
+- 每个子系统在独立线程中构造，互不阻塞；Web 服务无需等待即可响应 /ping
+- 状态: pending -> starting -> ready / failed
+- PLANTAI_PROFILE_IMPORTS=1 时打印每个延迟导入的耗时
+"""
+import importlib, os, sys, threading, time
+
+_T0 = time.monotonic()
+IMPORT_TIMES = {}     # 模块名 -> 首次导入耗时（秒）
+_PROFILE = os.environ.get("PLANTAI_PROFILE_IMPORTS", "0") not in ("", "0")
+
+
+def uptime():
+    """自本模块加载（≈进程启动）以来的秒数"""
+    return time.monotonic() - _T0
+
+
+def timed_import(name):
+    """importlib.import_module，并记录首次导入耗时"""
+    mod = sys.modules.get(name)
+    if mod is not None:
+        return mod
+    t = time.perf_counter()
+    mod = importlib.import_module(name)
+    dt = time.perf_counter() - t
+    IMPORT_TIMES[name] = round(dt, 4)
+    if _PROFILE:
+        print(f"[import] {name:<28} {dt*1000:8.1f} ms")
+    return mod
+
+
+class Subsystem:
+    def __init__(self, name, factory, requires=(), stop=None):
+        self.name = name
+        self.factory = factory
+        self.requires = tuple(requires)
+        self.stop_fn = stop
+        self.state = "pending"
+        self.instance = None
+        self.error = None
+        self.elapsed_s = None
+        self.ready_at_s = None
+        self.done = threading.Event()
+
+    def info(self):
+        return {"state": self.state, "elapsed_s": self.elapsed_s,
+                "ready_at_s": self.ready_at_s, "error": self.error}
+
+
+class SubsystemRegistry:
+    """按名称登记子系统工厂；start() 后在后台线程中逐个构造"""
+    def __init__(self):
+        self._subs = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory, requires=(), stop=None):
+        """factory() -> 实例；stop(实例) 在 stop_all 时调用"""
+        with self._lock:
+            self._subs[name] = Subsystem(name, factory, requires, stop)
+
+    def start(self, *names):
+        """后台启动（默认全部）；已启动的忽略"""
+        for name in names or list(self._subs):
+            sub = self._subs[name]
+            with self._lock:
+                if sub.state != "pending":
+                    continue
+                sub.state = "starting"
+            threading.Thread(target=self._run, args=(sub,), name=f"init-{name}", daemon=True).start()
+
+    def _run(self, sub):
+        for dep in sub.requires:
+            d = self._subs.get(dep)
+            if d is None:
+                sub.state, sub.error = "failed", f"依赖 {dep} 未登记"
+                print(f"⚠️ 子系统 {sub.name} 初始化失败:", sub.error)
+                sub.done.set()
+                return
+            self.start(dep)          # 只启动了部分子系统时，依赖随之启动
+            d.done.wait()
+            if d.state != "ready":
+                sub.state, sub.error = "failed", f"依赖 {dep} 未就绪"
+                sub.done.set()
+                return
+        t = time.perf_counter()
+        try:
+            sub.instance = sub.factory()
+            sub.state = "ready"
+            print(f"✅ 子系统 {sub.name} 就绪 ({(time.perf_counter()-t)*1000:.0f} ms)")
+        except Exception as e:
+            sub.state, sub.error = "failed", f"{type(e).__name__}: {e}"
+            print(f"⚠️ 子系统 {sub.name} 初始化失败:", sub.error)
+        sub.elapsed_s = round(time.perf_counter() - t, 3)
+        sub.ready_at_s = round(uptime(), 3)
+        sub.done.set()
+
+    def get(self, name, timeout=0.0):
+        """返回就绪的实例；未就绪时最多等待 timeout 秒，仍未就绪返回 None"""
+        sub = self._subs.get(name)
+        if sub is None:
+            return None
+        if timeout and not sub.done.is_set():
+            sub.done.wait(timeout)
+        return sub.instance if sub.state == "ready" else None
+
+    def ready(self, name):
+        sub = self._subs.get(name)
+        return sub is not None and sub.state == "ready"
+
+    def status(self):
+        return {name: sub.info() for name, sub in self._subs.items()}
+
+    def all_done(self):
+        return all(s.done.is_set() for s in self._subs.values())
+
+    def stop_all(self):
+        for sub in reversed(list(self._subs.values())):
+            if sub.state == "ready" and sub.stop_fn:
+                try: sub.stop_fn(sub.instance)
+                except Exception as e: print(f"子系统 {sub.name} 停止出错:", e)
@@ -0,0 +1,311 @@
+# src/utils/metrics.py
+# -*- coding: utf-8 -*-
+"""
+轻量指标注册表（Prometheus 文本格式，无第三方依赖）
+- counter / gauge / histogram，支持标签；同名重复注册返回同一个对象
+- 每次记录只有一次加锁 + 二分查找，树莓派上可常开
+- render() 输出 /metrics 文本；进程 RSS/CPU 在抓取时从 /proc 读取
+"""
+import bisect, os, threading, time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_num(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = "untyped"
+    suffix = ""
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self._default = self._new_child()
+            self._children[()] = self._default
+
+    def labels(self, *values, **kw):
+        key = tuple(str(kw[n]) for n in self.label_names) if kw else tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """[(后缀, 标签值, 额外标签, 值)]"""
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1.0):
+        with self._lock:
+            self.value += n
+
+
+class Counter(_Metric):
+    kind = "counter"
+    suffix = "_total"       # 0.0.4 文本格式里 HELP / TYPE 用带后缀的样本名
+    def _new_child(self): return _CounterChild()
+    def inc(self, n=1.0): self._default.inc(n)
+
+    def set(self, v):
+        """采集器写入外部已累计的值（如 /proc 里的 CPU 时间），只应单调增加"""
+        self._default.value = v
+
+    def samples(self):
+        return [("_total", k, None, c.value) for k, c in list(self._children.items())]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "fn", "_lock")
+    def __init__(self):
+        self.value = 0.0
+        self.fn = None
+        self._lock = threading.Lock()
+
+    def set(self, v): self.value = v
+    def set_function(self, fn): self.fn = fn
+
+    def inc(self, n=1.0):
+        with self._lock:
+            self.value += n
+
+    def dec(self, n=1.0):
+        with self._lock:
+            self.value -= n
+
+    def get(self):
+        if self.fn is not None:
+            try: return self.fn()
+            except Exception: return float("nan")
+        return self.value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+    def _new_child(self): return _GaugeChild()
+    def set(self, v): self._default.set(v)
+    def inc(self, n=1.0): self._default.inc(n)
+    def dec(self, n=1.0): self._default.dec(n)
+    def set_function(self, fn): self._default.set_function(fn)
+    def get(self): return self._default.get()
+
+    @contextmanager
+    def track(self):
+        """进入 +1，退出 -1（在途数/连接数）"""
+        self.inc()
+        try: yield
+        finally: self.dec()
+
+    def samples(self):
+        return [("", k, None, c.get()) for k, c in list(self._children.items())]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, v):
+        i = bisect.bisect_left(self.buckets, v)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += v
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        t = time.perf_counter()
+        try: yield
+        finally: self.observe(time.perf_counter() - t)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.bucket_bounds = tuple(sorted(buckets))
+        super().__init__(name, help_text, labels)
+
+    def _new_child(self): return _HistogramChild(self.bucket_bounds)
+    def observe(self, v): self._default.observe(v)
+    def time(self): return self._default.time()
+
+    def samples(self):
+        out = []
+        for k, c in list(self._children.items()):
+            with c._lock:
+                counts, s, n = list(c.counts), c.sum, c.count
+            acc = 0
+            for le, cnt in zip(self.bucket_bounds + (float("inf"),), counts):
+                acc += cnt
+                out.append(("_bucket", k, ("le", _fmt_num(float(le))), acc))
+            out.append(("_sum", k, None, s))
+            out.append(("_count", k, None, n))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._collectors = []
+
+    def _get(self, cls, name, help_text, labels, **kw):
+        m = self._metrics.get(name)
+        if m is None:
+            with self._lock:
+                m = self._metrics.get(name)
+                if m is None:
+                    m = self._metrics[name] = cls(name, help_text, labels, **kw)
+        if not isinstance(m, cls):
+            raise ValueError(f"指标 {name} 已注册为 {m.kind}")
+        return m
+
+    def counter(self, name, help_text="", labels=()):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text="", labels=()):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text="", labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def add_collector(self, fn):
+        """fn() 在每次 render 前调用（用于刷新需要采集的值）"""
+        self._collectors.append(fn)
+
+    def render(self):
+        for fn in list(self._collectors):
+            try: fn()
+            except Exception as e: print("指标采集出错:", e)
+        lines = []
+        for name, m in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name}{m.suffix} {m.help}")
+            lines.append(f"# TYPE {name}{m.suffix} {m.kind}")
+            for suffix, key, extra, v in m.samples():
+                lines.append(f"{name}{suffix}{_fmt_labels(m.label_names, key, extra)} {_fmt_num(v)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+# ==============================
+# 进程指标（Linux /proc）
+# ==============================
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_START = time.time()
+
+_rss = gauge("process_resident_memory_bytes", "常驻内存")
+_cpu = counter("process_cpu_seconds", "进程累计 CPU 时间（用户+内核）")
+_threads = gauge("process_threads", "线程数")
+_uptime = gauge("process_uptime_seconds", "进程运行时间")
+
+
+def _collect_process():
+    _uptime.set(round(time.time() - _START, 3))
+    try:
+        with open("/proc/self/statm") as f:
+            _rss.set(int(f.read().split()[1]) * _PAGE)
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        _cpu.set((int(fields[11]) + int(fields[12])) / _CLK_TCK)
+        _threads.set(int(fields[17]))
+    except OSError:
+        t = os.times()
+        _cpu.set(t.user + t.system)
+        _threads.set(threading.active_count())
+
+REGISTRY.add_collector(_collect_process)
+
+
+# ==============================
+# Flask：按路由的延迟直方图 + 在途请求数
+# ==============================
+
+def install_flask_metrics(app):
+    from flask import g, request
+    req_latency = histogram("plantai_http_request_seconds", "请求处理耗时（不含流式响应体）", ("route", "method", "status"))
+    in_flight = gauge("plantai_http_in_flight", "在途请求数", ("route",))
+
+    def _route():
+        rule = request.url_rule
+        return rule.rule if rule is not None else "<unmatched>"
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_t0 = time.perf_counter()
+        g._metrics_route = _route()
+        in_flight.labels(g._metrics_route).inc()
+
+    @app.teardown_request
+    def _metrics_end(exc=None):
+        t0 = g.pop("_metrics_t0", None)
+        if t0 is None:
+            return
+        route = g.pop("_metrics_route")
+        in_flight.labels(route).dec()
+        status = getattr(g, "_metrics_status", 500 if exc else 200)
+        req_latency.labels(route, request.method, status).observe(time.perf_counter() - t0)
+
+    @app.after_request
+    def _metrics_status(resp):
+        g._metrics_status = resp.status_code
+        return resp
+
+
+def track_rate(gauge_child, counter_child):
+    """gauge = 两次抓取之间 counter 的增量 / 时间（每秒），计数路径零额外开销"""
+    state = {"n": counter_child.value, "t": time.monotonic()}
+    def _collect():
+        now, n = time.monotonic(), counter_child.value
+        dt = now - state["t"]
+        if dt > 0:
+            gauge_child.set(round((n - state["n"]) / dt, 3))
+        state["n"], state["t"] = n, now
+    REGISTRY.add_collector(_collect)
+
+
+# ==============================
+# 摄像头（多个摄像头实现共用）
+# ==============================
+CAMERA_FRAMES = counter("plantai_camera_frames", "摄像头帧数", ("stage",))        # stage: capture / encode
+CAMERA_ENCODE = histogram("plantai_camera_encode_seconds", "JPEG 编码耗时")
+CAMERA_VIEWERS = gauge("plantai_camera_viewers", "当前 MJPEG 观看者数")
+_camera_fps = gauge("plantai_camera_fps", "摄像头帧率（两次抓取间平均）", ("stage",))
+for _stage in ("capture", "encode"):
+    track_rate(_camera_fps.labels(_stage), CAMERA_FRAMES.labels(_stage))
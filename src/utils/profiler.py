@@ -0,0 +1,211 @@
+# src/utils/profiler.py
+# -*- coding: utf-8 -*-
+"""
+按需采样剖析器：以固定频率对所有 Python 线程的调用栈采样（sys._current_frames），
+输出火焰图用的 collapsed 栈（flamegraph.pl / speedscope 可直接读取）与按线程的 CPU 汇总
+
+- 同一时刻只允许一个剖析任务；频率 ≤ MAX_HZ，时长 ≤ MAX_SECONDS，栈深 ≤ MAX_DEPTH
+- 线程 CPU 取自 /proc/self/task/<tid>/stat，包括 C 扩展（cv2/onnxruntime）内的耗时
+- 线程按名称/栈归类到子系统：sampler / recorder / camera / inference / report ...
+
+命令行（对运行中的实例）：
+  python -m src.utils.profiler --url http://127.0.0.1:5000 --user admin --password admin123 --seconds 10 -o pi.folded
+"""
+import os, sys, threading, time
+from collections import Counter
+
+MAX_HZ = 250
+MAX_SECONDS = 60
+MAX_DEPTH = 64
+
+# 线程名前缀 -> 子系统
+THREAD_SUBSYSTEMS = (
+    ("sampler", "sampler"),
+    ("recorder", "recorder"),
+    ("auto-control", "auto-control"),
+    ("camera", "camera"),
+    ("ws-render", "ws2812"),
+    ("init-", "startup"),
+    ("hwd-conn", "hwd-rpc"),
+    ("MainThread", "main"),
+)
+# 栈中出现这些函数时归入对应子系统（请求线程内的重活）
+STACK_MARKERS = (
+    ("predict_pil", "inference"),
+    ("generate_pdf_report", "report"),
+    ("_gen_mjpeg", "stream"),
+    ("_history_items", "history"),
+)
+# 叶子帧为这些函数时视为空闲等待
+IDLE_LEAVES = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+               ("selectors.py", "select"), ("socket.py", "accept"), ("socketserver.py", "serve_forever"),
+               ("queue.py", "get")}
+
+_busy = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _thread_cpu(native_id):
+    """线程累计 CPU 秒（用户+内核），不可读时返回 None"""
+    try:
+        with open(f"/proc/self/task/{native_id}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _subsystem(thread_name, funcs):
+    for marker, sub in STACK_MARKERS:
+        if marker in funcs:
+            return sub
+    for prefix, sub in THREAD_SUBSYSTEMS:
+        if thread_name.startswith(prefix):
+            return sub
+    if "process_request_thread" in thread_name:
+        return "http"
+    return "other"
+
+
+def _walk(frame):
+    """叶子 -> 根 的 (文件名, 函数名, 首行号)"""
+    out = []
+    while frame is not None and len(out) < MAX_DEPTH:
+        code = frame.f_code
+        out.append((os.path.basename(code.co_filename), code.co_name, code.co_firstlineno))
+        frame = frame.f_back
+    return out
+
+
+def sample_stacks(seconds=10.0, hz=100, idle=False):
+    """
+    阻塞 seconds 秒进行采样，返回 dict:
+      collapsed: "线程;子系统;根帧;...;叶帧 次数" 多行文本
+      threads:   [{thread, subsystem, samples, busy_samples, cpu_s, cpu_pct}]
+      subsystems:{子系统: 非空闲样本数}
+      overhead:  采样线程自身 CPU
+    idle=False 时丢弃叶子帧为等待/阻塞的样本（线程 CPU 汇总不受影响）
+    """
+    seconds = max(0.1, min(MAX_SECONDS, float(seconds)))
+    hz = max(1, min(MAX_HZ, int(hz)))
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("已有剖析任务在运行")
+    try:
+        me = threading.get_ident()
+        threads0 = {t.ident: t for t in threading.enumerate()}
+        cpu0 = {ident: _thread_cpu(t.native_id) for ident, t in threads0.items() if t.native_id}
+        stacks = Counter()
+        per_thread = Counter()
+        per_thread_busy = Counter()
+        thread_sub = {}
+        names = {ident: t.name for ident, t in threads0.items()}
+        period = 1.0 / hz
+        self_cpu0 = time.thread_time()
+        t_start = time.monotonic()
+        deadline = t_start + seconds
+        nxt = t_start
+        n_ticks = 0
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            n_ticks += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                name = names.get(ident)
+                if name is None:
+                    t = threading._active.get(ident)
+                    name = names[ident] = t.name if t else f"thread-{ident}"
+                frames = _walk(frame)
+                per_thread[ident] += 1
+                if not idle and frames and (frames[0][0], frames[0][1]) in IDLE_LEAVES:
+                    continue
+                funcs = {f[1] for f in frames}
+                sub = _subsystem(name, funcs)
+                thread_sub.setdefault(ident, Counter())[sub] += 1
+                per_thread_busy[ident] += 1
+                path = ";".join(f"{fn} ({fl}:{ln})" for fl, fn, ln in reversed(frames))
+                stacks[f"{name};{sub};{path}"] += 1
+            nxt += period
+            delay = nxt - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                nxt = time.monotonic()     # 跟不上时不追帧
+        wall = time.monotonic() - t_start
+        overhead = time.thread_time() - self_cpu0
+
+        threads = []
+        for t in threading.enumerate():
+            if t.ident == me or t.ident not in per_thread:
+                continue
+            c1 = _thread_cpu(t.native_id) if t.native_id else None
+            c0 = cpu0.get(t.ident)
+            cpu = round(c1 - c0, 3) if (c1 is not None and c0 is not None) else None
+            subs = thread_sub.get(t.ident)
+            threads.append({
+                "thread": t.name,
+                "subsystem": subs.most_common(1)[0][0] if subs else _subsystem(t.name, ()),
+                "samples": per_thread[t.ident],
+                "busy_samples": per_thread_busy[t.ident],
+                "cpu_s": cpu,
+                "cpu_pct": round(100.0 * cpu / wall, 1) if cpu is not None and wall else None,
+            })
+        threads.sort(key=lambda r: (r["cpu_s"] or 0, r["busy_samples"]), reverse=True)
+        subsystems = Counter()
+        for c in thread_sub.values():
+            subsystems.update(c)
+        return {
+            "seconds": round(wall, 3), "hz": hz, "ticks": n_ticks,
+            "collapsed": "\n".join(f"{k} {v}" for k, v in stacks.most_common()),
+            "threads": threads,
+            "subsystems": dict(subsystems.most_common()),
+            "overhead": {"cpu_s": round(overhead, 3), "cpu_pct": round(100.0 * overhead / wall, 2) if wall else None},
+        }
+    finally:
+        _busy.release()
+
+
+def print_summary(res, out=sys.stdout):
+    print(f"采样 {res['seconds']}s @ {res['hz']}Hz，{res['ticks']} 次；采样器开销 {res['overhead']['cpu_pct']}% CPU", file=out)
+    print(f"\n{'线程':<36}{'子系统':<14}{'CPU%':>7}{'CPU s':>8}{'忙样本':>8}", file=out)
+    for r in res["threads"]:
+        print(f"{r['thread'][:35]:<36}{r['subsystem']:<14}{r['cpu_pct'] if r['cpu_pct'] is not None else '-':>7}"
+              f"{r['cpu_s'] if r['cpu_s'] is not None else '-':>8}{r['busy_samples']:>8}", file=out)
+
+
+def main():
+    import argparse, requests
+    ap = argparse.ArgumentParser(description="对运行中的 PlantAI 实例采样剖析")
+    ap.add_argument("--url", default="http://127.0.0.1:5000")
+    ap.add_argument("--user", default="admin")
+    ap.add_argument("--password", default="admin123")
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--hz", type=int, default=100)
+    ap.add_argument("--idle", action="store_true", help="保留等待中的样本")
+    ap.add_argument("-o", "--output", help="collapsed 栈输出文件（默认 profile_<时间>.folded）")
+    args = ap.parse_args()
+
+    base = args.url.rstrip("/")
+    s = requests.Session()
+    r = s.post(f"{base}/login", data={"username": args.user, "password": args.password}, allow_redirects=False, timeout=15)
+    if r.status_code not in (302, 303):
+        raise SystemExit(f"登录失败: HTTP {r.status_code}")
+    r = s.get(f"{base}/api/admin/profile", params={"seconds": args.seconds, "hz": args.hz, "idle": int(args.idle)},
+              timeout=args.seconds + 30)
+    if r.status_code != 200:
+        raise SystemExit(f"剖析失败: HTTP {r.status_code} {r.text[:200]}")
+    res = r.json()
+    out = args.output or time.strftime("profile_%Y%m%d_%H%M%S.folded")
+    with open(out, "w", encoding="utf-8") as f:
+        f.write(res["collapsed"] + "\n")
+    print_summary(res)
+    print(f"\ncollapsed 栈已写入 {out}（flamegraph.pl {out} > flame.svg，或拖入 speedscope.app）")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,65 @@
-import threading, time
+import os, threading, time
 from typing import Callable
+from src.utils.metrics import histogram, counter
+
+JOB_LAG = histogram("plantai_scheduler_lag_seconds", "定时任务实际开始时间相对计划的延迟", ("job",))
+JOB_DURATION = histogram("plantai_scheduler_job_seconds", "定时任务执行耗时", ("job",))
+JOB_ERRORS = counter("plantai_scheduler_errors", "定时任务异常次数", ("job",))
+
+def lower_thread_priority(nice):
+    """调低当前线程的调度优先级（Linux 上 setpriority 对单个线程生效；其他平台忽略）"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), int(nice))
+    except (AttributeError, OSError):
+        pass
 
 class RepeatedTimer:
     """每 interval 秒执行一次 fn（守护线程）"""
-    def __init__(self, interval_sec: int, fn: Callable):
+    def __init__(self, interval_sec: int, fn: Callable, name: str = None):
         self._interval = interval_sec
         self._fn = fn
+        self._job = name or getattr(fn, "__name__", "job")
+        self._run_now = False
         self._stop = threading.Event()
-        self._thr = threading.Thread(target=self._loop, daemon=True)
+        self._wake = threading.Event()     # set_interval 改周期时打断当前等待
+        self._thr = threading.Thread(target=self._loop, name=name, daemon=True)
         self._thr.start()
 
     def _loop(self):
+        lag, duration, errors = JOB_LAG.labels(self._job), JOB_DURATION.labels(self._job), JOB_ERRORS.labels(self._job)
+        planned = time.monotonic()
         while not self._stop.is_set():
-            t0 = time.time()
+            t0 = time.monotonic()
+            lag.observe(max(0.0, t0 - planned))
             try:
                 self._fn()
             except Exception as e:
+                errors.inc()
                 print("RepeatedTimer error:", e)
-            # sleep 剩余时间
-            dt = time.time() - t0
-            to_sleep = max(0.0, self._interval - dt)
-            self._stop.wait(to_sleep)
+            duration.observe(time.monotonic() - t0)
+            # sleep 剩余时间；期间改了周期则按新周期（从本次开始时间算起）重新计算
+            while not self._stop.is_set():
+                self._wake.clear()
+                if self._run_now:
+                    self._run_now = False
+                    planned = time.monotonic()
+                    break
+                planned = t0 + self._interval
+                to_sleep = planned - time.monotonic()
+                if to_sleep <= 0 or not self._wake.wait(to_sleep):
+                    break
+
+    def set_interval(self, interval_sec, run_now=False):
+        """修改周期（下一次按新周期从上次开始时间算起）；run_now 立即执行一次"""
+        self._interval = interval_sec
+        self._run_now = bool(run_now)
+        self._wake.set()
+
+    @property
+    def interval(self):
+        return self._interval
 
     def stop(self):
         self._stop.set()
+        self._wake.set()
 
@@ -28,16 +28,7 @@ def append_csv(path: str, header: list, row: list):
         w.writerow(row)
 
 def tail_csv_as_dicts(path: str, n: int = 50):
-    p = Path(path)
-    if not p.exists(): return []
-    lines = p.read_text(encoding="utf-8").splitlines()
-    if not lines: return []
-    header = lines[0].split(",")
-    out = []
-    for line in lines[-min(len(lines)-1, n):]:
-        if line == lines[0]:  # skip header
-            continue
-        vals = line.split(",")
-        out.append(dict(zip(header, vals)))
-    return out
+    """末尾 n 行；history_csv 已按天切分 / 压缩时跨文件读取（见 src/utils/history.py）"""
+    from src.utils.history import tail_rows
+    return tail_rows(path, n)
 
@@ -0,0 +1,312 @@
+# src/utils/streamstats.py
+# -*- coding: utf-8 -*-
+"""
+流式统计：每次采样增量更新，摘要接口直接读内存，不再扫描历史 CSV
+
+每个通道：
+- 全程 Welford 均值 / 方差（启动以来）与“今天”（本地日期，零点重置）的均值 / 方差 / 最值
+- 时间感知 EWMA：快（默认 5 分钟）/ 慢（默认 1 小时）两条，差值即短期趋势
+- 滑动窗口（默认 1h / 24h / 7d）：按桶聚合，窗口 = 已封桶的 Welford 合并 + 当前桶；
+  整桶淘汰时反向合并扣除，最值用桶级单调队列，变化率 = 窗口首尾桶均值之差 / 时间差（每小时）；更新均摊 O(1)，
+  内存只与桶数有关（7 天 5 秒一采也只有几百个桶）
+- 异常：相对慢 EWMA 的 z 分数过大，或短时间内骤降 / 骤升（原始样本单调队列求区间最值）
+
+重启后窗口从空开始累积
+"""
+import math, threading, time
+from collections import deque
+from datetime import date
+
+from src.utils.metrics import counter, histogram
+
+ANOMALIES = counter("plantai_anomalies", "检测到的传感器异常数", ("channel", "kind"))
+STATS_UPDATE = histogram("plantai_stats_update_seconds", "一次采样的流式统计更新耗时")
+
+CHANNELS = ["temperature_c", "humidity_pct", "light_lux", "eCO2_ppm", "TVOC_ppb", "soil_moisture_pct"]
+DEFAULT_WINDOWS = {"1h": 3600, "24h": 86400, "7d": 7 * 86400}
+# z 分数的标准差下限：读数很平稳时不至于一点抖动就报警（光照昼夜开关灯变化大，下限放宽）
+DEFAULT_MIN_STD = {"temperature_c": 0.3, "humidity_pct": 1.5, "light_lux": 300, "eCO2_ppm": 30,
+                   "TVOC_ppb": 20, "soil_moisture_pct": 1.0}
+# 骤变规则：within_s 秒内下降 drop / 上升 rise（单位同读数）
+DEFAULT_RULES = {"soil_moisture_pct": {"drop": 10, "within_s": 600},
+                 "eCO2_ppm": {"rise": 500, "within_s": 300},
+                 "temperature_c": {"rise": 6, "drop": 6, "within_s": 600}}
+
+
+class Welford:
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    def add(self, x):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+
+    def merge(self, o):
+        """并入另一组（Chan 合并公式）"""
+        if o.n == 0:
+            return
+        n = self.n + o.n
+        d = o.mean - self.mean
+        self.mean += d * o.n / n
+        self.m2 += o.m2 + d * d * self.n * o.n / n
+        self.n = n
+
+    def remove(self, o):
+        """扣除先前并入的一组（合并公式反解）"""
+        n = self.n - o.n
+        if n <= 0:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        mean = (self.n * self.mean - o.n * o.mean) / n
+        d = o.mean - mean
+        self.m2 = max(0.0, self.m2 - o.m2 - d * d * n * o.n / self.n)
+        self.mean, self.n = mean, n
+
+    def copy(self):
+        return Welford(self.n, self.mean, self.m2)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+class Ewma:
+    """
+    时间感知 EWMA：alpha = 1 - exp(-dt / tau)，采样间隔不均匀也成立；同时跟踪指数加权方差
+    方差从 0 起累积，刚启动时（远不到 tau）偏小：std 按已累积的权重 1 - ∏(1 - alpha) 做偏差校正
+    """
+    __slots__ = ("tau", "mean", "var", "t", "decay")
+
+    def __init__(self, tau_s):
+        self.tau = float(tau_s)
+        self.mean = self.t = None
+        self.var = 0.0
+        self.decay = 1.0
+
+    def add(self, t, x):
+        if self.mean is None:
+            self.mean, self.t = x, t
+            return
+        a = 1.0 - math.exp(-max(t - self.t, 0.0) / self.tau)
+        d = x - self.mean
+        self.mean += a * d
+        self.var = (1.0 - a) * (self.var + a * d * d)
+        self.decay *= 1.0 - a
+        self.t = t
+
+    @property
+    def std(self):
+        w = 1.0 - self.decay
+        return math.sqrt(self.var / w) if w > 0 else 0.0
+
+
+class _Bucket:
+    __slots__ = ("start", "w", "lo", "hi", "t_mean")
+
+    def __init__(self, start):
+        self.start, self.w = start, Welford()
+        self.lo, self.hi, self.t_mean = math.inf, -math.inf, 0.0
+
+    def add(self, t, x):
+        self.w.add(x)
+        self.lo, self.hi = min(self.lo, x), max(self.hi, x)
+        self.t_mean += (t - self.t_mean) / self.w.n
+
+
+class Window:
+    """滑动窗口统计（span_s 秒，按 bucket_s 分桶）"""
+
+    def __init__(self, span_s, bucket_s):
+        self.span, self.bucket_s = float(span_s), float(bucket_s)
+        self.buckets = deque()      # 已封桶
+        self.agg = Welford()        # 已封桶合并
+        self.lo_q, self.hi_q = deque(), deque()     # 单调队列：(桶起点, 桶最小 / 最大值)
+        self.cur = None
+        self._evicted = 0
+
+    def add(self, t, x):
+        start = t - t % self.bucket_s
+        if self.cur is not None and start != self.cur.start:
+            self._close(self.cur)
+            self.cur = None
+        if self.cur is None:
+            self.cur = _Bucket(start)
+        self.cur.add(t, x)
+        self._evict(t)
+
+    def _close(self, b):
+        self.buckets.append(b)
+        self.agg.merge(b.w)
+        while self.lo_q and self.lo_q[-1][1] >= b.lo:
+            self.lo_q.pop()
+        self.lo_q.append((b.start, b.lo))
+        while self.hi_q and self.hi_q[-1][1] <= b.hi:
+            self.hi_q.pop()
+        self.hi_q.append((b.start, b.hi))
+
+    def _evict(self, t):
+        while self.buckets and self.buckets[0].start + self.bucket_s <= t - self.span:
+            b = self.buckets.popleft()
+            self.agg.remove(b.w)
+            if self.lo_q and self.lo_q[0][0] == b.start:
+                self.lo_q.popleft()
+            if self.hi_q and self.hi_q[0][0] == b.start:
+                self.hi_q.popleft()
+            self._evicted += 1
+        if self._evicted > len(self.buckets):
+            # 反复反向合并有舍入累积，每淘汰一轮整窗重算一次（均摊 O(1)）
+            self._evicted = 0
+            self.agg = Welford()
+            for b in self.buckets:
+                self.agg.merge(b.w)
+
+    def summary(self):
+        w = self.agg.copy()
+        lo = self.lo_q[0][1] if self.lo_q else math.inf
+        hi = self.hi_q[0][1] if self.hi_q else -math.inf
+        last = self.cur or (self.buckets[-1] if self.buckets else None)
+        if self.cur is not None:
+            w.merge(self.cur.w)
+            lo, hi = min(lo, self.cur.lo), max(hi, self.cur.hi)
+        if w.n == 0:
+            return {"n": 0}
+        first = self.buckets[0] if self.buckets else self.cur
+        dt = last.t_mean - first.t_mean
+        # 覆盖不到窗口 1/10 时首尾桶太近，外推出的变化率只是噪声
+        rate = (last.w.mean - first.w.mean) / dt * 3600 if dt >= self.span * 0.1 else None
+        return {"n": w.n, "mean": _r(w.mean), "std": _r(w.std), "min": _r(lo), "max": _r(hi),
+                "rate_per_h": _r(rate)}
+
+
+def _r(v, nd=3):
+    return None if v is None or not math.isfinite(v) else round(v, nd)
+
+
+class _Channel:
+    def __init__(self, windows, buckets, fast_s, slow_s, rule):
+        self.total = Welford()
+        self.day, self.today = None, Welford()
+        self.day_lo, self.day_hi = math.inf, -math.inf
+        self.fast, self.slow = Ewma(fast_s), Ewma(slow_s)
+        self.windows = {k: Window(s, max(1.0, s / buckets)) for k, s in windows.items()}
+        self.rule = rule or {}
+        self.recent_lo, self.recent_hi = deque(), deque()   # 骤变规则用：within_s 内原始样本的单调队列
+        self.last = self.last_t = None
+
+
+class StreamStats:
+    def __init__(self, channels=None, windows=None, buckets=240, fast_s=300, slow_s=3600, z=5.0,
+                 warmup=30, min_std=None, rules=None, cooldown_s=600, keep=200, on_anomaly=None):
+        self.channels = list(channels or CHANNELS)
+        windows = windows or DEFAULT_WINDOWS
+        min_std = {**DEFAULT_MIN_STD, **(min_std or {})}
+        rules = DEFAULT_RULES if rules is None else rules
+        self.z, self.warmup = float(z), int(warmup)
+        self.min_std = {ch: float(min_std.get(ch, 0) or 0) for ch in self.channels}
+        self.cooldown_s = float(cooldown_s)
+        self.on_anomaly = on_anomaly
+        self._ch = {ch: _Channel(windows, int(buckets), fast_s, slow_s, rules.get(ch)) for ch in self.channels}
+        self._anomalies = deque(maxlen=int(keep))
+        self._flagged = {}          # (通道, 类型) -> 上次报警时间
+        self._lock = threading.Lock()
+        self.updated = None
+
+    # --- 采样线程回调 ---
+    def add(self, d):
+        t = float(d.get("timestamp") or time.time())
+        found = []
+        with STATS_UPDATE.time(), self._lock:
+            today = date.fromtimestamp(t)
+            for name, ch in self._ch.items():
+                x = d.get(name)
+                try:
+                    x = float(x)
+                except (TypeError, ValueError):
+                    continue
+                if not math.isfinite(x):
+                    continue
+                found.extend(self._check(name, ch, t, x))
+                ch.total.add(x)
+                if ch.day != today:
+                    ch.day, ch.today, ch.day_lo, ch.day_hi = today, Welford(), math.inf, -math.inf
+                ch.today.add(x)
+                ch.day_lo, ch.day_hi = min(ch.day_lo, x), max(ch.day_hi, x)
+                ch.fast.add(t, x)
+                ch.slow.add(t, x)
+                for w in ch.windows.values():
+                    w.add(t, x)
+                ch.last, ch.last_t = x, t
+            self.updated = t
+            self._anomalies.extend(found)
+        for a in found:
+            ANOMALIES.labels(a["channel"], a["kind"]).inc()
+            if self.on_anomaly is not None:
+                try:
+                    self.on_anomaly(a)
+                except Exception as e:
+                    print("异常回调出错:", e)
+
+    def _check(self, name, ch, t, x):
+        """用更新前的基线判断本次读数是否异常"""
+        out = []
+        if ch.total.n >= self.warmup and ch.slow.mean is not None:
+            std = max(ch.slow.std, self.min_std[name])
+            z = (x - ch.slow.mean) / std if std > 0 else 0.0
+            if abs(z) >= self.z:
+                out.append(self._flag(name, "zscore", t, x, baseline=_r(ch.slow.mean), z=_r(z, 1)))
+        within = ch.rule.get("within_s")
+        if within:
+            lo, hi = ch.recent_lo, ch.recent_hi
+            while lo and lo[0][0] < t - within:
+                lo.popleft()
+            while hi and hi[0][0] < t - within:
+                hi.popleft()
+            if "drop" in ch.rule and hi and hi[0][1] - x >= ch.rule["drop"]:
+                out.append(self._flag(name, "drop", t, x, baseline=_r(hi[0][1]), delta=_r(x - hi[0][1]),
+                                      within_s=within))
+            if "rise" in ch.rule and lo and x - lo[0][1] >= ch.rule["rise"]:
+                out.append(self._flag(name, "spike", t, x, baseline=_r(lo[0][1]), delta=_r(x - lo[0][1]),
+                                      within_s=within))
+            while lo and lo[-1][1] >= x:
+                lo.pop()
+            lo.append((t, x))
+            while hi and hi[-1][1] <= x:
+                hi.pop()
+            hi.append((t, x))
+        return [a for a in out if a is not None]
+
+    def _flag(self, name, kind, t, x, **detail):
+        key = (name, kind)
+        if t - self._flagged.get(key, -math.inf) < self.cooldown_s:
+            return None
+        self._flagged[key] = t
+        return dict(time=t, channel=name, kind=kind, value=_r(x), **detail)
+
+    # --- 查询（与样本数无关的常数时间）---
+    def summary(self, channel=None):
+        with self._lock:
+            names = [channel] if channel else self.channels
+            out = {}
+            for name in names:
+                ch = self._ch.get(name)
+                if ch is None:
+                    continue
+                trend = ch.fast.mean - ch.slow.mean if ch.fast.mean is not None else None
+                out[name] = {
+                    "last": _r(ch.last), "last_time": ch.last_t,
+                    "ewma": {"fast": _r(ch.fast.mean), "slow": _r(ch.slow.mean), "trend": _r(trend)},
+                    "today": {"date": str(ch.day) if ch.day else None, "n": ch.today.n, "mean": _r(ch.today.mean),
+                              "std": _r(ch.today.std), "min": _r(ch.day_lo), "max": _r(ch.day_hi)},
+                    "windows": {k: w.summary() for k, w in ch.windows.items()},
+                    "total": {"n": ch.total.n, "mean": _r(ch.total.mean), "std": _r(ch.total.std)},
+                }
+            return {"updated": self.updated, "channels": out}
+
+    def anomalies(self, limit=50, since=None):
+        with self._lock:
+            items = [a for a in self._anomalies if since is None or a["time"] > since]
+        return items[-int(limit):] if limit else items
@@ -23,6 +23,7 @@ window.addEventListener("DOMContentLoaded", async ()=>{
     case "/camera": initCamera(); break;
     case "/settings": initSettings(); break;
     case "/reports": initReports(); break;
+    case "/hub": initHub(); break;
   }
 });
 
@@ -44,8 +45,10 @@ async function initDashboard() {
     }, plugins:{ legend:{ position:'bottom' } } }
   });
 
-  const refresh = async ()=>{
-    const d = await getJSON("/api/sensors");
+  let lastTs = null;
+  const render = (d)=>{
+    if (d.timestamp && d.timestamp === lastTs) return;     // 轮询与推送拿到同一次采样
+    lastTs = d.timestamp;
     $("#cards").innerHTML = `
       <div class="card">🌡 温度 <b>${fmt(d.temperature_c)}℃</b></div>
       <div class="card">💧 湿度 <b>${fmt(d.humidity_pct)}%</b></div>
@@ -65,9 +68,16 @@ async function initDashboard() {
     if (miniChart.data.labels.length>60){ miniChart.data.labels.shift(); miniChart.data.datasets.forEach(ds=>ds.data.shift()); }
     miniChart.update();
   };
+  const refresh = async ()=> render(await getJSON("/api/sensors"));
 
+  // 优先用 SSE 接收每次采样；推流服务未开启或断开期间退回轮询
+  let lastPush = 0;
+  if (window.EventSource) {
+    const es = new EventSource("/events", { withCredentials: true });
+    es.addEventListener("sensors", (e)=>{ lastPush = Date.now(); render(JSON.parse(e.data)); });
+  }
   await refresh();
-  setInterval(refresh, 5000);
+  setInterval(()=>{ if (Date.now() - lastPush > 15000) refresh(); }, 5000);
 }
 
 function fmt(v){
@@ -93,9 +103,12 @@ async function initHistory() {
   const fetchHistory = async ()=>{
     const s = $("#since").value, u = $("#until").value;
     const qs = []; if (s) qs.push("since="+s); if(u) qs.push("until="+u);
-    const url = "/api/history" + (qs.length? "?"+qs.join("&"):"");
+    // 每个像素最多一个点：长范围由服务端 LTTB 降采样，负载与渲染耗时有上限
+    qs.push("points="+Math.max(200, Math.min(2000, Math.round($("#historyChart").clientWidth || 800))));
+    const url = "/api/history?" + qs.join("&");
     const res = await getJSON(url);
     const items = res.items || [];
+    $("#histCount").textContent = res.total ? `显示 ${res.count} / 共 ${res.total} 条（已降采样）` : `共 ${res.count} 条`;
 
     const tbody = $("#histTable tbody");
     tbody.innerHTML = "";
@@ -131,6 +144,59 @@ async function initHistory() {
   await fetchHistory();
 }
 
+// ========== 汇聚站 ==========
+let hubChart;
+async function initHub() {
+  const palette = ["#ff6b6b","#4dabf7","#ffd43b","#69db7c","#b197fc","#ffa94d","#63e6be","#f783ac","#868e96","#74c0fc"];
+  const ctx = $("#hubChart").getContext("2d");
+  hubChart = new Chart(ctx, {
+    type: "line",
+    data: { labels: [], datasets: [] },
+    options:{ responsive:true, maintainAspectRatio:false, animation:false, spanGaps:true,
+              elements:{ point:{ radius:0 } }, plugins:{ legend:{position:'bottom'} } }
+  });
+
+  const refreshNodes = async ()=>{
+    const res = await getJSON("/hub/api/latest");
+    const tbody = $("#hubNodes tbody");
+    tbody.innerHTML = "";
+    (res.nodes || []).forEach(n=>{
+      const s = n.sensor || {}, ev = n.event || {}, inf = n.inference || {};
+      const tr = document.createElement("tr");
+      tr.innerHTML = `
+        <td>${escapeHtml(n.node)}</td>
+        <td>${n.online ? "🟢 在线" : "⚪ 离线"}</td>
+        <td>${s.ts ? new Date(s.ts*1000).toLocaleString() : "--"}</td>
+        <td>${fmt(s.temperature_c)}</td>
+        <td>${fmt(s.humidity_pct)}</td>
+        <td>${fmt(s.light_lux)}</td>
+        <td>${fmt(s.soil_moisture_pct)}</td>
+        <td>${escapeHtml(ev.action || "--")}</td>
+        <td>${inf.label ? escapeHtml(inf.label) + " " + fmt((inf.confidence||0)*100) + "%" : "--"}</td>
+      `;
+      tbody.appendChild(tr);
+    });
+  };
+
+  const compare = async ()=>{
+    const until = Math.floor(Date.now()/1000), span = Number($("#hubRange").value);
+    // 桶数按画布宽度取，服务端只读预聚合数据
+    const points = Math.max(60, Math.min(1000, $("#hubChart").clientWidth || 600));
+    const bucket = Math.max(300, Math.ceil(span/points/300)*300);
+    const res = await getJSON(`/hub/api/compare?field=${$("#hubField").value}&since=${until-span}&until=${until}&bucket=${bucket}`);
+    hubChart.data.labels = (res.t || []).map(t=> new Date(t*1000).toLocaleString());
+    hubChart.data.datasets = Object.entries(res.nodes || {}).map(([name, s], i)=>({
+      label: name, data: s.mean, borderColor: palette[i % palette.length], tension:0.2
+    }));
+    hubChart.update();
+  };
+
+  $("#btnHubQuery").addEventListener("click", compare);
+  await refreshNodes();
+  await compare();
+  setInterval(refreshNodes, 10000);
+}
+
 // ========== 控制 ==========
 async function initControl() {
   window.sendControl = async (payload)=>{